@@ -1,12 +1,18 @@
 import os
+import time
 import pickle
 import json
+import datetime
+import threading
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.exceptions import RefreshError
+from googleapiclient.errors import HttpError
 import logging
+import utils.metrics
+import processing.gmail_fetch
 
 # Configure logging
 logging.basicConfig(
@@ -46,70 +52,208 @@ def save_credentials(creds):
     except Exception as e:
         logging.error(f"Error saving credentials: {e}")
 
-def authenticate_gmail():
+def get_credentials():
     """
-    Authenticate and return the Gmail API service with enhanced error handling
-    and token management.
+    Load, refresh or (if needed) interactively obtain OAuth credentials for Gmail.
     """
     ensure_secrets_directory()
+
+    # Load existing credentials
+    creds = load_credentials()
     
-    try:
-        # Load existing credentials
-        creds = load_credentials()
+    # Check if we need to refresh or get new credentials
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            try:
+                logging.info("Refreshing access token...")
+                creds.refresh(Request())
+            except RefreshError as e:
+                logging.warning(f"Token refresh failed: {e}")
+                creds = None
         
-        # Check if we need to refresh or get new credentials
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    logging.info("Refreshing access token...")
-                    creds.refresh(Request())
-                except RefreshError as e:
-                    logging.warning(f"Token refresh failed: {e}")
-                    creds = None
-            
-            # If still no valid credentials, start new OAuth flow
-            if not creds:
-                logging.info("Starting new OAuth flow...")
-                if not os.path.exists(CREDENTIALS_PATH):
-                    raise FileNotFoundError(
-                        f"No credentials file found at {CREDENTIALS_PATH}. "
-                        "Please download it from Google Cloud Console."
-                    )
-                
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    CREDENTIALS_PATH,
-                    SCOPES,
-                    redirect_uri='http://localhost:8080/'
-                )
-                
-                creds = flow.run_local_server(
-                    port=8080,
-                    access_type='offline',
-                    prompt='consent',
-                    success_message='Authentication successful! You can close this window.',
-                    open_browser=True
+        # If still no valid credentials, start new OAuth flow
+        if not creds:
+            logging.info("Starting new OAuth flow...")
+            if not os.path.exists(CREDENTIALS_PATH):
+                raise FileNotFoundError(
+                    f"No credentials file found at {CREDENTIALS_PATH}. "
+                    "Please download it from Google Cloud Console."
                 )
-                
-                # Save the new credentials
-                save_credentials(creds)
-        
-        # Build and return the Gmail service
-        service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
-        
-        # Verify the connection by getting user profile
-        user_profile = service.users().getProfile(userId='me').execute()
-        logging.info(f"Successfully authenticated as: {user_profile.get('emailAddress')}")
-        
-        return service
+            
+            flow = InstalledAppFlow.from_client_secrets_file(
+                CREDENTIALS_PATH,
+                SCOPES,
+                redirect_uri='http://localhost:8080/'
+            )
+            
+            creds = flow.run_local_server(
+                port=8080,
+                access_type='offline',
+                prompt='consent',
+                success_message='Authentication successful! You can close this window.',
+                open_browser=True
+            )
+            
+            # Save the new credentials
+            save_credentials(creds)
+
+    return creds
+
+def build_gmail_service(creds):
+    """Build the Gmail API service for the given credentials and verify the connection."""
+    service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
+    
+    # Verify the connection by getting user profile
+    user_profile = processing.gmail_fetch.retry_api_call(lambda: service.users().getProfile(userId='me').execute(),
+                                                         method="users.getProfile")
+    logging.info(f"Successfully authenticated as: {user_profile.get('emailAddress')}")
+    
+    return service
+
+def authenticate_gmail():
+    """
+    Authenticate and return the Gmail API service with enhanced error handling
+    and token management.
+    """
+    try:
+        return build_gmail_service(get_credentials())
 
     except Exception as e:
         logging.error(f"Authentication error: {str(e)}")
         raise
 
+def is_auth_error(error):
+    """True if an exception means the credentials or the client must be rebuilt."""
+    if isinstance(error, RefreshError):
+        return True
+    return isinstance(error, HttpError) and error.resp.status == 401
+
+
+class GmailSessionManager:
+    """
+    Long-lived Gmail client for the listener loop.
+
+    The service is built once and reused across polls. The access token is refreshed
+    in place `refresh_margin` seconds before its `expiry` (the built client shares the
+    credentials object, so no rebuild is needed); the client is only rebuilt after
+    `invalidate()` is called for an auth failure.
+
+    Args:
+        refresh_margin (int): Seconds before expiry at which the token is refreshed.
+    """
+    def __init__(self, refresh_margin=300):
+        self.refresh_margin = refresh_margin
+        self.creds = None
+        self.service = None
+        self.build_count = 0
+        self.refresh_count = 0
+        self.last_build_seconds = None
+        self.last_refresh_seconds = None
+        self.total_build_seconds = 0.0
+        self.total_refresh_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def get_service(self):
+        """Return the shared service, building or refreshing first when needed."""
+        with self._lock:
+            if self.service is None:
+                self._build()
+            elif self._needs_refresh():
+                self._refresh()
+            return self.service
+
+    def access_token(self):
+        """Return a current access token, refreshing it ahead of expiry (for raw HTTP clients)."""
+        self.get_service()
+        return self.creds.token
+
+    def new_service(self):
+        """
+        Build an additional client sharing the session's credentials.
+        `googleapiclient` clients are not thread-safe, so each worker thread needs its own.
+        """
+        self.get_service()
+        return build('gmail', 'v1', credentials=self.creds, cache_discovery=False)
+
+    def invalidate(self):
+        """Drop the client and credentials so the next `get_service` rebuilds from disk."""
+        with self._lock:
+            self.service = None
+            self.creds = None
+        logging.warning("Gmail session invalidated; it will be rebuilt on next use.")
+
+    def stats(self):
+        """Return build/refresh counts and timings in seconds."""
+        return {
+            "build_count": self.build_count,
+            "refresh_count": self.refresh_count,
+            "last_build_seconds": self.last_build_seconds,
+            "last_refresh_seconds": self.last_refresh_seconds,
+            "total_build_seconds": self.total_build_seconds,
+            "total_refresh_seconds": self.total_refresh_seconds,
+        }
+
+    def _needs_refresh(self):
+        if not self.creds.valid:
+            return True
+        if self.creds.expiry is None:
+            return False
+        # google-auth stores expiry as a naive UTC datetime
+        remaining = self.creds.expiry - datetime.datetime.utcnow()
+        return remaining < datetime.timedelta(seconds=self.refresh_margin)
+
+    def _build(self):
+        start = time.perf_counter()
+        self.creds = get_credentials()
+        self.service = build_gmail_service(self.creds)
+        self.last_build_seconds = time.perf_counter() - start
+        self.total_build_seconds += self.last_build_seconds
+        self.build_count += 1
+        logging.info(f"Gmail service built in {self.last_build_seconds:.2f}s (build #{self.build_count}).")
+
+    def _refresh(self):
+        start = time.perf_counter()
+        try:
+            self.creds.refresh(Request())
+        except RefreshError as e:
+            logging.warning(f"Proactive token refresh failed, rebuilding session: {e}")
+            self.service, self.creds = None, None
+            self._build()
+            return
+        save_credentials(self.creds)
+        self.last_refresh_seconds = time.perf_counter() - start
+        self.total_refresh_seconds += self.last_refresh_seconds
+        self.refresh_count += 1
+        utils.metrics.observe_stage("auth_refresh", self.last_refresh_seconds)
+        logging.info(f"Access token refreshed in {self.last_refresh_seconds:.2f}s (refresh #{self.refresh_count}).")
+
+class StaticGmailSession:
+    """
+    Session over one already-built service, with the GmailSessionManager interface.
+
+    Every caller, worker threads included, gets that same service, so it must be safe to
+    share between threads (FakeGmailService is). Nothing is rebuilt after an auth failure.
+
+    Args:
+        service: The Gmail service to hand out.
+    """
+    def __init__(self, service):
+        self.service = service
+
+    def get_service(self):
+        return self.service
+
+    def new_service(self):
+        return self.service
+
+    def invalidate(self):
+        logging.warning("Auth failure on a static Gmail session; keeping its service.")
+
 def get_account_email(service, user_id='me'):
     """Retrieve the email address of the authenticated Gmail account."""
     try:
-        profile = service.users().getProfile(userId=user_id).execute()
+        profile = processing.gmail_fetch.retry_api_call(lambda: service.users().getProfile(userId=user_id).execute(),
+                                                        method="users.getProfile")
         email_address = profile.get('emailAddress')
         logging.info(f"Authenticated Email Address: {email_address}")
         return email_address
@@ -221,7 +365,8 @@ def get_account_email(service, user_id='me'):
     """Retrieve the email address of the authenticated Gmail account."""
     try:
         # Get the user's profile information
-        profile = service.users().getProfile(userId=user_id).execute()
+        profile = processing.gmail_fetch.retry_api_call(lambda: service.users().getProfile(userId=user_id).execute(),
+                                                        method="users.getProfile")
         email_address = profile.get('emailAddress')
         print("Authenticated Email Address:", email_address)
         return email_address
@@ -0,0 +1,58 @@
+"""
+Benchmark: AsyncGmailClient throughput at 1, 10 and 50 concurrent requests.
+
+Serves the fake Gmail service over the local HTTP stub with a simulated per-request
+latency and fetches every message with `get_message`, reporting requests/second.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_async_listener --copies 50 --latency 0.02
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+import processing.gmail_quota
+from listener.async_gmail_listener import AsyncGmailClient
+from utils.fake_gmail_service import FakeGmailService, FakeGmailHttpServer
+
+
+async def fetch_all(base_url, email_ids, concurrency):
+    async with AsyncGmailClient(lambda: "fake-token", base_url=base_url, max_concurrency=concurrency) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client.get_message(email_id) for email_id in email_ids))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=50, help="Times to repeat the fixture set.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per request.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    # The stub enforces no quota; measure the client, not the client-side budget
+    processing.gmail_quota.set_gmail_gateway(processing.gmail_quota.GmailQuotaGateway(units_per_second=1e9))
+    # The stub runs in its own process so it does not compete with the client for the GIL
+    url_queue = multiprocessing.Queue()
+    server_process = multiprocessing.Process(target=serve, args=(args.copies, args.latency, url_queue), daemon=True)
+    server_process.start()
+    base_url, email_ids = url_queue.get()
+
+    try:
+        for concurrency in args.concurrency:
+            elapsed = asyncio.run(fetch_all(base_url, email_ids, concurrency))
+            print(f"concurrency {concurrency:>3}: {len(email_ids)} requests in {elapsed:.2f}s "
+                  f"({len(email_ids) / elapsed:.1f} req/s)")
+    finally:
+        server_process.terminate()
+
+
+def serve(copies, latency, url_queue):
+    service = FakeGmailService.from_fixture_dir(copies=copies, latency=latency)
+    with FakeGmailHttpServer(service) as server:
+        url_queue.put((server.base_url, list(service.messages_store)))
+        server.thread.join()
+
+
+if __name__ == "__main__":
+    main()
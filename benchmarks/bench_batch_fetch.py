@@ -0,0 +1,53 @@
+"""
+Benchmark: sequential `fetch_email` vs batched `fetch_emails_batched`.
+
+Runs against the fake Gmail service seeded from `src/usecases_v1_offline/`, with a
+simulated per-round-trip latency, and reports messages/second for each strategy.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_batch_fetch --copies 100 --latency 0.05
+"""
+import argparse
+import time
+import processing.latest_emails
+import processing.gmail_fetch
+from utils.fake_gmail_service import FakeGmailService
+
+
+def run_sequential(service, email_ids):
+    for email_id in email_ids:
+        processing.latest_emails.fetch_email(service, email_id)
+
+
+def run_batched(service, email_ids, batch_size):
+    for record in processing.gmail_fetch.fetch_emails_batched(service, email_ids, batch_size=batch_size):
+        if record["error"]:
+            raise record["error"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=100, help="Times to repeat the fixture set.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per HTTP round trip.")
+    parser.add_argument("--batch-size", type=int, default=processing.gmail_fetch.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    results = {}
+    for name, runner in (
+        ("sequential", lambda service, ids: run_sequential(service, ids)),
+        ("batched", lambda service, ids: run_batched(service, ids, args.batch_size)),
+    ):
+        service = FakeGmailService.from_fixture_dir(copies=args.copies, latency=args.latency)
+        email_ids = list(service.messages_store)
+        start = time.perf_counter()
+        runner(service, email_ids)
+        elapsed = time.perf_counter() - start
+        results[name] = len(email_ids) / elapsed
+        print(f"{name:>10}: {len(email_ids)} messages in {elapsed:.2f}s "
+              f"({results[name]:.1f} msg/s, {service.round_trips} round trips)")
+
+    print(f"   speedup: {results['batched'] / results['sequential']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark: `extract_individual_job_blocks` (single pass) vs `extract_individual_job_blocks_legacy`.
+
+Parses every HTML fixture under `src/` once, checks both extractors return the same
+blocks, then times repeated extraction on the parsed trees and reports emails/second.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_job_blocks --repeat 50
+"""
+import argparse
+import glob
+import os
+import time
+from bs4 import BeautifulSoup
+import scraping.scrap_job_blocks
+
+FIXTURE_ROOT = "src"
+
+
+def load_soups(fixture_root):
+    soups = {}
+    for path in sorted(glob.glob(os.path.join(fixture_root, "**", "*.html"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as file:
+            soups[path] = BeautifulSoup(file.read(), "html.parser")
+    return soups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="Extractions per fixture.")
+    parser.add_argument("--fixture-root", default=FIXTURE_ROOT)
+    args = parser.parse_args()
+
+    soups = load_soups(args.fixture_root)
+    for path, soup in soups.items():
+        legacy = scraping.scrap_job_blocks.extract_individual_job_blocks_legacy(soup)
+        current = scraping.scrap_job_blocks.extract_individual_job_blocks(soup)
+        if [id(block) for block in legacy] != [id(block) for block in current]:
+            raise SystemExit(f"Block mismatch on {path}")
+        print(f"{len(current):>3} blocks  {path}")
+
+    results = {}
+    for name, extract in (
+        ("legacy", scraping.scrap_job_blocks.extract_individual_job_blocks_legacy),
+        ("single-pass", scraping.scrap_job_blocks.extract_individual_job_blocks),
+    ):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for soup in soups.values():
+                extract(soup)
+        elapsed = time.perf_counter() - start
+        extractions = args.repeat * len(soups)
+        results[name] = extractions / elapsed
+        print(f"{name:>11}: {extractions} extractions in {elapsed:.2f}s ({results[name]:.1f} emails/s)")
+
+    print(f"    speedup: {results['single-pass'] / results['legacy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: `get_individual_job_record` vs `get_individual_job_legacy`.
+
+Extracts the job blocks of every HTML fixture under `src/`, checks both paths give the
+same fields, then reports jobs/second and the largest peak of traced memory for one job.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_job_records --repeat 50
+"""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+import scraping.scrap_job_blocks
+import scraping.scrap_job_elements
+import utils.html_module
+
+FIXTURE_ROOT = "src"
+
+
+def load_job_blocks(fixture_root):
+    job_blocks = []
+    for path in sorted(glob.glob(os.path.join(fixture_root, "**", "*.html"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as file:
+            soup = utils.html_module.make_soup(file.read())
+        job_blocks.extend(scraping.scrap_job_blocks.extract_individual_job_blocks(soup))
+    return job_blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="Passes over all fixture jobs.")
+    parser.add_argument("--fixture-root", default=FIXTURE_ROOT)
+    args = parser.parse_args()
+
+    job_blocks = load_job_blocks(args.fixture_root)
+    for block in job_blocks:
+        legacy = scraping.scrap_job_elements.get_individual_job_legacy(block).to_dict("records")[0]
+        record = scraping.scrap_job_elements.get_individual_job_record(block)._asdict()
+        # job_key has no legacy counterpart
+        if {field: record[field] for field in legacy} != legacy:
+            raise SystemExit(f"Record mismatch: {legacy}")
+    print(f"{len(job_blocks)} job blocks, records identical")
+
+    results = {}
+    for name, extract in (
+        ("legacy", scraping.scrap_job_elements.get_individual_job_legacy),
+        ("record", scraping.scrap_job_elements.get_individual_job_record),
+    ):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for block in job_blocks:
+                extract(block)
+        elapsed = time.perf_counter() - start
+        jobs = args.repeat * len(job_blocks)
+        results[name] = jobs / elapsed
+
+        peak = 0
+        tracemalloc.start()
+        for block in job_blocks:
+            tracemalloc.reset_peak()
+            extract(block)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        print(f"{name:>7}: {jobs} jobs in {elapsed:.2f}s ({results[name]:.1f} jobs/s, "
+              f"peak {peak / 1024:.1f} KiB per job)")
+
+    print(f"speedup: {results['record'] / results['legacy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
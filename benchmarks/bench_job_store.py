@@ -0,0 +1,89 @@
+"""
+Benchmark: CSV vs Parquet job sinks.
+
+Writes synthetic poll cycles (fixture jobs spread over `--days` fetch dates) through
+CsvJobSink and ParquetJobSink in a temporary directory, reporting write throughput,
+on-disk size, and the time to read back (a) everything and (b) two columns of one day.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_job_store --jobs 200000 --cycle-jobs 500
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+import pandas as pd
+import scraping.overall_scrap
+import storage.job_store
+
+
+def fixture_records():
+    records = []
+    for path in sorted(glob.glob(os.path.join("src", "**", "*.html"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as file:
+            records.extend(scraping.overall_scrap.scrap_html_to_records(file.read()))
+    return records
+
+
+def cycles(records, job_count, cycle_jobs, days):
+    """Yield JobAccumulators of `cycle_jobs` jobs, each cycle on one of `days` fetch dates."""
+    accumulator = scraping.overall_scrap.JobAccumulator()
+    for index in range(job_count):
+        day = (index // cycle_jobs) % days
+        accumulator.extend([records[index % len(records)]._replace(fetched_date=f"2024-01-{day + 1:02d}")])
+        if len(accumulator) == cycle_jobs:
+            yield accumulator
+            accumulator = scraping.overall_scrap.JobAccumulator()
+    if len(accumulator):
+        yield accumulator
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=200_000)
+    parser.add_argument("--cycle-jobs", type=int, default=500, help="Jobs flushed per simulated poll cycle.")
+    parser.add_argument("--days", type=int, default=28, help="Distinct fetch dates.")
+    args = parser.parse_args()
+
+    records = fixture_records()
+    workdir = tempfile.mkdtemp(prefix="bench_job_store_")
+    os.chdir(workdir)
+    print(f"Working in {workdir}")
+
+    parquet_root = os.path.join(workdir, "parquet")
+    sinks = {
+        "csv": storage.job_store.CsvJobSink(),
+        # Buffer a whole run so the row groups are large; a live listener flushes every cycle and compacts
+        "parquet": storage.job_store.ParquetJobSink(root=parquet_root, buffer_rows=args.jobs),
+    }
+    for name, sink in sinks.items():
+        start = time.perf_counter()
+        for accumulator in cycles(records, args.jobs, args.cycle_jobs, args.days):
+            sink.write(accumulator.columns)
+        sink.flush()
+        elapsed = time.perf_counter() - start
+        size = directory_size("data/raw_processed" if name == "csv" else parquet_root)
+        print(f"{name:>8} write: {args.jobs / elapsed:>10.0f} jobs/s  {size / 1e6:.1f} MB")
+
+    csv_path = glob.glob("data/raw_processed/*.csv")[0]
+    timings = {
+        "csv full": lambda: pd.read_csv(csv_path),
+        "csv 1 day, 2 cols": lambda: pd.read_csv(csv_path, usecols=["company", "fetched_date"])
+            .query("fetched_date == '2024-01-01'"),
+        "parquet full": lambda: storage.job_store.read_jobs(parquet_root),
+        "parquet 1 day, 2 cols": lambda: storage.job_store.read_jobs(
+            parquet_root, columns=["company", "location"], start_date="2024-01-01", end_date="2024-01-01"),
+    }
+    for name, read in timings.items():
+        start = time.perf_counter()
+        rows = len(read())
+        print(f"{name:>22}: {time.perf_counter() - start:.3f}s ({rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: per-record emit cost of PrependFileHandler vs AppendFileHandler as the log grows,
+and of configure_logging's handler set (files + console) run inline vs behind the LogPipeline queue.
+
+Each handler writes `--records` records to its own file in a temporary directory; the
+mean emit time of every `--window` consecutive records is printed against the file
+size at that point. Prepending rewrites the whole file per record, so its cost grows
+with the file; appending should stay flat. The time to read the newest 50 records
+back with `read_log_newest_first` is printed last.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_log_handlers --records 5000 --window 1000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+
+def emit_costs(handler, path, record_count, window):
+    """Mean seconds per emit for each window of records, with the file size after it."""
+    logger = logging.getLogger(f"bench_log_handlers.{type(handler).__name__}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    costs = []
+    try:
+        for start in range(0, record_count, window):
+            began = time.perf_counter()
+            for index in range(start, min(start + window, record_count)):
+                logger.info(f"Processed email {index:08d}: 12 job(s) scraped, labels queued for batchModify.")
+            handler.flush()
+            costs.append(((time.perf_counter() - began) / window, os.path.getsize(path)))
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--window", type=int, default=1000, help="Records per reported mean.")
+    args = parser.parse_args()
+
+    # processing.logs configures logging into ./logs on import, so import it from a scratch directory
+    sys.path.insert(0, os.getcwd())
+    workdir = tempfile.mkdtemp(prefix="bench_log_handlers_")
+    os.chdir(workdir)
+    import processing.logs
+    print(f"Working in {workdir}")
+
+    handlers = {
+        "prepend": processing.logs.PrependFileHandler,
+        "append": processing.logs.AppendFileHandler,
+    }
+    for name, handler_class in handlers.items():
+        print(f"{name}:")
+        path = os.path.join(workdir, f"{name}_log.txt")
+        for window_index, (cost, size) in enumerate(emit_costs(handler_class(path), path, args.records, args.window)):
+            records = min((window_index + 1) * args.window, args.records)
+            print(f"  {records:>8} records  {size / 1e6:>7.2f} MB  {cost * 1e6:>9.1f} us/record")
+
+    # configure_logging's handler set (daily + monthly file, console), run inline vs behind the queue
+    class Fanout(logging.Handler):
+        def __init__(self, handlers):
+            super().__init__()
+            self.handlers = handlers
+
+        def emit(self, record):
+            for handler in self.handlers:
+                handler.handle(record)
+            for handler in self.handlers:
+                handler.flush()
+
+    def handler_set(name, buffered):
+        handlers = [processing.logs.AppendFileHandler(os.path.join(workdir, f"{name}_{period}_log.txt"), buffered=buffered)
+                    for period in ("daily", "monthly")]
+        handlers.append(processing.logs.LimitedConsoleHandler(max_logs=15, buffered=buffered))
+        for handler in handlers:
+            handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        return handlers
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")  # the console handler redraws on stdout
+    try:
+        inline = emit_costs(Fanout(handler_set("inline", False)), os.path.join(workdir, "inline_daily_log.txt"),
+                            args.records, args.window)
+        pipeline = processing.logs.LogPipeline(handler_set("queued", True), policy="block")
+        pipeline.start()
+        queued = emit_costs(pipeline.queue_handler, os.path.join(workdir, "queued_daily_log.txt"),
+                            args.records, args.window)
+        pipeline.stop()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    stats = pipeline.stats()
+    for name, costs in (("inline", inline), ("queued", queued)):
+        print(f"{name} files + console: {sum(cost for cost, _ in costs) / len(costs) * 1e6:.1f} us/record on the logging thread")
+    print(f"queue: max depth {stats['max_queue_depth']}, mean delivery latency {stats['mean_latency_seconds'] * 1e3:.2f} ms, "
+          f"{stats['batches']} batch flush(es), {stats['dropped']} dropped")
+
+    start = time.perf_counter()
+    newest = list(processing.logs.read_log_newest_first(os.path.join(workdir, "append_log.txt"), limit=50))
+    print(f"newest 50 of {args.records} records read back in {(time.perf_counter() - start) * 1e3:.2f} ms; "
+          f"newest: {newest[0][-60:]}")
+
+
+if __name__ == "__main__":
+    main()
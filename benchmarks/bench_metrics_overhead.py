@@ -0,0 +1,101 @@
+"""
+Benchmark: per-email overhead of the Prometheus instrumentation (utils.metrics).
+
+Runs `process_emails_with_transaction` against the fake Gmail service over the same
+synthesized mailbox with the metrics switched on and off (`set_metrics_enabled`),
+`--rounds` times (alternating which goes first), and compares the median time per
+email of each. As the end-to-end difference is well inside run-to-run noise, the cost of the instrumentation
+calls made for one email (fetch/scrape/finalize timers, API and job counters, the
+email counter) is also timed directly and set against the per-email time.
+
+The target is an overhead below 1% per email.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_metrics_overhead --copies 20 --rounds 10
+"""
+import argparse
+import copy
+import gc
+import logging
+import os
+import tempfile
+import time
+import statistics
+import processing.gmail_quota
+import storage.job_store
+import storage.seen_jobs
+import utils.metrics
+from benchmarks.bench_pipeline import FIXTURE_DIR, load_fixtures, iter_messages
+from utils.fake_gmail_service import FakeGmailService
+
+
+def run_cycle(service, messages, enabled):
+    """Time one poll cycle over `messages` with the metrics on or off; returns seconds."""
+    import processing.latest_emails
+
+    utils.metrics.set_metrics_enabled(enabled)
+    storage.seen_jobs.set_seen_job_filter(storage.seen_jobs.SeenJobFilter(path=None))
+    with service.lock:
+        service.messages_store.clear()
+        for message in messages:
+            # Finalizing removes UNREAD from the stored message, so each run gets fresh copies
+            service.add_message(copy.deepcopy(message))
+    gc.collect()
+    started = time.perf_counter()
+    outcomes = processing.latest_emails.process_emails_with_transaction(service, ["alert@indeed.com"], "bench@example.com")
+    seconds = time.perf_counter() - started
+    assert outcomes["processed"] == len(messages), outcomes
+    return seconds
+
+
+def instrumentation_seconds(iterations):
+    """Seconds spent in the metrics calls made for one email, averaged over `iterations`."""
+    utils.metrics.set_metrics_enabled(True)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with utils.metrics.stage_timer("fetch"):
+            pass
+        utils.metrics.count_api_call("messages.get")
+        with utils.metrics.stage_timer("scrape"):
+            pass
+        utils.metrics.count_jobs(12)
+        utils.metrics.observe_stage("finalize", 0.001)
+        utils.metrics.count_email(True)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20, help="Copies of the fixture set in the mailbox.")
+    parser.add_argument("--rounds", type=int, default=10, help="Runs with the metrics on and off, each.")
+    parser.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    args = parser.parse_args()
+
+    if utils.metrics.prometheus_client is None:
+        parser.error("prometheus_client is not installed; there is no instrumentation to measure.")
+    logging.disable(logging.WARNING)
+    fixtures = load_fixtures(os.path.abspath(args.fixture_dir))
+    messages = list(iter_messages(fixtures, args.copies))
+    os.chdir(tempfile.mkdtemp(prefix="bench_metrics_overhead_"))
+    storage.job_store.set_job_sink("csv")
+    service = FakeGmailService()
+    # The fake enforces no quota here; keep throttling waits out of the timings
+    processing.gmail_quota.set_gmail_gateway(processing.gmail_quota.GmailQuotaGateway(units_per_second=1e9))
+
+    run_cycle(service, messages, True)  # warm-up: imports, label cache, parser
+    timings = {True: [], False: []}
+    for round_index in range(args.rounds):
+        for enabled in ((False, True) if round_index % 2 else (True, False)):
+            timings[enabled].append(run_cycle(service, messages, enabled))
+
+    per_email = {enabled: statistics.median(samples) / len(messages) for enabled, samples in timings.items()}
+    direct = instrumentation_seconds(100_000)
+    print(f"{len(messages)} emails x {args.rounds} round(s)")
+    print(f"metrics off: {per_email[False] * 1e3:8.3f} ms/email (median)")
+    print(f"metrics on:  {per_email[True] * 1e3:8.3f} ms/email (median)")
+    print(f"end-to-end difference: {(per_email[True] / per_email[False] - 1) * 100:+.2f}%")
+    print(f"instrumentation calls: {direct * 1e6:.1f} us/email = {direct / per_email[False] * 100:.3f}% of an email")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Conformance check and parse-time report for the HTML parser backends.
+
+For every HTML fixture under `src/`, each installed backend in
+`utils.html_module.PARSER_BACKENDS` is used to parse the email and scrape its job
+records. Records must equal those from the default backend; any difference is printed
+and the script exits with status 1. Mean parse and scrape times per backend follow.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_parser_backends --repeat 20
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import scraping.scrap_job_blocks
+import scraping.scrap_job_elements
+import utils.html_module
+
+FIXTURE_ROOT = "src"
+
+
+def scrape_records(soup):
+    job_blocks = scraping.scrap_job_blocks.extract_individual_job_blocks(soup)
+    return [scraping.scrap_job_elements.get_individual_job(block).to_dict("records")[0] for block in job_blocks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="Parses per fixture and backend.")
+    parser.add_argument("--fixture-root", default=FIXTURE_ROOT)
+    args = parser.parse_args()
+
+    backends = utils.html_module.available_parser_backends()
+    missing = [backend for backend in utils.html_module.PARSER_BACKENDS if backend not in backends]
+    if missing:
+        print(f"Not installed, skipped: {', '.join(missing)}")
+
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(args.fixture_root, "**", "*.html"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as file:
+            fixtures[path] = file.read()
+
+    # Conformance: every backend yields the default backend's records
+    mismatches = 0
+    for path, html_content in fixtures.items():
+        expected = scrape_records(utils.html_module.make_soup(html_content, utils.html_module.DEFAULT_PARSER_BACKEND))
+        for backend in backends:
+            records = scrape_records(utils.html_module.make_soup(html_content, backend))
+            if records != expected:
+                mismatches += 1
+                print(f"MISMATCH [{backend}] {path}: {len(records)} records vs {len(expected)}")
+        print(f"{len(expected):>3} records  {path}")
+
+    # Timing: parse, then block extraction + record scraping on the parsed tree
+    print(f"\n{'backend':>12} {'parse ms':>10} {'scrape ms':>10}")
+    for backend in backends:
+        parse_time = scrape_time = 0.0
+        for _ in range(args.repeat):
+            for html_content in fixtures.values():
+                start = time.perf_counter()
+                soup = utils.html_module.make_soup(html_content, backend)
+                parsed = time.perf_counter()
+                scrape_records(soup)
+                parse_time += parsed - start
+                scrape_time += time.perf_counter() - parsed
+        runs = args.repeat * len(fixtures)
+        print(f"{backend:>12} {parse_time / runs * 1000:>10.2f} {scrape_time / runs * 1000:>10.2f}")
+
+    if mismatches:
+        print(f"\n{mismatches} fixture/backend combination(s) differ from {utils.html_module.DEFAULT_PARSER_BACKEND}.")
+        sys.exit(1)
+    print(f"\nAll backends match {utils.html_module.DEFAULT_PARSER_BACKEND} on {len(fixtures)} fixtures.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Benchmark suite: the email -> job pipeline stage by stage, then end to end.
+
+Emails are synthesized from the fixtures in `src/usecases_v1_offline/` at each scale
+(1x, 100x and 10,000x the fixture set); every copy after the first is a synthetic
+variant with its own job keys (see utils.fake_gmail_service.synthesize_variant), so
+the seen-job filter does not drop repeats.
+
+For each scale, in a separate process (so peak RSS is per run):
+- stages: per email, base64 decode of the HTML part, BeautifulSoup parse,
+  `extract_individual_job_blocks` and field extraction (`get_individual_job_record`,
+  the record form of `get_individual_job`); per poll cycle of `--cycle-emails` emails,
+  storage through the CSV sink (`results_create_or_append_to_csv`).
+- pipeline: `process_emails_with_transaction` against the fake Gmail service, which
+  holds at most `--mailbox-size` unread emails at a time (refilled between cycles).
+
+Writes latency percentiles per stage, emails/second and peak RSS as JSON to `--output`
+(default: benchmarks/results/bench_pipeline-<timestamp>.json) and prints a summary.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline --scales 1 100 10000
+"""
+import argparse
+import base64
+import datetime
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import processing.gmail_quota
+import scraping.overall_scrap
+import scraping.scrap_job_blocks
+import scraping.scrap_job_elements
+import storage.job_store
+import storage.seen_jobs
+import utils.html_module
+from utils.fake_gmail_service import FakeGmailService, build_fake_message, synthesize_variant, DEFAULT_SENDER
+
+FIXTURE_DIR = os.path.join("src", "usecases_v1_offline")
+DEFAULT_SCALES = (1, 100, 10_000)
+RESULTS_DIR = os.path.join("benchmarks", "results")
+STAGES = ("decode", "parse", "blocks", "fields", "storage")
+
+
+def load_fixtures(fixture_dir):
+    fixtures = []
+    for file_name in sorted(os.listdir(fixture_dir)):
+        if file_name.endswith(".html"):
+            with open(os.path.join(fixture_dir, file_name), "r", encoding="utf-8") as file:
+                fixtures.append((os.path.splitext(file_name)[0], file.read()))
+    return fixtures
+
+
+def iter_messages(fixtures, scale):
+    """Yield the `scale` x fixture-set messages one at a time, so memory does not grow with the scale."""
+    received = datetime.datetime(2024, 12, 16, 9, 0).astimezone()
+    index = itertools.count()
+    for copy in range(scale):
+        for title, html_content in fixtures:
+            number = next(index)
+            yield build_fake_message(
+                message_id=f"bench{number:08d}",
+                html_content=synthesize_variant(html_content, copy),
+                subject=f"Indeed alert: {title}",
+                sender=DEFAULT_SENDER,
+                received_datetime=received + datetime.timedelta(minutes=number),
+            )
+
+
+def summarize(samples):
+    """Count, mean and p50/p90/p99/max of latency samples, in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e3
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1e3,
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1e3,
+    }
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process."""
+    try:
+        import resource
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss)
+
+
+def run_stages(fixtures, scale, cycle_emails):
+    samples = {stage: [] for stage in STAGES}
+    jobs = scraping.overall_scrap.JobAccumulator()
+    sink = storage.job_store.CsvJobSink()
+    emails = job_count = 0
+    clock = time.perf_counter
+    started = clock()
+
+    for message in iter_messages(fixtures, scale):
+        html_part = next(part for part in message["payload"]["parts"] if part["mimeType"] == "text/html")
+        t0 = clock()
+        html_content = base64.urlsafe_b64decode(html_part["body"]["data"]).decode("utf-8")
+        t1 = clock()
+        soup = utils.html_module.make_soup(html_content)
+        t2 = clock()
+        job_blocks = scraping.scrap_job_blocks.extract_individual_job_blocks(soup)
+        t3 = clock()
+        records = [scraping.scrap_job_elements.get_individual_job_record(block) for block in job_blocks]
+        t4 = clock()
+        for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+            samples[stage].append(seconds)
+
+        jobs.add_email(records)
+        emails += 1
+        job_count += len(records)
+        if jobs.email_count >= cycle_emails:
+            t5 = clock()
+            jobs.flush(sink)
+            samples["storage"].append(clock() - t5)
+    if jobs.email_count:
+        t5 = clock()
+        jobs.flush(sink)
+        samples["storage"].append(clock() - t5)
+
+    elapsed = clock() - started
+    return {
+        "emails": emails,
+        "jobs": job_count,
+        "seconds": elapsed,
+        "emails_per_second": emails / elapsed,
+        "stage_seconds": {stage: sum(stage_samples) for stage, stage_samples in samples.items()},
+        "latency": {stage: summarize(stage_samples) for stage, stage_samples in samples.items()},
+    }
+
+
+def run_pipeline(fixtures, scale, mailbox_size, latency):
+    import processing.latest_emails
+
+    service = FakeGmailService(latency=latency)
+    # The fake enforces no quota here; measure the pipeline, not the client-side budget
+    processing.gmail_quota.set_gmail_gateway(processing.gmail_quota.GmailQuotaGateway(units_per_second=1e9))
+    storage.seen_jobs.set_seen_job_filter(storage.seen_jobs.SeenJobFilter(path=None))
+    storage.job_store.set_job_sink("csv")
+    messages = iter_messages(fixtures, scale)
+    cycle_samples, outcomes = [], {}
+    emails = 0
+    started = time.perf_counter()
+
+    while True:
+        mailbox = list(itertools.islice(messages, mailbox_size))
+        if not mailbox:
+            break
+        # Refill the mailbox with the next unread emails, as if they had just arrived
+        with service.lock:
+            service.messages_store.clear()
+            for message in mailbox:
+                service.add_message(message)
+        cycle_started = time.perf_counter()
+        cycle = processing.latest_emails.process_emails_with_transaction(service, ["alert@indeed.com"], "bench@example.com")
+        cycle_samples.append(time.perf_counter() - cycle_started)
+        emails += len(mailbox)
+        for key, value in cycle.items():
+            outcomes[key] = outcomes.get(key, 0) + value
+
+    elapsed = time.perf_counter() - started
+    return {
+        "emails": emails,
+        "seconds": elapsed,
+        "emails_per_second": emails / elapsed,
+        "outcomes": outcomes,
+        "cycle_latency": summarize(cycle_samples),
+        "api": {key: value for key, value in service.stats().items() if key in ("calls", "round_trips", "quota_used")},
+    }
+
+
+def run_in_child(part, fixture_dir, scale, args, result_queue):
+    """
+    Run one part at one scale in a scratch directory and report its result with the peak
+    RSS, or {"error": traceback} if it raised.
+    """
+    logging.disable(logging.WARNING)  # keep per-email INFO lines out of the benchmark output
+    try:
+        fixtures = load_fixtures(fixture_dir)
+        os.chdir(tempfile.mkdtemp(prefix=f"bench_pipeline_{part}_{scale}_"))
+        if part == "stages":
+            result = run_stages(fixtures, scale, args.cycle_emails)
+        else:
+            result = run_pipeline(fixtures, scale, args.mailbox_size, args.latency)
+        result["peak_rss_mb"] = peak_rss_bytes() / 2**20
+    except BaseException:
+        result = {"error": traceback.format_exc()}
+    result_queue.put(result)
+
+
+def wait_for_result(child, result_queue, poll_seconds=1.0):
+    """
+    Wait for the child's result. A child that dies without reporting (killed, out of
+    memory, crashed interpreter) gives {"error": ...} instead of blocking forever.
+    """
+    while True:
+        try:
+            return result_queue.get(timeout=poll_seconds)
+        except queue.Empty:
+            if not child.is_alive():
+                # It may have put its result just before exiting
+                try:
+                    return result_queue.get(timeout=poll_seconds)
+                except queue.Empty:
+                    return {"error": f"Benchmark process exited with code {child.exitcode} without a result."}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help="Copies of the fixture set per run.")
+    parser.add_argument("--parts", nargs="+", choices=("stages", "pipeline"), default=["stages", "pipeline"])
+    parser.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    parser.add_argument("--cycle-emails", type=int, default=100, help="Emails per storage flush in the stage run.")
+    parser.add_argument("--mailbox-size", type=int, default=3000, help="Unread emails in the fake mailbox per cycle.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per Gmail round trip.")
+    parser.add_argument("--output", default=None, help="JSON result file.")
+    args = parser.parse_args()
+
+    fixture_dir = os.path.abspath(args.fixture_dir)
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parser_backend": utils.html_module.parser_backend,
+        "fixtures": len(load_fixtures(fixture_dir)),
+        "settings": vars(args),
+        "scales": {},
+    }
+
+    failed = False
+    for scale in args.scales:
+        results = report["scales"][str(scale)] = {}
+        for part in args.parts:
+            result_queue = multiprocessing.Queue()
+            child = multiprocessing.Process(target=run_in_child, args=(part, fixture_dir, scale, args, result_queue))
+            child.start()
+            results[part] = wait_for_result(child, result_queue)
+            child.join()
+
+            result = results[part]
+            if "error" in result:
+                failed = True
+                print(f"{scale:>6}x {part:>8}: FAILED\n{result['error']}")
+                continue
+            print(f"{scale:>6}x {part:>8}: {result['emails']:>6} emails in {result['seconds']:8.2f}s "
+                  f"({result['emails_per_second']:7.1f} emails/s), peak RSS {result['peak_rss_mb']:.0f} MB")
+            if part == "stages":
+                for stage in STAGES:
+                    latency = result["latency"][stage]
+                    if latency["count"]:
+                        print(f"{'':>17}{stage:>8}: p50 {latency['p50_ms']:7.2f} ms  p90 {latency['p90_ms']:7.2f} ms  "
+                              f"p99 {latency['p99_ms']:7.2f} ms  ({latency['count']} samples)")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench_pipeline-{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: poll cycles against a quota-enforcing fake Gmail service, with the quota
+gateway's token bucket (processing.gmail_quota) at its default budget vs effectively
+unthrottled.
+
+The fake service charges every call its Gmail quota units and fails calls over
+`--quota` units in any 1-second window with 429 and `Retry-After: 1`, as Gmail does
+with userRateLimitExceeded. For each mode the same synthesized mailbox is processed
+sequentially (`process_emails_with_transaction`) or pipelined
+(`process_emails_pipelined`, concurrent fetch threads), and the emails/second, quota
+units/second, 429s and failed emails are printed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_quota_gateway --copies 100 --mode pipelined
+"""
+import argparse
+import copy
+import logging
+import os
+import tempfile
+import time
+import processing.gmail_quota
+import processing.label_registry
+import storage.job_store
+import storage.seen_jobs
+from benchmarks.bench_pipeline import FIXTURE_DIR, load_fixtures, iter_messages
+from utils.fake_gmail_service import FakeGmailService, GMAIL_QUOTA_PER_SECOND
+
+
+def run_cycle(messages, mode, gateway, quota, latency, fetch_workers):
+    import processing.latest_emails
+    import processing.pipeline
+
+    processing.gmail_quota.set_gmail_gateway(gateway)
+    processing.label_registry.label_registry.invalidate()
+    storage.seen_jobs.set_seen_job_filter(storage.seen_jobs.SeenJobFilter(path=None))
+    service = FakeGmailService(latency=latency, quota_per_second=quota)
+    for message in messages:
+        service.add_message(copy.deepcopy(message))
+
+    started = time.perf_counter()
+    if mode == "sequential":
+        outcomes = processing.latest_emails.process_emails_with_transaction(service, ["alert@indeed.com"], "bench@example.com")
+    else:
+        outcomes = processing.pipeline.process_emails_pipelined(service, ["alert@indeed.com"], "bench@example.com",
+                                                                fetch_workers=fetch_workers)
+    seconds = time.perf_counter() - started
+    stats = service.stats()
+    return {
+        "seconds": seconds,
+        "emails_per_second": len(messages) / seconds,
+        "units_per_second": stats["quota_used"] / seconds,
+        "rate_limited": stats["errors"].get("quota_429", 0),
+        "failed": outcomes["failed"],
+        "gateway": gateway.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=100, help="Copies of the fixture set in the mailbox.")
+    parser.add_argument("--mode", choices=("sequential", "pipelined"), default="pipelined")
+    parser.add_argument("--quota", type=int, default=GMAIL_QUOTA_PER_SECOND, help="Units per second the fake allows.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per Gmail round trip.")
+    parser.add_argument("--fetch-workers", type=int, default=4)
+    parser.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)  # the unthrottled run logs every rate-limited call
+    messages = list(iter_messages(load_fixtures(os.path.abspath(args.fixture_dir)), args.copies))
+    os.chdir(tempfile.mkdtemp(prefix="bench_quota_gateway_"))
+    storage.job_store.set_job_sink("csv")
+
+    gateways = {
+        "unthrottled": processing.gmail_quota.GmailQuotaGateway(units_per_second=1e9),
+        "gateway": processing.gmail_quota.GmailQuotaGateway(),
+    }
+    print(f"{len(messages)} emails, {args.mode}, fake quota {args.quota} units/s")
+    for name, gateway in gateways.items():
+        result = run_cycle(messages, args.mode, gateway, args.quota, args.latency, args.fetch_workers)
+        print(f"{name:>12}: {result['seconds']:6.1f}s  {result['emails_per_second']:6.1f} emails/s  "
+              f"{result['units_per_second']:5.0f} units/s  {result['rate_limited']:4} x 429  "
+              f"{result['failed']} failed email(s)  throttled {result['gateway']['throttle_seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
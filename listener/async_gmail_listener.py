@@ -0,0 +1,400 @@
+import time
+import asyncio
+import signal
+import logging
+import datetime
+import threading
+from collections import Counter
+import httplib2
+import httpx
+from googleapiclient.errors import HttpError
+import auth.gmail_auth
+import listener.gmail_listener
+import processing.gmail_fetch
+import processing.gmail_quota
+import processing.label_registry
+import processing.latest_emails
+import scraping.overall_scrap
+import storage.job_store
+import storage.seen_jobs
+import utils.metrics
+
+GMAIL_API_BASE_URL = "https://gmail.googleapis.com/gmail/v1/users/me/"
+
+# httpx logs every request at INFO, which floods the limited console log
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# State of the background listener started by start_async_email_fetch
+async_loop = None
+async_task = None
+async_thread = None
+
+
+class AsyncGmailClient:
+    """
+    Minimal asyncio Gmail REST client on a pooled, keep-alive `httpx.AsyncClient`.
+
+    All calls share one connection pool and run under a semaphore of `max_concurrency`.
+    Like the discovery-client calls, each goes through the process-wide quota gateway
+    (processing.gmail_quota): it is charged its quota units, retried on transient errors
+    with Retry-After honored, and counted in the metrics. Errors are raised as
+    `googleapiclient.errors.HttpError`, so the rest of the code handles them like errors
+    from the discovery client.
+
+    The token provider runs in a worker thread, as a refresh is a blocking HTTP call. A
+    request answered 401 is retried once with a new token, after `token_invalidator`
+    (e.g. `GmailSessionManager.invalidate`) has dropped the old one.
+
+    Args:
+        token_provider (callable): Returns a valid OAuth access token.
+        base_url (str): Gmail REST base URL for the user.
+        max_concurrency (int): Maximum requests in flight.
+        timeout (float): Per-request timeout in seconds.
+        token_invalidator (callable): Drops the current token after a 401.
+    """
+    def __init__(self, token_provider, base_url=GMAIL_API_BASE_URL, max_concurrency=10, timeout=30.0,
+                 token_invalidator=None):
+        self.token_provider = token_provider
+        self.token_invalidator = token_invalidator
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def request(self, api_method, method, path, params=None, json=None):
+        """
+        Send one request through the quota gateway.
+
+        Args:
+            api_method (str): Gmail method, e.g. "messages.get", for its quota cost.
+            method (str): HTTP method.
+            path (str): Path relative to `base_url`.
+        """
+        async def send():
+            token = await asyncio.to_thread(self.token_provider)
+            async with self.semaphore:
+                headers = {"Authorization": f"Bearer {token}"}
+                response = await self.client.request(method, path, params=params, json=json, headers=headers)
+            if response.status_code >= 400:
+                raise HttpError(httplib2.Response({"status": response.status_code, **response.headers}), response.content)
+            return response.json()
+
+        try:
+            return await processing.gmail_quota.get_gmail_gateway().acall(api_method, send)
+        except HttpError as error:
+            if error.resp.status != 401:
+                raise
+            logging.warning(f"{api_method} answered 401; retrying once with a new token.")
+            if self.token_invalidator is not None:
+                await asyncio.to_thread(self.token_invalidator)
+            return await processing.gmail_quota.get_gmail_gateway().acall(api_method, send)
+
+    async def list_messages(self, query, max_results=processing.gmail_fetch.DEFAULT_PAGE_SIZE, page_token=None):
+        params = {"q": query, "maxResults": max_results}
+        if page_token:
+            params["pageToken"] = page_token
+        return await self.request("messages.list", "GET", "messages", params=params)
+
+    async def get_message(self, email_id):
+        return await self.request("messages.get", "GET", f"messages/{email_id}")
+
+    async def modify_message(self, email_id, body):
+        return await self.request("messages.modify", "POST", f"messages/{email_id}/modify", json=body)
+
+    async def batch_modify(self, body):
+        return await self.request("messages.batchModify", "POST", "messages/batchModify", json=body)
+
+    async def send_message(self, body):
+        return await self.request("messages.send", "POST", "messages/send", json=body)
+
+    async def list_labels(self):
+        return await self.request("labels.list", "GET", "labels")
+
+    async def create_label(self, body):
+        return await self.request("labels.create", "POST", "labels", json=body)
+
+
+async def resolve_labels_async(client, labels=processing.label_registry.REQUIRED_LABELS):
+    """Resolve label names to IDs with one list call, creating missing labels."""
+    existing = {label["name"]: label["id"] for label in (await client.list_labels()).get("labels", [])}
+    for label_name in labels.values():
+        if label_name not in existing:
+            label_body = {"name": label_name, "labelListVisibility": "labelShow", "messageListVisibility": "show"}
+            existing[label_name] = (await client.create_label(label_body))["id"]
+    return {key: existing[name] for key, name in labels.items()}
+
+
+async def process_emails_async(client, senders, error_recipient, labels, page_size=processing.gmail_fetch.DEFAULT_PAGE_SIZE):
+    """
+    Asyncio counterpart of `process_emails_with_transaction`, with the same storage and
+    finalize rules.
+
+    For each listed page, the emails are fetched and scraped (in worker threads)
+    concurrently. The page's jobs then go through the seen-job filter into the job sink
+    (JOB_SINK) in one write, and only then are the emails finalized: archived, error
+    notifications sent for failures, and their labels updated with one
+    messages.batchModify per outcome.
+
+    Returns:
+        Counter: "processed", "succeeded" and "failed" email counts, "label_errors" for
+        emails whose label update failed, plus "api_errors" when label updates were rate limited.
+    """
+    query = f"({' OR '.join([f'from:{sender}' for sender in senders])}) is:unread"
+    seen_filter = storage.seen_jobs.get_seen_job_filter(storage.job_store.get_job_sink())
+    outcomes = Counter()
+    page_token = None
+
+    while True:
+        results = await client.list_messages(query, max_results=page_size, page_token=page_token)
+        email_ids = [message["id"] for message in results.get("messages", [])]
+        emails = await asyncio.gather(*(_fetch_and_scrape_async(client, email_id) for email_id in email_ids))
+        await _store_and_finalize_async(client, emails, labels, error_recipient, seen_filter, outcomes)
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+
+    if not outcomes["processed"]:
+        logging.info("No new emails found.")
+    return outcomes
+
+
+async def _fetch_and_scrape_async(client, email_id):
+    """Fetch and scrape one email; returns (email_id, html_content, metadata, job_records, error)."""
+    html_content, metadata = "", None
+    try:
+        # Step 1: Fetching Email
+        started = time.perf_counter()
+        email_data = processing.gmail_fetch.parse_email_message(await client.get_message(email_id))
+        utils.metrics.observe_stage("fetch", time.perf_counter() - started)
+        html_content, metadata = email_data["html_content"], email_data["metadata"]
+
+        # Step 2: Scraping Steps (CPU bound, off the event loop)
+        job_records, seconds = await asyncio.to_thread(utils.metrics.timed, scraping.overall_scrap.scrap_html_to_records, html_content)
+        utils.metrics.observe_stage("scrape", seconds)
+        logging.info(f"Scraping successful for email: {metadata['subject']}")
+        return email_id, html_content, metadata, job_records, None
+
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # Not the email's fault: leave it unread and let the listener rebuild its credentials
+        if auth.gmail_auth.is_auth_error(e):
+            raise
+        logging.error(f"Email processing failed for ID {email_id}: {e}")
+        return email_id, html_content, metadata, None, e
+
+
+async def _store_and_finalize_async(client, emails, labels, error_recipient, seen_filter, outcomes):
+    """
+    Store the jobs of a page of scraped emails, then finalize every email of the page.
+    Emails are only finalized as successes once their jobs are stored (see
+    processing.latest_emails.store_and_finalize).
+    """
+    job_batch = scraping.overall_scrap.JobAccumulator()
+    for email_id, html_content, metadata, job_records, error in emails:
+        if error is None:
+            # Seen-job filter and buffer stay on the event loop thread; only the write leaves it
+            job_batch.add_email(job_records if seen_filter is None else seen_filter.new_records(job_records))
+    storage_error = None
+    try:
+        await asyncio.to_thread(job_batch.flush, storage.job_store.get_job_sink(), seen_filter)
+    except Exception as e:
+        logging.error(f"Storing the jobs of {job_batch.email_count} email(s) failed: {e}")
+        job_batch.clear()
+        storage_error = e
+
+    succeeded, failed = [], []
+    for email_id, html_content, metadata, job_records, error in emails:
+        error = error or storage_error
+        outcomes["processed"] += 1
+        outcomes["succeeded" if error is None else "failed"] += 1
+        (succeeded if error is None else failed).append(email_id)
+        started = time.perf_counter()
+        if metadata is None:
+            metadata = {"subject": f"Unfetched email {email_id}", "sender_email": "", "received_datetime": datetime.datetime.now()}
+        try:
+            # Step 3: Final Updates; labels follow in one batchModify per outcome
+            await asyncio.to_thread(processing.latest_emails.archive_email_html, email_id, html_content, metadata,
+                                    "success" if error is None else "failed")
+            if error is None:
+                logging.info(f"Email processed successfully: {metadata['subject']}")
+            else:
+                await client.send_message(processing.latest_emails.build_error_email(error_recipient, metadata['subject'], "Error"))
+                logging.error(f"Email processing failed for {metadata['subject']}: {error}")
+        except Exception as e:
+            logging.error(f"Finalizing email failed: {e}")
+        utils.metrics.observe_stage("finalize", time.perf_counter() - started)
+        utils.metrics.count_email(error is None)
+
+    await _apply_labels_async(client, succeeded, labels, ["success_final"], ["UNREAD", "failure_final"], outcomes)
+    await _apply_labels_async(client, failed, labels, ["failure_final"], ["UNREAD"], outcomes)
+
+
+async def _apply_labels_async(client, email_ids, labels, add, remove, outcomes):
+    """
+    Apply one label change to `email_ids` with messages.batchModify. Failed emails stay
+    unread for the next poll; auth and stale-label errors are raised to the listener loop.
+    """
+    if not email_ids:
+        return
+    body = {
+        "ids": email_ids,
+        "addLabelIds": [labels[key] for key in add],
+        "removeLabelIds": [key if key == "UNREAD" else labels[key] for key in remove],
+    }
+    try:
+        await client.batch_modify(body)
+    except HttpError as error:
+        logging.error(f"Updating the labels of {len(email_ids)} email(s) failed: {error}")
+        outcomes["label_errors"] += len(email_ids)
+        if error.resp.status == 401 or processing.label_registry.is_stale_label_error(error):
+            raise
+        if processing.gmail_quota.is_retryable_error(error):
+            outcomes["api_errors"] += 1
+
+
+async def run_email_fetch_async(token_provider, senders, error_recipient, interval=10,
+                                max_concurrency=10, base_url=GMAIL_API_BASE_URL, token_invalidator=None):
+    """
+    Poll Gmail forever on the current event loop until cancelled.
+
+    Args:
+        token_provider (callable): Returns a valid OAuth access token.
+        senders (list): List of sender email addresses to filter emails from.
+        error_recipient (str): Email address to notify in case of processing errors.
+        interval (int): Seconds between polls.
+        max_concurrency (int): Maximum Gmail requests in flight.
+        base_url (str): Gmail REST base URL (point at a stub server for testing).
+        token_invalidator (callable): Drops the current token after a 401 (see AsyncGmailClient).
+    """
+    async with AsyncGmailClient(token_provider, base_url=base_url, max_concurrency=max_concurrency,
+                                token_invalidator=token_invalidator) as client:
+        labels = None
+        while True:
+            try:
+                if labels is None:
+                    labels = await resolve_labels_async(client)
+                await process_emails_async(client, senders, error_recipient, labels)
+                print("Waiting for new emails...")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error while fetching emails: {e}")
+                if processing.label_registry.is_stale_label_error(e):
+                    labels = None
+            await asyncio.sleep(interval)
+
+
+def run_async_email_fetch(senders, error_recipient, interval=10, token_provider=None, **kwargs):
+    """
+    Run the async listener in the main thread until SIGTERM/SIGINT cancels it cleanly.
+    """
+    if token_provider is None:
+        session = auth.gmail_auth.GmailSessionManager()
+        token_provider = session.access_token
+        kwargs.setdefault("token_invalidator", session.invalidate)
+
+    async def main():
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, task.cancel)
+        await run_email_fetch_async(token_provider, senders, error_recipient, interval, **kwargs)
+
+    try:
+        asyncio.run(main())
+    except asyncio.CancelledError:
+        print("Email fetching stopped.")
+
+
+def start_async_email_fetch(service, senders, error_recipient, interval=10, token_provider=None, **kwargs):
+    """
+    Drop-in alternative to `start_email_fetch`: runs the asyncio listener on a background thread.
+
+    Args:
+        service: Unused; kept for signature compatibility. Pass it to `stop_async_email_fetch`
+            for the stop notification.
+        senders (list): List of sender email addresses to filter emails from.
+        error_recipient (str): Email address to notify in case of processing errors.
+        interval (int): Time interval (in seconds) between email fetch attempts.
+        token_provider (callable): Returns an access token; defaults to a GmailSessionManager.
+        **kwargs: `max_concurrency`, `base_url` and `token_invalidator` for `run_email_fetch_async`.
+    """
+    global async_loop, async_task, async_thread
+
+    if async_thread is not None:
+        print("Email fetching is already running.")
+        return
+
+    if token_provider is None:
+        session = auth.gmail_auth.GmailSessionManager()
+        token_provider = session.access_token
+        kwargs.setdefault("token_invalidator", session.invalidate)
+    ready = threading.Event()
+
+    def run_loop():
+        global async_loop, async_task
+        async_loop = asyncio.new_event_loop()
+        async_task = async_loop.create_task(
+            run_email_fetch_async(token_provider, senders, error_recipient, interval, **kwargs)
+        )
+        ready.set()
+        try:
+            async_loop.run_until_complete(async_task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error in email fetching thread: {e}")
+        finally:
+            async_loop.close()
+            storage.seen_jobs.close_seen_job_filter()
+
+    # Docker stop sends SIGTERM; both signals cancel the task instead of killing the process
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_async_email_fetch())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_async_email_fetch())
+
+    async_thread = threading.Thread(target=run_loop, name="async-email-fetch", daemon=True)
+    async_thread.start()
+    ready.wait()
+    print("Email fetching started.")
+
+
+def stop_async_email_fetch(service=None, user_email=None):
+    """
+    Cancel the background listener and wait for in-flight requests to unwind, then
+    notify `user_email` through `service` when both are given, like `stop_email_fetch`.
+    """
+    global async_loop, async_task, async_thread
+
+    if async_thread is None:
+        print("Email fetching is not running.")
+        return
+
+    try:
+        async_loop.call_soon_threadsafe(async_task.cancel)
+    except RuntimeError:
+        # The loop already closed (the listener thread ended on its own)
+        pass
+    async_thread.join()
+    async_loop, async_task, async_thread = None, None, None
+    print("Email fetching stopped.")
+
+    if service and user_email:
+        listener.gmail_listener.send_email(
+            service=service,
+            to_email=user_email,
+            subject="Scraper Stopped",
+            body="The email scraper has been stopped."
+        )
@@ -1,19 +1,140 @@
+import os
+import base64
 import threading
 import time
+import random
+import logging
+from datetime import datetime
+import pytz
+from croniter import croniter
 import processing.latest_emails 
+import processing.pipeline
+import listener.history_sync
 import auth.gmail_auth
+import processing.gmail_fetch
+import storage.seen_jobs
 import atexit
 import signal
+from email.mime.text import MIMEText
 
 
 
 # Global variable to control the fetching process
 is_fetching = False
 fetch_thread = None
+# Set by stop_email_fetch to cut the wait between polls short
+fetch_stop = threading.Event()
 
 
 
-def start_email_fetch(service, senders, error_recipient, interval=10):
+# Supported polling strategies for start_email_fetch
+SYNC_MODES = ("query", "history")
+
+# Adaptive polling: fastest and slowest interval (seconds), and the interval during quiet hours
+MIN_POLL_INTERVAL = 2
+MAX_POLL_INTERVAL = 300
+QUIET_POLL_INTERVAL = 900
+# Cron expressions (";"-separated) matching the minutes that are quiet hours, e.g. "* 0-6 * * *"
+QUIET_HOURS_ENV = "POLL_QUIET_HOURS"
+QUIET_HOURS_TIMEZONE = "America/Toronto"
+
+
+class AdaptivePollScheduler:
+    """
+    Chooses the wait before the next poll from what the last polls found.
+
+    - Burst: a poll that processed emails multiplies the interval by `burst_factor`
+      (down to `min_interval`), since alerts tend to arrive together.
+    - Quiet: each poll that found nothing multiplies it by `backoff_factor`, up to
+      `max_interval`.
+    - Errors: a streak of failed polls backs off from `base_interval` by `backoff_factor`
+      per error, up to `max_interval`, whatever the interval was.
+    - Quiet hours: while the current minute matches one of the `quiet_hours` cron
+      expressions, polls are `quiet_interval` apart.
+
+    Every wait is spread by +/- `jitter` (a fraction), so restarts and retries do not
+    line up.
+
+    Args:
+        base_interval (float): Starting interval, and the base of the error backoff.
+        min_interval (float): Shortest interval in a burst.
+        max_interval (float): Longest interval from backoff.
+        burst_factor (float): Interval multiplier after a poll with emails.
+        backoff_factor (float): Interval multiplier after an empty or failed poll.
+        jitter (float): Relative random spread of each wait.
+        quiet_hours (str or list): Cron expression(s) for quiet hours; defaults to the
+            POLL_QUIET_HOURS environment variable.
+        quiet_interval (float): Interval during quiet hours.
+        timezone (str): Timezone the quiet hours are in.
+    """
+    def __init__(self, base_interval=10, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL,
+                 burst_factor=0.5, backoff_factor=2.0, jitter=0.1, quiet_hours=None,
+                 quiet_interval=QUIET_POLL_INTERVAL, timezone=QUIET_HOURS_TIMEZONE):
+        if quiet_hours is None:
+            quiet_hours = os.environ.get(QUIET_HOURS_ENV, "")
+        if isinstance(quiet_hours, str):
+            quiet_hours = [expression.strip() for expression in quiet_hours.split(";") if expression.strip()]
+        for expression in quiet_hours:
+            if not croniter.is_valid(expression):
+                raise ValueError(f"Invalid quiet-hours cron expression {expression!r}.")
+
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.burst_factor = burst_factor
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.quiet_hours = quiet_hours
+        self.quiet_interval = quiet_interval
+        self.timezone = pytz.timezone(timezone)
+        self.interval = base_interval
+        self.idle_streak = 0
+        self.error_streak = 0
+        self.polls = 0
+
+    def is_quiet(self, now=None):
+        """True if `now` (default: the current time) falls in the quiet hours."""
+        if not self.quiet_hours:
+            return False
+        now = now or datetime.now(self.timezone)
+        return any(croniter.match(expression, now) for expression in self.quiet_hours)
+
+    def next_delay(self, emails=0, error=False, now=None):
+        """
+        Record the outcome of a poll and return the seconds to wait before the next one.
+
+        Args:
+            emails (int): Emails the poll processed.
+            error (bool): The poll failed.
+            now (datetime): Current time, for the quiet-hours check.
+        """
+        self.polls += 1
+        if error:
+            self.error_streak += 1
+            self.interval = min(self.max_interval, self.base_interval * self.backoff_factor ** self.error_streak)
+        else:
+            self.error_streak = 0
+            if emails:
+                self.idle_streak = 0
+                self.interval = max(self.min_interval, self.interval * self.burst_factor)
+            else:
+                self.idle_streak += 1
+                self.interval = min(self.max_interval, self.interval * self.backoff_factor)
+
+        interval = self.quiet_interval if self.is_quiet(now) else self.interval
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def stats(self):
+        return {
+            "polls": self.polls,
+            "interval": self.interval,
+            "idle_streak": self.idle_streak,
+            "error_streak": self.error_streak,
+        }
+
+
+def start_email_fetch(service, senders, error_recipient, interval=10, sync_mode="query", pipelined=False,
+                      adaptive=True, scheduler=None, session=None):
     """
     Start continuously fetching new emails at the specified interval.
 
@@ -21,10 +142,25 @@ def start_email_fetch(service, senders, error_recipient, interval=10):
         service: The Gmail API service instance.
         senders (list): List of sender email addresses to filter emails from.
         error_recipient (str): Email address to notify in case of processing errors.
-        interval (int): Time interval (in seconds) between email fetch attempts.
+        interval (int): Time interval (in seconds) between email fetch attempts; the
+            starting interval when `adaptive`.
+        sync_mode (str): "query" re-runs the full unread search every poll; "history" asks the
+            Gmail history API what changed and only searches when new mail arrived, which
+            makes 2-3 second intervals affordable.
+        pipelined (bool): Process each poll with the concurrent fetch/scrape/finalize
+            pipeline instead of one email at a time.
+        adaptive (bool): Adapt the interval to the traffic with an AdaptivePollScheduler;
+            False keeps a fixed `interval`.
+        scheduler (AdaptivePollScheduler): Scheduler to use instead of a default one.
+        session: Provides the Gmail clients (`get_service`, `new_service`, `invalidate`),
+            e.g. the GmailSessionManager `service` came from. Without one, every poll and
+            thread uses `service` itself (see StaticGmailSession).
     """
     global is_fetching, fetch_thread
 
+    if sync_mode not in SYNC_MODES:
+        raise ValueError(f"Unknown sync_mode {sync_mode!r}; expected one of {SYNC_MODES}.")
+
     # # Refreshing Gmail auth
     # service = auth.gmail_auth.authenticate_gmail()
 
@@ -33,26 +169,68 @@ def start_email_fetch(service, senders, error_recipient, interval=10):
         return
 
     is_fetching = True
+    fetch_stop.clear()
+    if scheduler is None and adaptive:
+        scheduler = AdaptivePollScheduler(base_interval=interval)
+
+    if session is None:
+        session = auth.gmail_auth.StaticGmailSession(service)
+
+    # Pipelined polls share one pipeline: its pools and per-thread clients outlive a poll
+    pipeline = processing.pipeline.EmailPipeline(service_factory=session.new_service) if pipelined else None
+
+    def process_emails(service, senders, error_recipient):
+        if pipeline is not None:
+            return pipeline.process(service, senders, error_recipient)
+        return processing.latest_emails.process_emails_with_transaction(service, senders, error_recipient)
 
     def fetch_emails():
         """Function to continuously fetch emails."""
         try:
             while is_fetching:
+                outcomes, failed = {}, False
                 try:
 
-                    # Keep revalidating gmail auth
-                    service = auth.gmail_auth.authenticate_gmail()
+                    # Reuse the gmail session; it only rebuilds after an auth failure
+                    service = session.get_service()
                     
-                    processing.latest_emails.process_emails_with_transaction(
-                        service, senders, error_recipient
-                    )
+                    if sync_mode == "history":
+                        # History mode only runs the full query when mail arrived; keep its counts
+                        cycle = {}
+
+                        def process_and_count(service, senders, error_recipient):
+                            cycle["outcomes"] = process_emails(service, senders, error_recipient)
+                            return cycle["outcomes"]
+
+                        listener.history_sync.sync_emails_incrementally(
+                            service, senders, error_recipient, process=process_and_count
+                        )
+                        outcomes = cycle.get("outcomes", {})
+                    else:
+                        outcomes = process_emails(service, senders, error_recipient)
+                    failed = bool(outcomes.get("api_errors"))
                     print("Waiting for new emails...")
                 except Exception as e:
+                    failed = True
                     print(f"Error while fetching emails: {e}")
-                time.sleep(interval)
+                    if auth.gmail_auth.is_auth_error(e):
+                        session.invalidate()
+                        if pipeline is not None:
+                            pipeline.reset_clients()
+
+                if scheduler is None:
+                    delay = interval
+                else:
+                    delay = scheduler.next_delay(emails=outcomes.get("processed", 0), error=failed)
+                    logging.debug(f"Next poll in {delay:.1f}s ({scheduler.stats()}).")
+                fetch_stop.wait(delay)
         except Exception as e:
             print(f"Error in email fetching thread: {e}")
         finally:
+            if pipeline is not None:
+                pipeline.close()
+            # The signal handler ends the process with os._exit, which skips atexit
+            storage.seen_jobs.close_seen_job_filter()
             stop_email_fetch(service, error_recipient)
 
     # Register signal handlers
@@ -83,6 +261,7 @@ def stop_email_fetch(service=None, user_email=None):
         return
 
     is_fetching = False
+    fetch_stop.set()
 
     if fetch_thread:
         fetch_thread.join()
@@ -115,7 +294,8 @@ def send_email(service, to_email, subject, body):
     raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
     
     try:
-        service.users().messages().send(userId="me", body={'raw': raw_message}).execute()
+        processing.gmail_fetch.retry_api_call(
+            lambda: service.users().messages().send(userId="me", body={'raw': raw_message}).execute(), method="messages.send")
         print(f"Notification email sent to {to_email}")
     except Exception as e:
         print(f"Failed to send notification email: {e}")
\ No newline at end of file
@@ -0,0 +1,167 @@
+import os
+import json
+import logging
+from googleapiclient.errors import HttpError
+import processing.latest_emails
+import processing.gmail_fetch
+
+# Where the last processed mailbox historyId is persisted between runs
+HISTORY_STATE_PATH = os.path.join("data", "state", "gmail_history.json")
+
+
+class HistoryExpiredError(Exception):
+    """Raised when Gmail no longer has history for the stored start history ID."""
+
+
+def load_history_state(state_path=HISTORY_STATE_PATH):
+    """
+    Load the persisted history state: {"historyId": ..., "incomplete": ...}, or {} if
+    there is no usable state. "incomplete" is True when the last cycle did not finish.
+    """
+    try:
+        with open(state_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable history state {state_path}: {e}")
+        return {}
+
+
+def load_history_id(state_path=HISTORY_STATE_PATH):
+    """Load the persisted historyId, or None if there is no usable state."""
+    return load_history_state(state_path).get("historyId")
+
+
+def save_history_id(history_id, state_path=HISTORY_STATE_PATH, incomplete=False):
+    """
+    Persist the historyId atomically so a crash never leaves a half-written file.
+    With `incomplete`, the next poll runs a full query whatever the history says.
+    """
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({"historyId": str(history_id), "incomplete": incomplete}, file)
+    os.replace(temp_path, state_path)
+
+
+def get_current_history_id(service):
+    """Return the mailbox's current historyId."""
+    profile = processing.gmail_fetch.retry_api_call(lambda: service.users().getProfile(userId='me').execute(),
+                                                    method="users.getProfile")
+    return profile["historyId"]
+
+
+def list_added_message_ids(service, start_history_id):
+    """
+    List unread messages added to the mailbox since `start_history_id`.
+
+    Args:
+        service: The Gmail API service instance.
+        start_history_id (str): The last historyId already processed.
+
+    Returns:
+        tuple: (list of new unread message IDs, latest mailbox historyId)
+
+    Raises:
+        HistoryExpiredError: If Gmail answers 404 because the history ID is too old.
+    """
+    message_ids = []
+    latest_history_id = start_history_id
+    page_token = None
+
+    def list_history_page():
+        try:
+            return service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                pageToken=page_token
+            ).execute()
+        except HttpError as error:
+            # Expiry is final, so raise it outside HttpError to skip the retries
+            if error.resp.status == 404:
+                raise HistoryExpiredError(f"History ID {start_history_id} has expired.") from error
+            raise
+
+    while True:
+        results = processing.gmail_fetch.retry_api_call(list_history_page, method="history.list")
+
+        for record in results.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message = added['message']
+                if 'UNREAD' in message.get('labelIds', []) and message['id'] not in message_ids:
+                    message_ids.append(message['id'])
+
+        latest_history_id = results.get('historyId', latest_history_id)
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return message_ids, latest_history_id
+
+
+def sync_emails_incrementally(service, senders, error_recipient, state_path=HISTORY_STATE_PATH,
+                              process=processing.latest_emails.process_emails_with_transaction):
+    """
+    Run one poll in history mode.
+
+    Asks `users().history().list` what arrived since the persisted historyId and only runs
+    the full `from:... is:unread` query when new unread mail was added. On the first run,
+    when the stored history ID has expired, or when the previous cycle did not complete,
+    it falls back to a full query.
+
+    Args:
+        service: The Gmail API service instance.
+        senders (list): List of sender email addresses to filter emails from.
+        error_recipient (str): Email address to notify in case of processing errors.
+        state_path (str): File holding the persisted historyId.
+        process (callable): Runs the full query, `process(service, senders, error_recipient)`,
+            and returns its outcomes Counter. A cycle whose outcomes hold "api_errors", or
+            that raises, is incomplete: the historyId is saved marked as such, so the next
+            poll runs the full query again instead of trusting the history.
+
+    Returns:
+        bool: True if a full query was run this poll.
+    """
+    state = load_history_state(state_path)
+    start_history_id = state.get("historyId")
+
+    if start_history_id is not None and state.get("incomplete"):
+        logging.info("The previous cycle did not complete; running a full query.")
+    elif start_history_id is not None:
+        try:
+            added_ids, latest_history_id = list_added_message_ids(service, start_history_id)
+        except HistoryExpiredError as e:
+            logging.warning(f"{e} Falling back to a full query.")
+        else:
+            if not added_ids:
+                save_history_id(latest_history_id, state_path)
+                return False
+            logging.info(f"{len(added_ids)} new unread email(s) since history ID {start_history_id}.")
+            run_cycle(service, senders, error_recipient, process, latest_history_id, state_path)
+            return True
+
+    # Full sync: take the history ID first so mail arriving mid-query shows up next poll
+    latest_history_id = get_current_history_id(service)
+    run_cycle(service, senders, error_recipient, process, latest_history_id, state_path)
+    return True
+
+
+def run_cycle(service, senders, error_recipient, process, latest_history_id, state_path=HISTORY_STATE_PATH):
+    """Run the full query and save `latest_history_id`, marked incomplete unless the cycle completed."""
+    try:
+        outcomes = process(service, senders, error_recipient)
+    except Exception:
+        save_history_id(latest_history_id, state_path, incomplete=True)
+        raise
+    save_history_id(latest_history_id, state_path, incomplete=not cycle_completed(outcomes))
+
+
+def cycle_completed(outcomes):
+    """
+    True if a processing cycle finished without API errors. Otherwise the next poll runs
+    the full query again, so the emails the cycle missed are found.
+    """
+    if outcomes and outcomes.get("api_errors"):
+        logging.warning("Processing cycle hit API errors; the next poll runs a full query.")
+        return False
+    return True
@@ -14,6 +14,7 @@ import threading
 import os
 import subprocess
 import auth.gmail_auth
+import utils.metrics
 import utils.html_module 
 import processing.latest_emails 
 import scraping.scrap_job_blocks
@@ -32,11 +33,16 @@ ERROR_NOTIFICATION_EMAIL = "malikhqtech@gmail.com"
 
 
 if __name__ == "__main__":
+    # One long-lived client for the listener: built once, token refreshed ahead of expiry
+    session = auth.gmail_auth.GmailSessionManager()
     try:
-        service = auth.gmail_auth.authenticate_gmail()
+        service = session.get_service()
         print("Gmail API authenticated successfully!")
     except Exception as e:
         print("Error during authentication:", e)
             
+    # Prometheus endpoint on http://127.0.0.1:$METRICS_PORT/metrics (default 9464)
+    utils.metrics.start_metrics_server()
         
-    listener.gmail_listener.start_email_fetch(service, SEARCH_SENDERS, ERROR_NOTIFICATION_EMAIL, interval=10)
\ No newline at end of file
+    listener.gmail_listener.start_email_fetch(service, SEARCH_SENDERS, ERROR_NOTIFICATION_EMAIL, interval=10,
+                                               session=session)
\ No newline at end of file
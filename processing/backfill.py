@@ -0,0 +1,285 @@
+"""
+Backfill: re-scrape archived email HTML into a job sink.
+
+Enumerates the emails in the email archive (storage.email_archive) and the legacy
+per-email files (`data/<Name>___<email>/...` from save_email_html and
+`data/failed_emails/...`), scrapes them in chunks on a process pool and writes each
+chunk's jobs to a job sink as one idempotent batch (see the sinks' `batch_id`).
+Dates ("N days ago", fetched_date) are relative to each email's received time.
+
+Progress is journaled to an append-only checkpoint file: a "start" line with the item
+ids of a chunk before it is submitted, and a "done" line once its jobs are stored. An
+interrupted run resumes from the journal: done chunks are skipped and started chunks
+are re-run with the same batch id, so they replace rather than duplicate their jobs.
+
+Usage (from the repository root):
+    python -m processing.backfill --sink parquet --output data/parquet/backfill --workers 8
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import scraping.overall_scrap
+import storage.email_archive
+import storage.job_store
+
+BACKFILL_CHECKPOINT_PATH = "data/state/backfill.jsonl"
+BACKFILL_OUTPUT_DIR = "data/parquet/backfill"
+DEFAULT_CHUNK_SIZE = 100
+# Seconds between progress log lines
+PROGRESS_INTERVAL = 10.0
+
+
+def iter_backfill_items(archive=None, data_dir="data"):
+    """
+    Enumerate the emails to re-scrape as picklable work items.
+
+    Archived emails come first; a legacy file that was already migrated into the archive
+    (same "legacy:<path>" message id and status) is only listed once.
+
+    Args:
+        archive (EmailArchive): Archive to read, or None.
+        data_dir (str): Root of the legacy per-email tree, or None.
+
+    Yields:
+        dict: id, source ("archive" blob location or "file" path) and received_datetime.
+    """
+    listed = set()
+    if archive is not None:
+        for row in archive.find():
+            location = archive.locate(row["hash"])
+            if location is None:
+                continue
+            item_id = f"{row['status']}:{row['message_id']}"
+            listed.add(item_id)
+            received = datetime.datetime.fromisoformat(row["received_at"]) if row["received_at"] else None
+            yield {"id": item_id, "source": ("archive", *location), "received_datetime": received}
+
+    if data_dir and os.path.isdir(data_dir):
+        for legacy_file in storage.email_archive.iter_legacy_html_files(data_dir):
+            item_id = f"{legacy_file['status']}:{legacy_file['message_id']}"
+            if item_id in listed:
+                continue
+            yield {"id": item_id, "source": ("file", legacy_file["path"]),
+                   "received_datetime": legacy_file["received_datetime"]}
+
+
+def read_item_html(item):
+    """HTML of a work item, read from its archive segment or legacy file."""
+    source = item["source"]
+    if source[0] == "archive":
+        return storage.email_archive.read_blob(*source[1:])
+    with open(source[1], "r", encoding="utf-8") as file:
+        return file.read()
+
+
+def scrape_chunk(items):
+    """
+    Read and scrape a chunk of work items. Runs in a worker process.
+
+    Returns:
+        tuple: (list of JobRecords, list of (item id, error message) for unreadable or unscrapable items).
+    """
+    records, errors = [], []
+    for item in items:
+        try:
+            records.extend(scraping.overall_scrap.scrap_html_to_records(read_item_html(item), item["received_datetime"]))
+        except Exception as e:
+            errors.append((item["id"], f"{type(e).__name__}: {e}"))
+    return records, errors
+
+
+def chunk_batch_id(item_ids):
+    """Deterministic batch id of a chunk, from its item ids."""
+    return "backfill-" + hashlib.sha1("\n".join(item_ids).encode("utf-8")).hexdigest()[:16]
+
+
+class BackfillCheckpoint:
+    """
+    Append-only journal of backfill chunks (JSON lines).
+
+    `started` maps batch ids to the item ids of chunks that were submitted, `done` holds
+    the batch ids whose jobs are stored. A torn last line (crash mid-write) is ignored.
+
+    Args:
+        path (str): Journal file.
+    """
+    def __init__(self, path=BACKFILL_CHECKPOINT_PATH):
+        self.path = path
+        self.started = {}
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry["event"] == "start":
+                        self.started[entry["batch_id"]] = entry["items"]
+                    elif entry["event"] == "done":
+                        self.done.add(entry["batch_id"])
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._journal = open(path, "a", encoding="utf-8")
+
+    def done_items(self):
+        """Item ids of every stored chunk."""
+        return {item_id for batch_id in self.done for item_id in self.started.get(batch_id, ())}
+
+    def unfinished_chunks(self):
+        """(batch id, item ids) of chunks that were started but not stored."""
+        return [(batch_id, items) for batch_id, items in self.started.items() if batch_id not in self.done]
+
+    def start(self, batch_id, item_ids):
+        if batch_id not in self.started:
+            self.started[batch_id] = item_ids
+            self._append({"event": "start", "batch_id": batch_id, "items": item_ids})
+
+    def finish(self, batch_id, job_count, error_count):
+        self.done.add(batch_id)
+        self._append({"event": "done", "batch_id": batch_id, "jobs": job_count, "errors": error_count})
+
+    def _append(self, entry):
+        self._journal.write(json.dumps(entry) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def close(self):
+        self._journal.close()
+
+    @staticmethod
+    def reset(path=BACKFILL_CHECKPOINT_PATH):
+        """Forget all progress, so the next run re-scrapes everything."""
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_backfill(sink, archive=None, data_dir="data", checkpoint_path=BACKFILL_CHECKPOINT_PATH,
+                 workers=None, chunk_size=DEFAULT_CHUNK_SIZE, limit=None):
+    """
+    Re-scrape every archived email into `sink`, resuming from the checkpoint.
+
+    Chunks of `chunk_size` emails are scraped on `workers` processes (at most two chunks
+    per worker in flight); the calling process writes each chunk's jobs as one batch,
+    then journals the chunk as done.
+
+    Args:
+        sink: Job sink (see storage.job_store); its `write` must accept `batch_id`.
+        archive (EmailArchive): Archive to re-scrape, or None.
+        data_dir (str): Root of the legacy per-email tree, or None.
+        checkpoint_path (str): Progress journal.
+        workers (int): Scraping processes; defaults to the CPU count.
+        chunk_size (int): Emails per chunk (and per sink batch).
+        limit (int): Stop after this many new emails, e.g. for a trial run.
+
+    Returns:
+        dict: files, jobs, errors, seconds, files_per_second and skipped (already done) counts.
+    """
+    checkpoint = BackfillCheckpoint(checkpoint_path)
+    items = {item["id"]: item for item in iter_backfill_items(archive, data_dir)}
+    done_items = checkpoint.done_items()
+
+    # Unfinished chunks keep their batch ids; their items may have disappeared meanwhile
+    chunks, queued = [], set()
+    for batch_id, item_ids in checkpoint.unfinished_chunks():
+        chunks.append((batch_id, [items[item_id] for item_id in item_ids if item_id in items]))
+        queued.update(item_ids)
+    remaining = [item for item_id, item in items.items() if item_id not in done_items and item_id not in queued]
+    if limit is not None:
+        remaining = remaining[:max(0, limit - sum(len(chunk) for _, chunk in chunks))]
+    for start in range(0, len(remaining), chunk_size):
+        chunk = remaining[start:start + chunk_size]
+        chunks.append((chunk_batch_id([item["id"] for item in chunk]), chunk))
+
+    stats = {"files": 0, "jobs": 0, "errors": 0, "skipped": len(done_items & items.keys())}
+    logging.info(f"Backfill: {sum(len(chunk) for _, chunk in chunks)} email(s) in {len(chunks)} chunk(s), "
+                 f"{stats['skipped']} already done.")
+
+    workers = workers or os.cpu_count() or 1
+    started_at = last_report = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            pending = {}
+            next_chunk = 0
+            while next_chunk < len(chunks) or pending:
+                while next_chunk < len(chunks) and len(pending) < 2 * workers:
+                    batch_id, chunk = chunks[next_chunk]
+                    checkpoint.start(batch_id, [item["id"] for item in chunk])
+                    pending[pool.submit(scrape_chunk, chunk)] = (batch_id, len(chunk))
+                    next_chunk += 1
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch_id, file_count = pending.pop(future)
+                    records, errors = future.result()
+                    for item_id, error in errors:
+                        logging.error(f"Backfill could not scrape {item_id}: {error}")
+                    if records:
+                        jobs = scraping.overall_scrap.JobAccumulator()
+                        jobs.extend(records)
+                        sink.write(jobs.columns, batch_id=batch_id)
+                        sink.flush()
+                    checkpoint.finish(batch_id, len(records), len(errors))
+                    stats["files"] += file_count
+                    stats["jobs"] += len(records)
+                    stats["errors"] += len(errors)
+
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    logging.info(f"Backfill: {stats['files']} file(s), {stats['jobs']} job(s), "
+                                 f"{stats['files'] / (now - started_at):.1f} files/s.")
+    finally:
+        checkpoint.close()
+
+    stats["seconds"] = time.perf_counter() - started_at
+    stats["files_per_second"] = stats["files"] / stats["seconds"] if stats["seconds"] else 0.0
+    logging.info(f"Backfill done: {stats['files']} file(s), {stats['jobs']} job(s), {stats['errors']} error(s) "
+                 f"in {stats['seconds']:.1f}s ({stats['files_per_second']:.1f} files/s).")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data", help="Root of the legacy per-email HTML tree.")
+    parser.add_argument("--archive-dir", default=storage.email_archive.EMAIL_ARCHIVE_DIR)
+    parser.add_argument("--skip-archive", action="store_true", help="Only re-scrape the legacy tree.")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only re-scrape the archive.")
+    parser.add_argument("--sink", choices=storage.job_store.JOB_SINKS, default="parquet")
+    parser.add_argument("--output", default=BACKFILL_OUTPUT_DIR,
+                        help="Parquet dataset directory or SQLite file (the CSV sink always writes to data/raw_processed).")
+    parser.add_argument("--checkpoint", default=BACKFILL_CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and re-scrape everything.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", force=True)
+
+    archive = None
+    if not args.skip_archive and os.path.exists(os.path.join(args.archive_dir, "index.sqlite")):
+        archive = storage.email_archive.EmailArchive(root=args.archive_dir)
+    sink_options = {"parquet": {"root": args.output}, "sqlite": {"path": args.output}}.get(args.sink, {})
+    sink = storage.job_store.create_job_sink(args.sink, **sink_options)
+
+    if args.restart:
+        BackfillCheckpoint.reset(args.checkpoint)
+    try:
+        stats = run_backfill(sink, archive=archive, data_dir=None if args.skip_legacy else args.data_dir,
+                             checkpoint_path=args.checkpoint, workers=args.workers,
+                             chunk_size=args.chunk_size, limit=args.limit)
+    finally:
+        sink.close()
+        if archive is not None:
+            archive.close()
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
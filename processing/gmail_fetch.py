@@ -0,0 +1,202 @@
+import base64
+import logging
+from email.utils import parsedate_to_datetime
+from googleapiclient.errors import HttpError
+import utils.metrics
+import processing.gmail_quota
+
+# Gmail accepts at most 100 calls per HTTP batch request; Google recommends 50
+# to stay clear of per-user concurrency limits.
+GMAIL_BATCH_LIMIT = 100
+DEFAULT_BATCH_SIZE = 50
+
+# `messages().list` returns 100 ids per page by default and at most 500.
+GMAIL_MAX_PAGE_SIZE = 500
+DEFAULT_PAGE_SIZE = 100
+
+
+def retry_api_call(call, method=None, count=1, retries=3, delay=2):
+    """
+    Run an API call through the process-wide quota gateway (processing.gmail_quota),
+    which charges its quota units, retries transient errors and honors Retry-After.
+
+    Args:
+        call (callable): Executes the request.
+        method (str): Gmail method of the call, e.g. "messages.get", for its quota cost.
+        count (int): Calls of `method` made by `call` (batch requests).
+    """
+    return processing.gmail_quota.get_gmail_gateway().call(method, call, count=count, retries=retries, delay=delay)
+
+
+def list_message_ids(service, query, page_size=DEFAULT_PAGE_SIZE, chunk_size=DEFAULT_BATCH_SIZE):
+    """
+    Lazily list the IDs of messages matching a query, following `nextPageToken`.
+
+    The next page is only requested once the caller has consumed the current one, so a
+    large backlog is never held in memory at once.
+
+    Args:
+        service: The Gmail API service instance.
+        query (str): Gmail search query.
+        page_size (int): `maxResults` per `messages().list` call, capped at GMAIL_MAX_PAGE_SIZE.
+        chunk_size (int): Maximum number of IDs per yielded chunk.
+
+    Yields:
+        list: Message IDs, at most `chunk_size` per chunk.
+    """
+    page_size = max(1, min(page_size, GMAIL_MAX_PAGE_SIZE))
+    page_token = None
+
+    while True:
+        results = retry_api_call(lambda: service.users().messages().list(
+            userId='me', q=query, maxResults=page_size, pageToken=page_token
+        ).execute(), method="messages.list")
+        if page_token is None:
+            utils.metrics.set_backlog(results.get('resultSizeEstimate', 0))
+        email_ids = [message['id'] for message in results.get('messages', [])]
+
+        for start in range(0, len(email_ids), chunk_size):
+            yield email_ids[start:start + chunk_size]
+
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+
+def stream_emails(service, query, page_size=DEFAULT_PAGE_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream fetched emails for a query: list a page, batch-fetch it, yield records, repeat.
+
+    Args:
+        service: The Gmail API service instance.
+        query (str): Gmail search query.
+        page_size (int): `maxResults` per list call.
+        batch_size (int): Calls per batch `get` request.
+
+    Yields:
+        dict: Records as produced by `fetch_emails_batched`.
+    """
+    for email_ids in list_message_ids(service, query, page_size=page_size, chunk_size=batch_size):
+        yield from fetch_emails_batched(service, email_ids, batch_size=batch_size)
+
+
+def parse_email_message(msg):
+    """
+    Decode the HTML body and extract metadata from a `messages().get` response.
+
+    Args:
+        msg (dict): The Gmail message resource.
+
+    Returns:
+        dict: {"html_content": str, "metadata": {"subject", "sender_email", "received_datetime"}}
+    """
+    payload = msg['payload']
+    headers = payload['headers']
+
+    # Extract metadata
+    subject = next((header['value'] for header in headers if header['name'] == 'Subject'), "No Subject")
+    sender_email = next((header['value'] for header in headers if header['name'] == 'From'), None)
+    received_date = next((header['value'] for header in headers if header['name'] == 'Date'), None)
+
+    if not received_date:
+        raise Exception("No received date found in email headers.")
+    received_datetime = parsedate_to_datetime(received_date)
+
+    # Extract HTML content
+    parts = payload.get('parts', [])
+    html_content = None
+    for part in parts:
+        if part['mimeType'] == 'text/html':
+            html_content = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+            break
+    if not html_content:
+        raise Exception("No HTML content found in email.")
+
+    return {"html_content": html_content, "metadata": {"subject": subject, "sender_email": sender_email, "received_datetime": received_datetime}}
+
+
+def fetch_emails_batched(service, email_ids, batch_size=DEFAULT_BATCH_SIZE, retries=3, delay=2):
+    """
+    Fetch emails through Gmail HTTP batch requests and yield decoded records as each batch returns.
+
+    Calls that fail with a retryable `HttpError` (rate limits, transient 5xx) are re-batched
+    and retried, after the Retry-After of a rate-limit error or with exponential backoff;
+    other errors are final.
+
+    Args:
+        service: The Gmail API service instance.
+        email_ids (iterable): Message IDs to fetch.
+        batch_size (int): Calls per batch request, capped at GMAIL_BATCH_LIMIT.
+        retries (int): Attempts per message before giving up.
+        delay (int): Initial backoff delay in seconds.
+
+    Yields:
+        dict: {"email_id", "html_content", "metadata", "error"}; `error` is None on success,
+        otherwise the exception and the content fields are None.
+    """
+    batch_size = max(1, min(batch_size, GMAIL_BATCH_LIMIT))
+    email_ids = list(email_ids)
+
+    for start in range(0, len(email_ids), batch_size):
+        chunk = email_ids[start:start + batch_size]
+        records = {}
+        pending = chunk
+        attempt_delay = delay
+
+        for attempt in range(retries):
+            responses = _execute_get_batch(service, pending)
+            retry_ids = []
+            for email_id in pending:
+                response, exception = responses[email_id]
+                if exception is None:
+                    try:
+                        records[email_id] = {"email_id": email_id, **parse_email_message(response), "error": None}
+                        continue
+                    except Exception as e:
+                        exception = e
+                if processing.gmail_quota.is_retryable_error(exception) and attempt < retries - 1:
+                    retry_ids.append((email_id, exception))
+                else:
+                    logging.error(f"Failed to fetch email with ID {email_id}: {exception}")
+                    records[email_id] = {"email_id": email_id, "html_content": None, "metadata": None, "error": exception}
+
+            if not retry_ids:
+                break
+            logging.warning(f"Retrying {len(retry_ids)} email fetch(es).")
+            # A rate-limit error pauses the quota gateway for every thread; otherwise sleep here
+            errors = [exception for _, exception in retry_ids]
+            processing.gmail_quota.get_gmail_gateway().backoff(
+                next((e for e in errors if processing.gmail_quota.is_rate_limit_error(e)), errors[0]), attempt_delay)
+            attempt_delay *= 2
+            pending = [email_id for email_id, _ in retry_ids]
+
+        for email_id in chunk:
+            yield records[email_id]
+
+
+def _execute_get_batch(service, email_ids):
+    """
+    Run one batch of `messages().get` calls.
+
+    Returns:
+        dict: email_id -> (response, exception)
+    """
+    responses = {}
+
+    def callback(request_id, response, exception):
+        responses[request_id] = (response, exception)
+
+    batch = service.new_batch_http_request(callback=callback)
+    for email_id in email_ids:
+        batch.add(service.users().messages().get(userId='me', id=email_id), request_id=email_id)
+
+    try:
+        with utils.metrics.stage_timer("fetch"):
+            # Single attempt: fetch_emails_batched re-batches whatever failed
+            retry_api_call(batch.execute, method="messages.get", count=len(email_ids), retries=1)
+    except HttpError as e:
+        # The whole batch was rejected; report the error against every call in it
+        for email_id in email_ids:
+            responses.setdefault(email_id, (None, e))
+
+    return responses
@@ -0,0 +1,268 @@
+import os
+import time
+import asyncio
+import logging
+import datetime
+import threading
+from email.utils import parsedate_to_datetime
+from googleapiclient.errors import HttpError
+import utils.metrics
+
+# Gmail API quota units per call; a batch request costs the sum of its calls
+GMAIL_QUOTA_UNITS = {
+    "messages.list": 5,
+    "messages.get": 5,
+    "messages.modify": 5,
+    "messages.batchModify": 50,
+    "messages.send": 100,
+    "labels.list": 1,
+    "labels.create": 5,
+    "history.list": 2,
+    "users.getProfile": 1,
+}
+DEFAULT_QUOTA_UNITS = 5
+
+# Gmail enforces 250 units per user per second; the client budget stays just under it
+GMAIL_QUOTA_PER_SECOND = 250
+QUOTA_BUDGET_ENV = "GMAIL_QUOTA_UNITS_PER_SECOND"
+DEFAULT_QUOTA_BUDGET = 225
+# Units that can be spent at once after an idle spell. Kept small: a batch of 50 gets
+# alone costs the whole per-second quota, so little room is left beside it.
+DEFAULT_QUOTA_BURST = 25
+
+# Transient failures worth retrying; 403 only with a rate-limit reason
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# Calls that may have taken effect when the server errors out (a 5xx after a send can
+# still deliver the message), so they are only retried after a rate-limit refusal
+NON_IDEMPOTENT_METHODS = ("messages.send",)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket of quota units.
+
+    `acquire` takes its units up front and sleeps off any deficit, so the balance can go
+    negative and concurrent callers queue behind each other in arrival order; a call
+    larger than the bucket simply waits longer. `pause` holds every caller back until a
+    given time (e.g. a Retry-After) and restarts the bucket empty.
+
+    Args:
+        rate (float): Units added per second.
+        capacity (float): Maximum balance; defaults to `rate`.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units):
+        """Take `units`, sleeping until the bucket covers them. Returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= units
+            # While paused `_updated` is in the future, and the wait runs to it
+            wait = max(0.0, self._updated - now) - min(0.0, self.tokens) / self.rate
+            if wait > 0:
+                self.waits += 1
+                self.waited_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds`, then refill from empty."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, 0.0)
+            self._updated = max(self._updated, now + seconds)
+
+    def _refill(self, now):
+        if now > self._updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+
+class GmailQuotaGateway:
+    """
+    Single entry point for Gmail API calls: charges each call its quota units against a
+    per-user token bucket, retries transient failures and honors Retry-After.
+
+    Rate-limit errors (429, or 403 rateLimitExceeded/userRateLimitExceeded) pause the
+    whole bucket, for Retry-After seconds when Gmail sends it, so every thread backs
+    off together instead of each retrying into the limit. Other retryable errors (5xx)
+    back off exponentially in the calling thread only, except for NON_IDEMPOTENT_METHODS;
+    anything else is raised at once.
+
+    `call` serves the threaded discovery clients and `acall` the asyncio REST client
+    (listener.async_gmail_listener); both share the bucket and the counters.
+
+    Args:
+        units_per_second (float): Quota budget; defaults to GMAIL_QUOTA_UNITS_PER_SECOND
+            from the environment, then DEFAULT_QUOTA_BUDGET.
+        burst (float): Bucket capacity in units.
+    """
+    def __init__(self, units_per_second=None, burst=DEFAULT_QUOTA_BURST):
+        self.units_per_second = float(units_per_second or os.environ.get(QUOTA_BUDGET_ENV, DEFAULT_QUOTA_BUDGET))
+        self.bucket = TokenBucket(self.units_per_second, burst)
+        self.calls = 0
+        self.units = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def call(self, method, call, count=1, retries=3, delay=2):
+        """
+        Run `call` (which executes one Gmail request, or a batch of `count` calls of `method`).
+
+        Args:
+            method (str): Gmail method, e.g. "messages.get" (see GMAIL_QUOTA_UNITS).
+            call (callable): Executes the request and returns its response.
+            count (int): Calls of `method` made by `call` (batch requests).
+            retries (int): Attempts before the last error is raised.
+            delay (float): Initial backoff in seconds for errors without Retry-After.
+
+        Returns:
+            The response of `call`.
+        """
+        units = GMAIL_QUOTA_UNITS.get(method, DEFAULT_QUOTA_UNITS) * count
+        for attempt in range(retries):
+            self.bucket.acquire(units)
+            with self._lock:
+                self.calls += count
+                self.units += units
+            utils.metrics.count_api_call(method, count)
+            try:
+                return call()
+            except HttpError as error:
+                if not self._should_retry(method, error):
+                    raise
+                self.backoff(error, delay, wait=attempt < retries - 1)
+                if attempt == retries - 1:
+                    raise
+                self._count_retry(method, error, attempt, retries)
+                delay *= 2
+
+    async def acall(self, method, call, count=1, retries=3, delay=2):
+        """
+        Asyncio counterpart of `call`: `call` is a coroutine function. The bucket wait and
+        the backoff run without blocking the event loop.
+        """
+        units = GMAIL_QUOTA_UNITS.get(method, DEFAULT_QUOTA_UNITS) * count
+        for attempt in range(retries):
+            await asyncio.to_thread(self.bucket.acquire, units)
+            with self._lock:
+                self.calls += count
+                self.units += units
+            utils.metrics.count_api_call(method, count)
+            try:
+                return await call()
+            except HttpError as error:
+                if not self._should_retry(method, error):
+                    raise
+                # A rate limit only pauses the bucket; the next acquire does the waiting
+                self.backoff(error, delay, wait=False)
+                if attempt == retries - 1:
+                    raise
+                if not is_rate_limit_error(error):
+                    await asyncio.sleep(delay)
+                self._count_retry(method, error, attempt, retries)
+                delay *= 2
+
+    def backoff(self, error, delay, wait=True):
+        """
+        Back off after a retryable `error`: a rate-limit error pauses the bucket for its
+        Retry-After (or `delay`), so the next acquire of any thread waits; otherwise this
+        thread sleeps `delay` (when `wait`).
+        """
+        if is_rate_limit_error(error):
+            retry_after = get_retry_after(error)
+            with self._lock:
+                self.rate_limited += 1
+            self.bucket.pause(retry_after if retry_after is not None else delay)
+        elif wait:
+            time.sleep(delay)
+
+    def _should_retry(self, method, error):
+        if method in NON_IDEMPOTENT_METHODS:
+            return is_rate_limit_error(error)
+        return is_retryable_error(error)
+
+    def _count_retry(self, method, error, attempt, retries):
+        logging.warning(f"Retrying {method} after HTTP {error.resp.status} (attempt {attempt + 2} of {retries}).")
+        with self._lock:
+            self.retries += 1
+
+    def stats(self):
+        """Calls, quota units charged, retries, rate-limit errors and throttling waits so far."""
+        return {
+            "calls": self.calls,
+            "units": self.units,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "throttle_waits": self.bucket.waits,
+            "throttle_seconds": self.bucket.waited_seconds,
+            "units_per_second": self.units_per_second,
+        }
+
+
+def is_rate_limit_error(error):
+    """True if an HttpError is Gmail refusing the call for exceeding a rate limit."""
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    if error.resp.status != 403:
+        return False
+    content = error.content.decode("utf-8", "replace") if isinstance(error.content, bytes) else str(error.content)
+    return any(reason in content for reason in RATE_LIMIT_REASONS)
+
+
+def is_retryable_error(error):
+    """True if a failed call may succeed when retried (rate limits and transient server errors)."""
+    return isinstance(error, HttpError) and (error.resp.status in RETRYABLE_STATUSES or is_rate_limit_error(error))
+
+
+def get_retry_after(error):
+    """Seconds to wait from an HttpError's Retry-After header (seconds or HTTP date), or None."""
+    value = error.resp.get("retry-after") if error.resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+gmail_gateway = None
+# Guards the first-use creation: threads racing there would each get a gateway with its own budget
+gmail_gateway_lock = threading.Lock()
+
+
+def get_gmail_gateway():
+    """Return the process-wide gateway; every Gmail call of the process shares its quota budget."""
+    global gmail_gateway
+    if gmail_gateway is None:
+        with gmail_gateway_lock:
+            if gmail_gateway is None:
+                gmail_gateway = GmailQuotaGateway()
+    return gmail_gateway
+
+
+def set_gmail_gateway(new_gateway):
+    """Replace the process-wide gateway, e.g. with another budget, at startup."""
+    global gmail_gateway
+    with gmail_gateway_lock:
+        gmail_gateway = new_gateway
+    return gmail_gateway
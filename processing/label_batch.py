@@ -0,0 +1,103 @@
+import logging
+import threading
+from collections import OrderedDict
+from googleapiclient.errors import HttpError
+import processing.gmail_fetch
+import processing.label_registry
+
+# messages.batchModify accepts at most 1000 message IDs per call
+GMAIL_BATCH_MODIFY_LIMIT = 1000
+
+# batchModify errors caused by individual message IDs (invalid or deleted), isolated by
+# splitting the call; rate limits and server errors fail it as a whole.
+PER_MESSAGE_ERROR_STATUSES = (400, 404)
+
+
+class LabelChangeBatch:
+    """
+    Collects per-email label changes over a poll cycle and applies them with
+    `users().messages().batchModify`: one call per distinct add/remove set, up to
+    GMAIL_BATCH_MODIFY_LIMIT IDs each.
+
+    Changes are given as keys of the pipeline `labels` dict (resolved to IDs at flush
+    time, so a stale-label rebuild applies to everything queued) or as system label IDs
+    such as "UNREAD".
+
+    Args:
+        labels (dict): key -> label ID, as returned by the label registry.
+    """
+    def __init__(self, labels):
+        self.labels = labels
+        self.pending = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(email_ids) for email_ids in self.pending.values())
+
+    def add(self, email_id, add=(), remove=()):
+        """Queue a label change for one email."""
+        with self._lock:
+            self.pending.setdefault((tuple(add), tuple(remove)), []).append(email_id)
+
+    def flush(self, service):
+        """
+        Apply all queued changes.
+
+        A call rejected for a bad message ID (400/404) is split in half and retried until
+        the failing messages are isolated, so one bad ID does not fail the rest of its batch.
+        A call that still fails with a rate-limit or server error once the quota gateway's
+        retries are spent is not split (that would only multiply batchModify calls); all
+        of its emails are reported failed and keep their labels, UNREAD included, so the
+        next poll picks them up again.
+
+        Returns:
+            dict: email_id -> None on success, or the exception that failed it.
+        """
+        with self._lock:
+            pending, self.pending = self.pending, OrderedDict()
+
+        results = {}
+        for (add, remove), email_ids in pending.items():
+            for start in range(0, len(email_ids), GMAIL_BATCH_MODIFY_LIMIT):
+                self._apply(service, email_ids[start:start + GMAIL_BATCH_MODIFY_LIMIT], add, remove, results)
+
+        failed = [email_id for email_id, error in results.items() if error is not None]
+        if failed:
+            logging.error(f"Label update failed for {len(failed)} of {len(results)} email(s): {failed}")
+        return results
+
+    def _apply(self, service, email_ids, add, remove, results, label_retry=True, retries=3):
+        try:
+            processing.gmail_fetch.retry_api_call(lambda: self._batch_modify(service, email_ids, add, remove),
+                                                 method="messages.batchModify", retries=retries)
+            results.update((email_id, None) for email_id in email_ids)
+        except processing.label_registry.StaleLabelError as e:
+            if not label_retry:
+                results.update((email_id, e) for email_id in email_ids)
+                return
+            logging.warning(f"Stale label ID in batch update, rebuilding label cache: {e}")
+            processing.label_registry.label_registry.invalidate()
+            self.labels.update(processing.label_registry.label_registry.resolve(service, processing.label_registry.REQUIRED_LABELS))
+            self._apply(service, email_ids, add, remove, results, label_retry=False, retries=retries)
+        except HttpError as e:
+            if len(email_ids) == 1 or e.resp.status not in PER_MESSAGE_ERROR_STATUSES:
+                results.update((email_id, e) for email_id in email_ids)
+                return
+            # Halves get a single attempt each
+            middle = len(email_ids) // 2
+            self._apply(service, email_ids[:middle], add, remove, results, label_retry, retries=1)
+            self._apply(service, email_ids[middle:], add, remove, results, label_retry, retries=1)
+
+    def _batch_modify(self, service, email_ids, add, remove):
+        body = {
+            "ids": list(email_ids),
+            "addLabelIds": [self.labels.get(key, key) for key in add],
+            "removeLabelIds": [self.labels.get(key, key) for key in remove],
+        }
+        try:
+            return service.users().messages().batchModify(userId='me', body=body).execute()
+        except HttpError as error:
+            if processing.label_registry.is_stale_label_error(error):
+                raise processing.label_registry.StaleLabelError(str(error)) from error
+            raise
@@ -0,0 +1,114 @@
+import time
+import logging
+import threading
+from googleapiclient.errors import HttpError
+import processing.gmail_fetch
+
+# Labels the pipeline applies, keyed the way process_emails_with_transaction refers to them
+REQUIRED_LABELS = {
+    "success_fetched": "email fetched successfully",
+    "failure_fetched": "failed fetching",
+    "success_scraped": "successfully scraped",
+    "failure_scraped": "failed scraping",
+    "success_final": "success",
+    "failure_final": "failure",
+}
+
+# How long resolved label IDs are trusted before the next labels().list
+DEFAULT_LABEL_TTL = 3600
+
+
+class StaleLabelError(Exception):
+    """Raised when Gmail rejects a label ID that has been deleted or recreated."""
+
+
+class LabelRegistry:
+    """
+    Process-wide cache of Gmail label name -> label ID.
+
+    A cold or expired cache is rebuilt with a single `labels().list` call, creating any
+    missing labels; afterwards lookups cost no API calls until the TTL runs out or
+    `invalidate()` is called after a stale-label failure.
+
+    Args:
+        ttl (int): Seconds before cached IDs are refreshed.
+    """
+    def __init__(self, ttl=DEFAULT_LABEL_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self._label_ids = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def resolve(self, service, labels=REQUIRED_LABELS):
+        """
+        Resolve label names to IDs, creating labels that do not exist yet.
+
+        Args:
+            service: The Gmail API service instance.
+            labels (dict): key -> label name.
+
+        Returns:
+            dict: key -> label ID, or None for labels that could not be resolved.
+        """
+        with self._lock:
+            expired = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+            missing = [name for name in labels.values() if expired or name not in self._label_ids]
+
+            if missing:
+                self.misses += len(missing)
+                self.hits += len(labels) - len(missing)
+                try:
+                    self._refresh(service, missing)
+                except HttpError as error:
+                    logging.error(f"Failed to resolve labels {missing}: {error}")
+            else:
+                self.hits += len(labels)
+
+            return {key: self._label_ids.get(name) for key, name in labels.items()}
+
+    def invalidate(self):
+        """Forget all cached IDs; the next `resolve` lists labels again."""
+        with self._lock:
+            self._label_ids = {}
+            self._loaded_at = None
+
+    def stats(self):
+        """Return cache hit/miss counters and the number of label API calls made."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "api_calls": self.api_calls,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _refresh(self, service, required_names):
+        label_list = processing.gmail_fetch.retry_api_call(
+            lambda: service.users().labels().list(userId='me').execute(), method="labels.list")
+        self.api_calls += 1
+        self._label_ids = {label['name']: label['id'] for label in label_list.get('labels', [])}
+        self._loaded_at = time.monotonic()
+
+        for label_name in required_names:
+            if label_name not in self._label_ids:
+                label_body = {"name": label_name, "labelListVisibility": "labelShow", "messageListVisibility": "show"}
+                new_label = processing.gmail_fetch.retry_api_call(
+                    lambda: service.users().labels().create(userId='me', body=label_body).execute(), method="labels.create")
+                self.api_calls += 1
+                self._label_ids[label_name] = new_label['id']
+                logging.info(f"Created label '{label_name}'.")
+
+
+def is_stale_label_error(error):
+    """True if an HttpError says a label ID in the request no longer exists."""
+    if not isinstance(error, HttpError) or error.resp.status not in (400, 404):
+        return False
+    content = error.content.decode("utf-8", "replace") if isinstance(error.content, bytes) else str(error.content)
+    return "label" in content.lower()
+
+
+# Shared by every poll cycle in the process
+label_registry = LabelRegistry()
@@ -1,4 +1,5 @@
 import os
+import time
 import logging
 from datetime import datetime
 import pytz
@@ -8,9 +9,18 @@ from googleapiclient.errors import HttpError
 from email.utils import parsedate_to_datetime
 from bs4 import BeautifulSoup
 import scraping.overall_scrap
+import storage.job_store
+import storage.seen_jobs
+import storage.email_archive
 import scraping.scrap_job_blocks
 import scraping.scrap_job_elements
-from collections import deque
+import utils.html_module
+import processing.gmail_fetch
+import processing.label_registry
+import processing.label_batch
+import processing.gmail_quota
+import utils.metrics
+from collections import deque, Counter
 import logging
 import datetime
 
@@ -20,54 +30,140 @@ logging.basicConfig(level=logging.error)
 # logging.error("This is an error message.")
 
 
-def process_emails_with_transaction(service, senders, error_recipient):
+def process_emails_with_transaction(service, senders, error_recipient,
+                                    page_size=processing.gmail_fetch.DEFAULT_PAGE_SIZE,
+                                    batch_size=processing.gmail_fetch.DEFAULT_BATCH_SIZE):
     """
     Process emails from specific senders. Implements fetching, scraping, and final updates.
+
+    Matching emails are streamed page by page (`page_size` ids per list call) and fetched
+    in Gmail batch requests of `batch_size`, so memory stays flat for any backlog size.
+
+    Queued label updates are applied even when the cycle is cut short, so emails already
+    finalized are not left unread.
+
+    Returns:
+        Counter: "processed", "succeeded" and "failed" email counts, "label_errors" for
+        emails whose label update failed, plus "api_errors" when the cycle was cut short
+        by a Gmail API error or label updates were rate limited.
     """
+    outcomes = Counter()
     try:
-        # Ensure necessary labels exist
-        labels = {
-            "success_fetched": ensure_label_exists(service, "email fetched successfully"),
-            "failure_fetched": ensure_label_exists(service, "failed fetching"),
-            "success_scraped": ensure_label_exists(service, "successfully scraped"),
-            "failure_scraped": ensure_label_exists(service, "failed scraping"),
-            "success_final": ensure_label_exists(service, "success"),
-            "failure_final": ensure_label_exists(service, "failure")
-        }
+        # Ensure necessary labels exist (one labels().list at most, cached across polls)
+        labels = processing.label_registry.label_registry.resolve(service, processing.label_registry.REQUIRED_LABELS)
+        logging.debug(f"Label cache stats: {processing.label_registry.label_registry.stats()}")
         
         if not all(labels.values()):
             logging.error("Failed to ensure all required labels.")
-            return
+            outcomes["api_errors"] += 1
+            return outcomes
 
         # Combine sender queries into a single query string
         query = f"({' OR '.join([f'from:{sender}' for sender in senders])}) is:unread"
-        results = retry_api_call(lambda: service.users().messages().list(userId='me', q=query).execute())
-        messages = results.get('messages', [])
 
-        if not messages:
-            logging.info("No new emails found.")
-            return
+        # Jobs and label updates for the whole cycle, written with one job-sink write and messages.batchModify
+        job_batch = scraping.overall_scrap.JobAccumulator()
+        seen_filter = storage.seen_jobs.get_seen_job_filter(storage.job_store.get_job_sink())
+        label_batch = processing.label_batch.LabelChangeBatch(labels)
+        # Scraped emails wait here until their jobs are stored (see store_and_finalize)
+        scraped = []
 
-        for email in messages:
-            email_id = email.get('id')
-            try:
-                # Step 1: Fetching Email
-                email_data = fetch_email(service, email_id)
+        try:
+            # Step 1: Fetching Emails, streamed through paged listing and Gmail batch requests
+            for email_data in processing.gmail_fetch.stream_emails(service, query, page_size=page_size, batch_size=batch_size):
+                outcomes["processed"] += 1
+                email_id = email_data["email_id"]
                 html_content, metadata = email_data["html_content"], email_data["metadata"]
+                try:
+                    if email_data["error"]:
+                        raise email_data["error"]
+
+                    # Step 2: Scraping Steps
+                    scrape_email_content(html_content, metadata, labels, service, email_id, job_batch=job_batch, seen_filter=seen_filter)
+
+                    # Step 3: Final Updates on Success, once the jobs are stored
+                    scraped.append((email_id, html_content, metadata))
+
+                except Exception as e:
+                    # Step 3: Final Updates on Failure
+                    logging.error(f"Email processing failed for ID {email_id}: {e}")
+                    if metadata is None:
+                        html_content = ""
+                        metadata = {"subject": f"Unfetched email {email_id}", "sender_email": "", "received_datetime": datetime.datetime.now()}
+                    finalize_email(email_id, service, html_content, metadata, labels, error_recipient, success=False, error=e, label_batch=label_batch)
+                    outcomes["failed"] += 1
+
+                if len(label_batch) + len(scraped) >= processing.label_batch.GMAIL_BATCH_MODIFY_LIMIT:
+                    store_and_finalize(service, job_batch, seen_filter, scraped, labels, error_recipient, label_batch, outcomes)
+                    apply_label_changes(service, label_batch, outcomes)
+        finally:
+            # Step 3 (continued): store the cycle's jobs, finalize their emails, then apply the
+            # queued label updates; also after a listing or fetch error cut the cycle short
+            store_and_finalize(service, job_batch, seen_filter, scraped, labels, error_recipient, label_batch, outcomes)
+            apply_label_changes(service, label_batch, outcomes)
+        if seen_filter is not None:
+            logging.debug(f"Seen-job filter stats: {seen_filter.stats()}")
+
+        if not outcomes["processed"]:
+            logging.info("No new emails found.")
 
-                # Step 2: Scraping Steps
-                scrape_email_content(html_content, metadata, labels, service, email_id)
+    except HttpError as error:
+        logging.error(f"An API error occurred: {error}")
+        if error.resp.status == 401:
+            # Let the caller rebuild its credentials
+            raise
+        outcomes["api_errors"] += 1
+    return outcomes
 
-                # Step 3: Final Updates on Success
-                finalize_email(email_id, service, html_content, metadata, labels, error_recipient, success=True)
 
-            except Exception as e:
-                # Step 3: Final Updates on Failure
-                logging.error(f"Email processing failed for ID {email_id}: {e}")
-                finalize_email(email_id, service, html_content, metadata, labels, error_recipient, success=False, error=e)
+def store_and_finalize(service, job_batch, seen_filter, scraped, labels, error_recipient, label_batch, outcomes):
+    """
+    Write the buffered jobs to the job sink, then finalize the emails they came from.
 
-    except HttpError as error:
-        logging.error(f"An API error occurred: {error}")
+    Emails are only archived and labelled as successes once their jobs are stored. If the
+    write fails they are finalized as failures instead (failed archive entry, error
+    notification, failure label) and their jobs are dropped from the buffer.
+
+    Args:
+        scraped (list): (email_id, html_content, metadata) of the emails in `job_batch`; emptied.
+        outcomes (Counter): Cycle counts; "succeeded" or "failed" grows by len(scraped).
+    """
+    error = None
+    try:
+        job_batch.flush(storage.job_store.get_job_sink(), seen_filter)
+    except Exception as e:
+        logging.error(f"Storing the jobs of {len(scraped)} email(s) failed: {e}")
+        job_batch.clear()
+        error = e
+
+    for email_id, html_content, metadata in scraped:
+        finalize_email(email_id, service, html_content, metadata, labels, error_recipient,
+                       success=error is None, error=error, label_batch=label_batch)
+    outcomes["succeeded" if error is None else "failed"] += len(scraped)
+    scraped.clear()
+
+
+def apply_label_changes(service, label_batch, outcomes):
+    """
+    Flush the queued label updates and count the emails whose update failed.
+
+    Those emails stay unread, so the next poll processes them again. A rate-limit or
+    server error also counts as an API error, so the listener backs off; an auth error
+    is raised for the caller to rebuild its credentials.
+
+    Returns:
+        dict: email_id -> None or the exception, as returned by LabelChangeBatch.flush.
+    """
+    results = label_batch.flush(service)
+    errors = [error for error in results.values() if error is not None]
+    if errors:
+        outcomes["label_errors"] += len(errors)
+        if any(processing.gmail_quota.is_retryable_error(error) for error in errors):
+            outcomes["api_errors"] += 1
+        auth_error = next((error for error in errors if isinstance(error, HttpError) and error.resp.status == 401), None)
+        if auth_error is not None:
+            raise auth_error
+    return results
 
 
 def fetch_email(service, email_id):
@@ -75,92 +171,99 @@ def fetch_email(service, email_id):
     Fetch email content, decode HTML, and extract metadata.
     """
     try:
-        msg = retry_api_call(lambda: service.users().messages().get(userId='me', id=email_id).execute())
-        payload = msg['payload']
-        headers = payload['headers']
-
-        # Extract metadata
-        subject = next((header['value'] for header in headers if header['name'] == 'Subject'), "No Subject")
-        sender_email = next((header['value'] for header in headers if header['name'] == 'From'), None)
-        received_date = next((header['value'] for header in headers if header['name'] == 'Date'), None)
-
-        if not received_date:
-            raise Exception("No received date found in email headers.")
-        received_datetime = parsedate_to_datetime(received_date)
-
-        # Extract HTML content
-        parts = payload.get('parts', [])
-        html_content = None
-        for part in parts:
-            if part['mimeType'] == 'text/html':
-                html_content = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                break
-        if not html_content:
-            raise Exception("No HTML content found in email.")
+        with utils.metrics.stage_timer("fetch"):
+            msg = retry_api_call(lambda: service.users().messages().get(userId='me', id=email_id).execute(), method="messages.get")
+        email_data = processing.gmail_fetch.parse_email_message(msg)
+        metadata = email_data["metadata"]
 
-        logging.info(f"Email fetched successfully: Subject: {subject}, Sender: {sender_email}")
-        return {"html_content": html_content, "metadata": {"subject": subject, "sender_email": sender_email, "received_datetime": received_datetime}}
+        logging.info(f"Email fetched successfully: Subject: {metadata['subject']}, Sender: {metadata['sender_email']}")
+        return email_data
 
     except Exception as e:
         logging.error(f"Failed to fetch email with ID {email_id}: {e}")
         raise
 
 
-def scrape_email_content(html_content, metadata, labels, service, email_id):
+def scrape_email_content(html_content, metadata, labels, service, email_id, job_batch=None, seen_filter=None):
     """
     Scrape the email's HTML content and save extracted data.
+
+    With a `job_batch` (JobAccumulator), the jobs are buffered on it and written when the
+    caller flushes it, instead of being appended to the CSV per email. A `seen_filter`
+    drops jobs already seen in earlier emails (only with a `job_batch`).
     """
     try:
 #        soup = BeautifulSoup(html_content.encode('utf-8', 'replace'), 'html.parser')
-        soup = BeautifulSoup(html_content,'html.parser')
-        scraping.overall_scrap.scrap_process_email_content_to_csv(soup)
+        with utils.metrics.stage_timer("scrape"):
+            soup = utils.html_module.make_soup(html_content)
+            if job_batch is not None:
+                job_batch.add_email(scraping.overall_scrap.scrap_email_content_to_records(soup, seen_filter))
+            else:
+                scraping.overall_scrap.scrap_process_email_content_to_csv(soup)
         logging.info(f"Scraping successful for email: {metadata['subject']}")
     except Exception as e:
         logging.error(f"Scraping failed for email {metadata['subject']} (ID: {email_id}): {e}")
         raise
 
 
-def finalize_email(email_id, service, html_content, metadata, labels,error_recipient, success, error=None):
+def finalize_email(email_id, service, html_content, metadata, labels,error_recipient, success, error=None, label_batch=None):
     """
     Handle final updates on email based on success or failure.
+
+    With a `label_batch`, the mark-as-read and label updates are queued on it (one
+    combined change per email) and applied when the caller flushes the batch.
     """
+    started = time.perf_counter()
     try:
         if success:
-            # Save email HTML to structured folder
-            save_email_html(html_content, metadata['subject'], metadata['received_datetime'], metadata['sender_email'])
+            # Save email HTML to the archive
+            archive_email_html(email_id, html_content, metadata, status="success")
 
-            # Remove unread label
-            mark_email_as_read(service,email_id)
-            
+            if label_batch is not None:
+                # Remove unread label, add success labels and remove failure labels on flush
+                label_batch.add(email_id, add=['success_final'], remove=['UNREAD', 'failure_final'])
+            else:
+                # Remove unread label
+                mark_email_as_read(service,email_id)
 
-            # Add success labels and remove failure labels
-            retry_api_call(lambda: service.users().messages().modify(
-                userId='me',
-                id=email_id,
-                body={"addLabelIds": [labels['success_final']], "removeLabelIds": [labels['failure_final']]}
-            ).execute())
+                # Add success labels and remove failure labels
+                modify_email_labels(service, email_id, labels, add=['success_final'], remove=['failure_final'])
             logging.info(f"Email processed successfully: {metadata['subject']}")
 
         else:
-            # Save failed HTML content to `failed_emails` directory
-            save_failed_html(html_content, metadata['subject'], metadata['received_datetime'], metadata['sender_email'])
+            # Save failed HTML content to the archive
+            archive_email_html(email_id, html_content, metadata, status="failed")
 
             # send_error_email(service, recipient, subject, error_message)
             send_error_email(service, error_recipient, metadata['subject'], "Error")
             
-            # Remove unread label
-            mark_email_as_read(service,email_id)
-            
-            # Add failure labels and log error
-            retry_api_call(lambda: service.users().messages().modify(
-                userId='me',
-                id=email_id,
-                body={"addLabelIds": [labels['failure_final']]}
-            ).execute())
+            if label_batch is not None:
+                # Remove unread label and add failure labels on flush
+                label_batch.add(email_id, add=['failure_final'], remove=['UNREAD'])
+            else:
+                # Remove unread label
+                mark_email_as_read(service,email_id)
+
+                # Add failure labels
+                modify_email_labels(service, email_id, labels, add=['failure_final'])
             logging.error(f"Email processing failed for {metadata['subject']}: {error}")
 
     except Exception as e:
         logging.error(f"Finalizing email failed: {e}")
+    utils.metrics.observe_stage("finalize", time.perf_counter() - started)
+    utils.metrics.count_email(success)
+
+def archive_email_html(email_id, content, metadata, status):
+    """
+    Store the email's HTML in the content-addressed archive (storage.email_archive),
+    indexed by message id, sender, subject and received date.
+    """
+    content_hash = storage.email_archive.get_email_archive().put(
+        content, email_id, status=status, sender=metadata['sender_email'],
+        subject=metadata['subject'], received_datetime=metadata['received_datetime'],
+    )
+    logging.info(f"Archived {status} email '{metadata['subject']}' as {content_hash[:12]}.")
+
 
 def save_failed_html(content, title, received_datetime, sender_email):
     """
@@ -279,28 +382,49 @@ def save_email_html(content, title, received_datetime, sender_email):
 
 
 
-def retry_api_call(call, retries=3, delay=2):
-    for i in range(retries):
+# Shared with the batch fetch stage
+retry_api_call = processing.gmail_fetch.retry_api_call
+
+
+def modify_email_labels(service, email_id, labels, add=(), remove=()):
+    """
+    Add and remove pipeline labels on an email, given as keys of `labels`.
+
+    If Gmail rejects a cached label ID as stale, the label registry is rebuilt, `labels`
+    is updated in place and the modify is retried once.
+    """
+    def modify():
         try:
-            return call()
-        except HttpError as e:
-            if i < retries - 1:
-                time.sleep(delay)
-                delay *= 2
-            else:
-                raise e
+            return service.users().messages().modify(
+                userId='me',
+                id=email_id,
+                body={"addLabelIds": [labels[key] for key in add], "removeLabelIds": [labels[key] for key in remove]}
+            ).execute()
+        except HttpError as error:
+            if processing.label_registry.is_stale_label_error(error):
+                raise processing.label_registry.StaleLabelError(str(error)) from error
+            raise
+
+    try:
+        return retry_api_call(modify, method="messages.modify")
+    except processing.label_registry.StaleLabelError as e:
+        logging.warning(f"Stale label ID for email {email_id}, rebuilding label cache: {e}")
+        processing.label_registry.label_registry.invalidate()
+        labels.update(processing.label_registry.label_registry.resolve(service, processing.label_registry.REQUIRED_LABELS))
+        return retry_api_call(modify, method="messages.modify")
 
 
 def ensure_label_exists(service, label_name):
     try:
-        label_list = service.users().labels().list(userId='me').execute()
+        label_list = retry_api_call(lambda: service.users().labels().list(userId='me').execute(), method="labels.list")
         labels = label_list.get('labels', [])
         for label in labels:
             if label['name'] == label_name:
                 return label['id']
 
         label_body = {"name": label_name, "labelListVisibility": "labelShow", "messageListVisibility": "show"}
-        new_label = service.users().labels().create(userId='me', body=label_body).execute()
+        new_label = retry_api_call(lambda: service.users().labels().create(userId='me', body=label_body).execute(),
+                                   method="labels.create")
         return new_label['id']
     except HttpError as error:
         logging.error(f"Failed to create label {label_name}: {error}")
@@ -319,11 +443,11 @@ def mark_email_as_read(service, email_id):
 
     try:
         # Mark the message as read
-        service.users().messages().modify(
+        retry_api_call(lambda: service.users().messages().modify(
             userId='me',
             id=email_id,
             body={'removeLabelIds': ['UNREAD']}
-        ).execute()
+        ).execute(), method="messages.modify")
 
         print(f"Email with ID {email_id} marked as read.")
         return True
@@ -332,15 +456,19 @@ def mark_email_as_read(service, email_id):
         print(f"An error occurred: {e}")
         return False
 
+def build_error_email(recipient, subject, error_message):
+    """Build the `messages().send` body for an error notification."""
+    return {
+        "raw": base64.urlsafe_b64encode(
+            f"To: {recipient}\r\nSubject: {subject}\r\n\r\n{error_message}".encode("utf-8")
+        ).decode("utf-8")
+    }
+
 def send_error_email(service, recipient, subject, error_message):
     """Send an email to notify about a processing error."""
     try:
-        message = {
-            "raw": base64.urlsafe_b64encode(
-                f"To: {recipient}\r\nSubject: {subject}\r\n\r\n{error_message}".encode("utf-8")
-            ).decode("utf-8")
-        }
-        service.users().messages().send(userId='me', body=message).execute()
+        message = build_error_email(recipient, subject, error_message)
+        retry_api_call(lambda: service.users().messages().send(userId='me', body=message).execute(), method="messages.send")
         print(f"Error notification sent to {recipient}")
     except HttpError as error:
         print(f"Failed to send error notification: {error}")
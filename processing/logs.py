@@ -1,9 +1,33 @@
 import os
+import re
+import time
+import queue
+import atexit
 import logging
+import logging.handlers
 from datetime import datetime
 import pytz
 from collections import deque
 
+# Start of a record written with configure_logging's file format ("2024-12-16 15:30:01,123 - INFO - ...");
+# other lines (e.g. traceback lines) continue the previous record
+LOG_RECORD_START = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - ")
+# Bytes read per step when scanning a log file backwards
+REVERSE_READ_BLOCK_SIZE = 64 * 1024
+
+# Background log writer: queue capacity, records handled per batch before flushing,
+# and what a full queue does to the logging thread ("drop" the record or "block")
+LOG_QUEUE_SIZE = 10_000
+LOG_BATCH_SIZE = 500
+LOG_QUEUE_POLICIES = ("drop", "block")
+DEFAULT_LOG_QUEUE_POLICY = "drop"
+LOG_QUEUE_POLICY_ENV = "LOG_QUEUE_POLICY"
+# Longest a "block" policy waits for room before dropping the record anyway
+LOG_QUEUE_BLOCK_TIMEOUT = 5.0
+
+# Process-wide queue pipeline installed by configure_logging
+log_pipeline = None
+
 
 class PrependFileHandler(logging.Handler):
     """
@@ -33,14 +57,177 @@ class PrependFileHandler(logging.Handler):
             self.handleError(record)  # Handle any errors during the logging process
 
 
+class AppendFileHandler(logging.FileHandler):
+    """
+    Appends log entries to a file kept open by the handler, so each record costs the
+    same however large the file grows (unlike PrependFileHandler, which rewrites the
+    whole file per record). The file is oldest-first; use `read_log_newest_first` or
+    `write_newest_first_copy` for the newest-first view.
+
+    An existing file that starts newest-first (written by PrependFileHandler) is
+    reordered once on open (see `reorder_legacy_log`), so appending keeps it in order.
+    """
+    def __init__(self, filename, encoding="utf-8", buffered=False):
+        self.reordered = os.path.exists(filename) and reorder_legacy_log(filename, encoding)
+        super().__init__(filename, mode="a", encoding=encoding)
+        # Buffered: leave flushing to the caller (LogPipeline flushes once per batch)
+        self.buffered = buffered
+
+    def emit(self, record):
+        if not self.buffered:
+            super().emit(record)
+            return
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+def reorder_legacy_log(filename, encoding="utf-8"):
+    """
+    Rewrite a log file written newest-first by PrependFileHandler as oldest-first.
+
+    The file may also have records appended after its newest-first part (by
+    AppendFileHandler before it reordered files); only that leading newest-first run of
+    records is reversed. A file that starts oldest-first is left alone, and telling
+    which it is only reads up to the first two records with different timestamps.
+
+    Args:
+        filename (str): Log file in configure_logging's file format.
+        encoding (str): File encoding.
+
+    Returns:
+        bool: True if the file was rewritten.
+    """
+    if not _starts_newest_first(filename, encoding):
+        return False
+
+    preamble, records = [], []
+    with open(filename, "r", encoding=encoding) as file:
+        for line in file:
+            if LOG_RECORD_START.match(line):
+                records.append([line])
+            elif records:
+                records[-1].append(line)
+            else:
+                preamble.append(line)
+    if records and not records[-1][-1].endswith("\n"):
+        records[-1][-1] += "\n"
+
+    legacy_end = 1
+    while legacy_end < len(records) and _record_time(records[legacy_end]) <= _record_time(records[legacy_end - 1]):
+        legacy_end += 1
+    ordered = records[:legacy_end][::-1] + records[legacy_end:]
+
+    temp_path = f"{filename}.tmp"
+    with open(temp_path, "w", encoding=encoding) as file:
+        file.writelines(preamble)
+        for record in ordered:
+            file.writelines(record)
+    os.replace(temp_path, filename)
+    return True
+
+
+def _starts_newest_first(filename, encoding):
+    first_time = None
+    with open(filename, "r", encoding=encoding, errors="replace") as file:
+        for line in file:
+            if not LOG_RECORD_START.match(line):
+                continue
+            if first_time is None:
+                first_time = _record_time([line])
+            elif _record_time([line]) != first_time:
+                return _record_time([line]) < first_time
+    return False
+
+
+def _record_time(record):
+    # "YYYY-MM-DD HH:MM:SS,mmm" sorts as text
+    return record[0][:23]
+
+
+def read_log_newest_first(filename, limit=None, encoding="utf-8"):
+    """
+    Yield the records of an append-only log file, newest first, reading the file
+    backwards in blocks so only the part that is consumed is read.
+
+    Multi-line records (e.g. with a traceback) are yielded whole, in their original
+    line order.
+
+    Args:
+        filename (str): Log file written by AppendFileHandler.
+        limit (int): Stop after this many records.
+        encoding (str): File encoding.
+
+    Yields:
+        str: One record, without the trailing newline.
+    """
+    if limit is not None and limit <= 0:
+        return
+    yielded = 0
+    continuation = []
+    for line in _reverse_lines(filename, encoding):
+        continuation.append(line)
+        if LOG_RECORD_START.match(line):
+            yield "\n".join(reversed(continuation))
+            continuation = []
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+    if continuation:
+        # Lines before the first recognizable record
+        yield "\n".join(reversed(continuation))
+
+
+def _reverse_lines(filename, encoding):
+    with open(filename, "rb") as file:
+        position = file.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            read_size = min(REVERSE_READ_BLOCK_SIZE, position)
+            position -= read_size
+            file.seek(position)
+            lines = (file.read(read_size) + remainder).split(b"\n")
+            # The first piece may be a partial line; keep it for the next block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode(encoding, errors="replace").rstrip("\r")
+        if remainder:
+            yield remainder.decode(encoding, errors="replace").rstrip("\r")
+
+
+def write_newest_first_copy(filename, output_filename=None, encoding="utf-8"):
+    """
+    Write a newest-first copy of a log file (default: `<name>_newest_first.txt` next
+    to it), e.g. once a day's or month's log is complete.
+
+    Returns:
+        str: Path of the copy.
+    """
+    if output_filename is None:
+        root, extension = os.path.splitext(filename)
+        output_filename = f"{root}_newest_first{extension}"
+    with open(output_filename, "w", encoding=encoding) as output:
+        for entry in read_log_newest_first(filename, encoding=encoding):
+            output.write(entry + "\n")
+    return output_filename
+
+
 class LimitedConsoleHandler(logging.StreamHandler):
     """
     A custom logging handler to limit console logs to a fixed number of entries.
+    With `buffered=True` the console is redrawn on `flush` (once per batch of records
+    from LogPipeline) instead of on every record.
     """
-    def __init__(self, max_logs=15):
+    def __init__(self, max_logs=15, buffered=False):
         super().__init__()
         self.max_logs = max_logs
         self.log_cache = deque(maxlen=max_logs)  # Fixed-length deque for recent logs
+        self.buffered = buffered
+        self.dirty = False
 
     def emit(self, record):
         """
@@ -51,22 +238,193 @@ class LimitedConsoleHandler(logging.StreamHandler):
             log_entry = self.format(record)  # Format the log record
             if not self.log_cache or self.log_cache[-1] != log_entry:
                 self.log_cache.append(log_entry)  # Add the new log to the deque
-
-                # Clear the console and display only the last max_logs entries
-                print("\033[H\033[J", end="")  # Clear console (ANSI escape code)
-                for log in self.log_cache:
-                    print(log)  # Print each log from the deque
+                self.dirty = True
+                if not self.buffered:
+                    self.redraw()
         except Exception:
             self.handleError(record)  # Handle any errors during the logging process
 
+    def redraw(self):
+        # Clear the console and display only the last max_logs entries
+        print("\033[H\033[J", end="")  # Clear console (ANSI escape code)
+        for log in self.log_cache:
+            print(log)  # Print each log from the deque
+        self.dirty = False
+
+    def flush(self):
+        with self.lock:
+            if self.buffered and self.dirty:
+                self.redraw()
+        super().flush()
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a bounded queue. When the queue is full, the "drop" policy discards
+    the record and the "block" policy waits up to `block_timeout` seconds for room (then
+    drops it). Counts records, drops, the deepest queue seen and the time spent in `emit`
+    by the logging threads; records are stamped with their enqueue time for the
+    listener's delivery latency.
+    """
+    def __init__(self, log_queue, policy=DEFAULT_LOG_QUEUE_POLICY, block_timeout=LOG_QUEUE_BLOCK_TIMEOUT):
+        super().__init__(log_queue)
+        if policy not in LOG_QUEUE_POLICIES:
+            raise ValueError(f"Unknown log queue policy '{policy}'. Choose from {LOG_QUEUE_POLICIES}.")
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.enqueued = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.emit_seconds = 0.0
+        self.max_emit_seconds = 0.0
+
+    def enqueue(self, record):
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def emit(self, record):
+        # Handler.handle holds self.lock here, so the counters need no other lock
+        started = time.perf_counter()
+        record.enqueued_at = started
+        super().emit(record)
+        elapsed = time.perf_counter() - started
+        self.emit_seconds += elapsed
+        self.max_emit_seconds = max(self.max_emit_seconds, elapsed)
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener that takes up to `batch_size` queued records at a time, hands them to
+    its handlers and then flushes each handler once, so buffered file handlers write in
+    batches and the console is redrawn once per batch. Records dropped by the queue
+    handler are reported by a warning record after the batch in which they are noticed.
+    """
+    def __init__(self, log_queue, *handlers, batch_size=LOG_BATCH_SIZE, queue_handler=None):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        self.queue_handler = queue_handler
+        self.handled = 0
+        self.batches = 0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self.reported_drops = 0
+
+    def _monitor(self):
+        stopping = False
+        while not stopping:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
 
-def configure_logging():
+            for record in batch:
+                if record is self._sentinel:
+                    stopping = True
+                    continue
+                self.handle(record)
+                latency = time.perf_counter() - getattr(record, "enqueued_at", time.perf_counter())
+                self.latency_seconds += latency
+                self.max_latency_seconds = max(self.max_latency_seconds, latency)
+                self.handled += 1
+            self._report_drops()
+            for handler in self.handlers:
+                handler.flush()
+            self.batches += 1
+            for _ in batch:
+                self.queue.task_done()
+
+    def _report_drops(self):
+        dropped = self.queue_handler.dropped if self.queue_handler else 0
+        if dropped > self.reported_drops:
+            record = logging.LogRecord("processing.logs", logging.WARNING, __file__, 0,
+                                       f"Log queue full: dropped {dropped - self.reported_drops} record(s).", None, None)
+            self.reported_drops = dropped
+            self.handle(record)
+
+    def enqueue_sentinel(self):
+        # The queue may be full; wait for room instead of failing
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    Non-blocking logging: the root logger gets only a BoundedQueueHandler, and a
+    BatchingQueueListener thread runs the real handlers (files, console) off the
+    logging threads.
+
+    Args:
+        handlers (list): Handlers run by the background thread.
+        queue_size (int): Queue capacity.
+        policy (str): "drop" or "block" when the queue is full (see BoundedQueueHandler).
+        batch_size (int): Records handled between flushes.
+    """
+    def __init__(self, handlers, queue_size=LOG_QUEUE_SIZE, policy=DEFAULT_LOG_QUEUE_POLICY, batch_size=LOG_BATCH_SIZE):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queue_handler = BoundedQueueHandler(self.queue, policy=policy)
+        self.listener = BatchingQueueListener(self.queue, *handlers, batch_size=batch_size,
+                                              queue_handler=self.queue_handler)
+        self.running = False
+
+    def start(self):
+        self.listener.start()
+        self.running = True
+
+    def stop(self):
+        """Write out the queued records and stop the background thread."""
+        if self.running:
+            self.running = False
+            self.listener.stop()
+
+    def stats(self):
+        """Queue depth, drop count, and mean/max emit latency (logging thread) and delivery latency (enqueue to written)."""
+        queue_handler, listener = self.queue_handler, self.listener
+        return {
+            "policy": queue_handler.policy,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": queue_handler.max_depth,
+            "queue_size": self.queue.maxsize,
+            "enqueued": queue_handler.enqueued,
+            "dropped": queue_handler.dropped,
+            "handled": listener.handled,
+            "batches": listener.batches,
+            "mean_emit_seconds": queue_handler.emit_seconds / max(1, queue_handler.enqueued + queue_handler.dropped),
+            "max_emit_seconds": queue_handler.max_emit_seconds,
+            "mean_latency_seconds": listener.latency_seconds / max(1, listener.handled),
+            "max_latency_seconds": listener.max_latency_seconds,
+        }
+
+
+def get_log_pipeline():
+    """Return the queue pipeline installed by configure_logging, or None."""
+    return log_pipeline
+
+
+def configure_logging(queue_size=LOG_QUEUE_SIZE, policy=None, batch_size=LOG_BATCH_SIZE):
     """
     Configures logging to:
-    - Prepend logs to daily and monthly log files.
+    - Append logs to daily and monthly log files (oldest first; see read_log_newest_first).
     - Limit console output to the most recent 15 log entries.
     - Ensure log folders and files are created if they do not exist.
+    - Run those handlers on a background thread (see LogPipeline), so logging calls only
+      enqueue the record.
+
+    Args:
+        queue_size (int): Records the queue holds.
+        policy (str): "drop" or "block" when the queue is full; defaults to the
+            LOG_QUEUE_POLICY environment variable, then "drop".
+        batch_size (int): Records written between file flushes.
     """
+    global log_pipeline
     # Set timezone for log timestamps
     tz = pytz.timezone('America/Toronto')
     current_time = datetime.now(tz)
@@ -96,25 +454,36 @@ def configure_logging():
     # Define the log message format
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 
-    # PrependFileHandler for daily logs
-    daily_handler = PrependFileHandler(daily_log_file)
+    # AppendFileHandler for daily logs
+    daily_handler = AppendFileHandler(daily_log_file, buffered=True)
     daily_handler.setFormatter(formatter)
 
-    # PrependFileHandler for monthly logs
-    monthly_handler = PrependFileHandler(monthly_log_file)
+    # AppendFileHandler for monthly logs
+    monthly_handler = AppendFileHandler(monthly_log_file, buffered=True)
     monthly_handler.setFormatter(formatter)
 
     # LimitedConsoleHandler for clean console output
-    console_handler = LimitedConsoleHandler(max_logs=15)
+    console_handler = LimitedConsoleHandler(max_logs=15, buffered=True)
     console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
 
-    # Add handlers to the root logger
-    logger.addHandler(daily_handler)
-    logger.addHandler(monthly_handler)
-    logger.addHandler(console_handler)
+    # Run the handlers on the background writer; the root logger only enqueues
+    if log_pipeline is not None:
+        logger.removeHandler(log_pipeline.queue_handler)
+        log_pipeline.stop()
+    log_pipeline = LogPipeline(
+        [daily_handler, monthly_handler, console_handler],
+        queue_size=queue_size,
+        policy=policy or os.environ.get(LOG_QUEUE_POLICY_ENV, DEFAULT_LOG_QUEUE_POLICY),
+        batch_size=batch_size,
+    )
+    log_pipeline.start()
+    logger.addHandler(log_pipeline.queue_handler)
 
     # Log a message indicating successful configuration
     logging.info("Logging configured successfully.")
+    for handler in (daily_handler, monthly_handler):
+        if handler.reordered:
+            logging.info(f"Reordered newest-first log {handler.baseFilename} to oldest-first.")
 
 
 def initialize_logging():
@@ -123,9 +492,17 @@ def initialize_logging():
     """
     try:
         configure_logging()
+        # Write out queued records at interpreter exit
+        atexit.register(stop_logging)
     except Exception as e:
         print(f"Error initializing logging: {e}")
 
 
+def stop_logging():
+    """Stop the background writer after writing out the queued records."""
+    if log_pipeline is not None:
+        log_pipeline.stop()
+
+
 # Call the initialize_logging function to apply the configuration
 initialize_logging()
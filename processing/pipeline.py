@@ -0,0 +1,295 @@
+import queue
+import logging
+import datetime
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import auth.gmail_auth
+import processing.gmail_fetch
+import processing.label_registry
+import processing.label_batch
+import processing.latest_emails
+import scraping.overall_scrap
+import storage.job_store
+import storage.seen_jobs
+import utils.metrics
+
+# Marks the end of a stage's output on a queue
+_DONE = object()
+
+
+class EmailPipeline:
+    """
+    Concurrent version of `process_emails_with_transaction`, kept for the life of a listener.
+
+    Stages, connected by bounded queues of `queue_size` records:
+    1. Fetch: a thread pool batch-fetches pages of unread emails.
+    2. Scrape: a process pool parses the HTML and extracts jobs (BeautifulSoup is CPU bound).
+    3. Store + finalize: the calling thread buffers jobs in a JobAccumulator (single writer)
+       and a second thread pool runs `finalize_email`. At the end of the cycle the jobs are
+       written to the job sink in one call, then label updates are applied with messages.batchModify.
+
+    The pools are created once and reused by every `process` call; `close` shuts them down.
+
+    A `googleapiclient` service is not thread-safe, so with a real Gmail client pass
+    `service_factory` (e.g. `GmailSessionManager.new_service`): every thread that calls
+    Gmail, the calling thread included, then builds its own client once and keeps it
+    across polls. The clients are rebuilt after an auth error. Without a factory, the
+    `service` given to `process` is shared by every thread.
+
+    Args:
+        service_factory (callable): Returns a new service for an I/O thread.
+        fetch_workers (int): Threads fetching batches.
+        scrape_workers (int): Processes parsing and scraping HTML.
+        finalize_workers (int): Threads applying labels and mark-read.
+        queue_size (int): Capacity of each inter-stage queue.
+        page_size (int): `maxResults` per list call.
+        batch_size (int): Calls per batch `get` request.
+    """
+    def __init__(self, service_factory=None, fetch_workers=4, scrape_workers=2, finalize_workers=4, queue_size=64,
+                 page_size=processing.gmail_fetch.DEFAULT_PAGE_SIZE,
+                 batch_size=processing.gmail_fetch.DEFAULT_BATCH_SIZE):
+        self.service_factory = service_factory
+        self.fetch_workers = fetch_workers
+        self.scrape_workers = scrape_workers
+        self.queue_size = queue_size
+        self.page_size = page_size
+        self.batch_size = batch_size
+        # Listing + scrape dispatch; both run for the whole cycle
+        self.stage_pool = ThreadPoolExecutor(2, thread_name_prefix="pipeline-stage")
+        self.fetch_pool = ThreadPoolExecutor(fetch_workers, thread_name_prefix="gmail-fetch")
+        self.scrape_pool = ProcessPoolExecutor(scrape_workers)
+        self.finalize_pool = ThreadPoolExecutor(finalize_workers, thread_name_prefix="gmail-finalize")
+        self._thread_state = threading.local()
+        # Bumped by reset_clients; a thread whose client is from an older generation rebuilds it
+        self._generation = 0
+
+    def thread_service(self, service):
+        """Return the calling thread's client (built once per thread), or `service` without a factory."""
+        if self.service_factory is None:
+            return service
+        state = self._thread_state
+        if getattr(state, "generation", None) != self._generation:
+            state.service = self.service_factory()
+            state.generation = self._generation
+        return state.service
+
+    def reset_clients(self):
+        """Have every thread rebuild its client on next use, e.g. once the session was invalidated."""
+        self._generation += 1
+
+    def process(self, service, senders, error_recipient):
+        """
+        Run one poll cycle.
+
+        Args:
+            service: The Gmail API service instance (used by every thread without a `service_factory`).
+            senders (list): List of sender email addresses to filter emails from.
+            error_recipient (str): Email address to notify in case of processing errors.
+
+        Returns:
+            Counter: "processed", "succeeded" and "failed" email counts, "label_errors" for
+            emails whose label update failed, plus "api_errors" when the labels could not be
+            resolved, a stage (listing, fetching, scraping) failed or label updates were
+            rate limited.
+
+        Raises:
+            An auth error (HTTP 401 or a failed token refresh) from any stage, after the
+            per-thread clients were reset, for the caller to rebuild its credentials.
+        """
+        try:
+            return self._process(service, senders, error_recipient)
+        except Exception as e:
+            if auth.gmail_auth.is_auth_error(e):
+                self.reset_clients()
+            raise
+
+    def _process(self, service, senders, error_recipient):
+        outcomes = Counter()
+        main_service = self.thread_service(service)
+        labels = processing.label_registry.label_registry.resolve(main_service, processing.label_registry.REQUIRED_LABELS)
+        if not all(labels.values()):
+            logging.error("Failed to ensure all required labels.")
+            outcomes["api_errors"] += 1
+            return outcomes
+
+        query = f"({' OR '.join([f'from:{sender}' for sender in senders])}) is:unread"
+        job_batch = scraping.overall_scrap.JobAccumulator()
+        seen_filter = storage.seen_jobs.get_seen_job_filter(storage.job_store.get_job_sink())
+        label_batch = processing.label_batch.LabelChangeBatch(labels)
+
+        fetched = queue.Queue(maxsize=self.queue_size)
+        scraped = queue.Queue(maxsize=self.queue_size)
+        stage_errors = []
+        # Set when this thread stops consuming early; the stages then drain without new work
+        cancelled = threading.Event()
+
+        def fetch_stage():
+            """List pages and fan batches out to the fetch pool; at most 2 batches per worker in flight."""
+            slots = threading.BoundedSemaphore(self.fetch_workers * 2)
+            futures = []
+
+            def fetch_chunk(email_ids):
+                try:
+                    for record in processing.gmail_fetch.fetch_emails_batched(self.thread_service(service), email_ids,
+                                                                              batch_size=self.batch_size):
+                        fetched.put(record)
+                finally:
+                    slots.release()
+
+            try:
+                for email_ids in processing.gmail_fetch.list_message_ids(self.thread_service(service), query,
+                                                                         page_size=self.page_size, chunk_size=self.batch_size):
+                    if cancelled.is_set():
+                        break
+                    slots.acquire()
+                    futures.append(self.fetch_pool.submit(fetch_chunk, email_ids))
+                wait(futures)
+                for future in futures:
+                    if future.exception():
+                        stage_errors.append(future.exception())
+            except Exception as e:
+                stage_errors.append(e)
+            finally:
+                fetched.put(_DONE)
+
+        def scrape_stage():
+            """Submit fetched HTML to the process pool, keeping results in arrival order."""
+            in_flight = deque()
+            fetch_done = False
+            try:
+                while True:
+                    record = fetched.get()
+                    if record is _DONE:
+                        fetch_done = True
+                        break
+                    if cancelled.is_set():
+                        continue
+                    if record["error"]:
+                        in_flight.append((record, None))
+                    else:
+                        in_flight.append((record, self.scrape_pool.submit(utils.metrics.timed, scraping.overall_scrap.scrap_html_to_records, record["html_content"])))
+                    while len(in_flight) > self.scrape_workers * 2:
+                        scraped.put(_collect_scrape_result(*in_flight.popleft()))
+                while in_flight:
+                    scraped.put(_collect_scrape_result(*in_flight.popleft()))
+            except Exception as e:
+                stage_errors.append(e)
+                # Keep the fetch stage from blocking on a full queue
+                while not fetch_done:
+                    fetch_done = fetched.get() is _DONE
+            finally:
+                scraped.put(_DONE)
+
+        stage_futures = [self.stage_pool.submit(fetch_stage), self.stage_pool.submit(scrape_stage)]
+
+        # Store + finalize in this thread: one job buffer, label updates fanned out.
+        # Scraped emails are finalized once their jobs are stored (see store_and_finalize).
+        finalize_slots = threading.BoundedSemaphore(self.queue_size)
+        finalize_futures = []
+        scraped_emails = []
+        done = False
+        try:
+            while True:
+                item = scraped.get()
+                if item is _DONE:
+                    done = True
+                    break
+                record, job_records, error = item
+                email_id, html_content, metadata = record["email_id"], record["html_content"], record["metadata"]
+                outcomes["processed"] += 1
+
+                if error is None:
+                    # Scraping runs in other processes, so already-seen jobs are dropped here
+                    job_batch.add_email(job_records if seen_filter is None else seen_filter.new_records(job_records))
+                    logging.info(f"Scraping successful for email: {metadata['subject']}")
+                    scraped_emails.append((email_id, html_content, metadata))
+                else:
+                    logging.error(f"Email processing failed for ID {email_id}: {error}")
+                    if isinstance(error, BrokenProcessPool) and not any(isinstance(e, BrokenProcessPool) for e in stage_errors):
+                        stage_errors.append(error)
+                    if metadata is None:
+                        html_content = ""
+                        metadata = {"subject": f"Unfetched email {email_id}", "sender_email": "", "received_datetime": datetime.datetime.now()}
+                    outcomes["failed"] += 1
+
+                    def finalize(email_id=email_id, html_content=html_content, metadata=metadata, error=error):
+                        try:
+                            processing.latest_emails.finalize_email(
+                                email_id, self.thread_service(service), html_content, metadata, labels, error_recipient,
+                                success=False, error=error, label_batch=label_batch
+                            )
+                        finally:
+                            finalize_slots.release()
+
+                    finalize_slots.acquire()
+                    finalize_futures.append(self.finalize_pool.submit(finalize))
+
+                if len(label_batch) + len(scraped_emails) >= processing.label_batch.GMAIL_BATCH_MODIFY_LIMIT:
+                    processing.latest_emails.store_and_finalize(main_service, job_batch, seen_filter, scraped_emails, labels,
+                                                                error_recipient, label_batch, outcomes)
+                    processing.latest_emails.apply_label_changes(main_service, label_batch, outcomes)
+        finally:
+            if not done:
+                # Cut short: emails not taken yet stay unread for the next poll
+                cancelled.set()
+                while scraped.get() is not _DONE:
+                    pass
+            wait(stage_futures)
+            wait(finalize_futures)
+            # Jobs first: their emails are only finalized as successes once stored. Queued
+            # label updates are applied even if the cycle was cut short.
+            processing.latest_emails.store_and_finalize(main_service, job_batch, seen_filter, scraped_emails, labels,
+                                                        error_recipient, label_batch, outcomes)
+            processing.latest_emails.apply_label_changes(main_service, label_batch, outcomes)
+
+        for error in stage_errors:
+            logging.error(f"Pipeline stage failed: {error}")
+            if auth.gmail_auth.is_auth_error(error):
+                raise error
+        if any(isinstance(error, BrokenProcessPool) for error in stage_errors):
+            # A dead worker breaks the pool for good; start a fresh one for the next poll
+            self.scrape_pool.shutdown(wait=False)
+            self.scrape_pool = ProcessPoolExecutor(self.scrape_workers)
+        if stage_errors:
+            outcomes["api_errors"] += 1
+        if not outcomes["processed"]:
+            logging.info("No new emails found.")
+        return outcomes
+
+    def close(self):
+        """Shut the pools down, waiting for running work."""
+        for pool in (self.stage_pool, self.fetch_pool, self.scrape_pool, self.finalize_pool):
+            pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def process_emails_pipelined(service, senders, error_recipient, service_factory=None, **kwargs):
+    """
+    Run one pipelined poll cycle with a pipeline of its own (see EmailPipeline for the
+    stages and `kwargs`). A listener keeps one EmailPipeline instead, so its pools and
+    per-thread clients live across polls.
+
+    Returns:
+        Counter: as returned by EmailPipeline.process.
+    """
+    with EmailPipeline(service_factory=service_factory, **kwargs) as pipeline:
+        return pipeline.process(service, senders, error_recipient)
+
+
+def _collect_scrape_result(record, future):
+    """Wait for a scrape future and return (record, job_records, error)."""
+    if future is None:
+        return record, None, record["error"]
+    try:
+        job_records, seconds = future.result()
+        utils.metrics.observe_stage("scrape", seconds)
+        return record, job_records, None
+    except Exception as e:
+        return record, None, e
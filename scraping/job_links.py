@@ -0,0 +1,148 @@
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlsplit, parse_qs
+import requests
+
+# Canonical form of a job link: the stable job key and a token-free URL for it
+JobLink = namedtuple("JobLink", ["job_key", "canonical_url"])
+
+# Query parameters that carry Indeed's 16-hex-digit job key
+JOB_KEY_PARAMS = ("jk", "vjk")
+JOB_KEY_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+# /viewjob/<jk>, /job/<slug>-<jk> and similar path forms
+JOB_KEY_PATH_PATTERN = re.compile(r"[/-]([0-9a-f]{16})(?:[/?#]|$)")
+
+LINK_CACHE_SIZE = 50_000
+
+# Process-wide canonicalizer used by the scrapers
+job_link_canonicalizer = None
+
+
+class JobLinkCanonicalizer:
+    """
+    Maps Indeed tracking/redirect links to a JobLink(job_key, canonical_url).
+
+    The job key is the `jk` (or `vjk`) parameter of the link, or a 16-hex-digit key in
+    its path; the canonical URL is `https://<host>/viewjob?jk=<key>`. Results are kept in
+    an in-memory LRU, so a link repeated across emails is parsed once. Parsing a link
+    costs a few microseconds, less than a lookup in an on-disk memo would.
+
+    Links without a key in the URL (e.g. ad-click redirects) can optionally be resolved
+    by following their redirects (`resolve_redirects=True`, one HEAD request per link);
+    the LRU keeps those results too. Unresolved links get a hashed key of their host and
+    path, which drops the per-email tracking query.
+
+    The key is stored next to the original link, not instead of it, so every stored job
+    row grows by its `job_key` column. Dedup is what gets cheaper: the SQLite upserts and
+    the seen-job filter compare the compact keys.
+
+    Args:
+        cache_size (int): Links kept in the in-memory LRU.
+        resolve_redirects (bool): Follow redirects for links without a job key.
+        timeout (float): Seconds per redirect resolution.
+    """
+    def __init__(self, cache_size=LINK_CACHE_SIZE, resolve_redirects=False, timeout=10.0):
+        self.cache_size = cache_size
+        self.resolve_redirects = resolve_redirects
+        self.timeout = timeout
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.parsed = 0
+        self.resolved = 0
+        self._lock = threading.Lock()
+
+    def canonicalize(self, link):
+        """Return the JobLink for a link, or None for an empty link."""
+        if not link:
+            return None
+        with self._lock:
+            job_link = self.cache.get(link)
+            if job_link is not None:
+                self.cache.move_to_end(link)
+                self.cache_hits += 1
+                return job_link
+
+        job_link = self._canonicalize_uncached(link)
+
+        with self._lock:
+            self.cache[link] = job_link
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return job_link
+
+    def _canonicalize_uncached(self, link):
+        self.parsed += 1
+        job_link = parse_job_link(link)
+        if job_link is not None:
+            return job_link
+
+        if self.resolve_redirects:
+            job_link = self._resolve(link)
+            if job_link is not None:
+                return job_link
+
+        parts = urlsplit(link)
+        location = f"{parts.netloc.lower()}{parts.path}"
+        return JobLink("h:" + hashlib.sha1(location.encode("utf-8")).hexdigest()[:16], f"{parts.scheme}://{location}")
+
+    def _resolve(self, link):
+        try:
+            response = requests.head(link, allow_redirects=True, timeout=self.timeout)
+            self.resolved += 1
+            # Every hop of the redirect chain, ending with the final URL
+            for url in [hop.url for hop in response.history] + [response.url]:
+                job_link = parse_job_link(url)
+                if job_link is not None:
+                    return job_link
+        except requests.RequestException as e:
+            logging.warning(f"Could not resolve job link redirect: {e}")
+        return None
+
+    def stats(self):
+        """Cache counters."""
+        with self._lock:
+            return {
+                "cache_hits": self.cache_hits,
+                "parsed": self.parsed,
+                "resolved": self.resolved,
+                "cached_links": len(self.cache),
+            }
+
+
+def parse_job_link(link):
+    """Extract the JobLink from a URL that carries the job key, or return None."""
+    parts = urlsplit(link)
+    host = parts.netloc.lower() or "www.indeed.com"
+    query = parse_qs(parts.query)
+    for param in JOB_KEY_PARAMS:
+        for value in query.get(param, []):
+            key = value.strip().lower()
+            if JOB_KEY_PATTERN.match(key):
+                return JobLink(key, f"https://{host}/viewjob?jk={key}")
+    match = JOB_KEY_PATH_PATTERN.search(parts.path.lower())
+    if match:
+        return JobLink(match.group(1), f"https://{host}/viewjob?jk={match.group(1)}")
+    return None
+
+
+def get_job_link_canonicalizer():
+    """Return the process-wide canonicalizer, creating it on first use."""
+    global job_link_canonicalizer
+    if job_link_canonicalizer is None:
+        job_link_canonicalizer = JobLinkCanonicalizer()
+    return job_link_canonicalizer
+
+
+def job_key(link, title=None, company=None, location=None):
+    """
+    Normalized key of a job posting (see JobLinkCanonicalizer); without a link, a hash of
+    title/company/location.
+    """
+    job_link = get_job_link_canonicalizer().canonicalize(link)
+    if job_link is not None:
+        return job_link.job_key
+    basis = "|".join((value or "").strip().lower() for value in (title, company, location))
+    return "h:" + hashlib.sha1(basis.encode("utf-8")).hexdigest()[:16]
@@ -6,6 +6,9 @@ import os
 import logging
 import scraping.scrap_job_blocks
 import scraping.scrap_job_elements
+import scraping.job_links
+import utils.html_module
+import utils.metrics
 
 logging.basicConfig(level=logging.INFO)
 
@@ -20,11 +23,8 @@ from bs4 import BeautifulSoup
 def scrap_process_email_content_to_csv(soup):
     """Process email content through scraping and data extraction."""
     try:
-        # Step 2: Extract individual job blocks as a list of soups
-        job_blocks = scraping.scrap_job_blocks.extract_individual_job_blocks(soup)
-
-        # Step 3: Scrape all indiviual job details into a DataFrame
-        jobs_df = scrap_all_individual_jobs(job_blocks)
+        # Steps 2-3: Extract job blocks and scrape them into a DataFrame
+        jobs_df = scrap_email_content_to_dataframe(soup)
 
         # Step 4: append the DataFrame to a CSV file
         results_create_or_append_to_csv(jobs_df, reset_file=False)
@@ -35,22 +35,149 @@ def scrap_process_email_content_to_csv(soup):
         raise
 
 
+def scrap_email_content_to_dataframe(soup):
+    """Extract all job postings from a parsed email into a DataFrame, without storing it."""
+    # Step 2: Extract individual job blocks as a list of soups
+    job_blocks = scraping.scrap_job_blocks.extract_individual_job_blocks(soup)
+
+    # Step 3: Scrape all indiviual job details into a DataFrame
+    return scrap_all_individual_jobs(job_blocks)
+
+
+def scrap_email_content_to_records(soup, seen_filter=None, current_date=None):
+    """
+    Extract all job postings from a parsed email as a list of JobRecords.
+
+    With a `seen_filter` (storage.seen_jobs.SeenJobFilter), blocks of jobs seen before are
+    dropped right after block extraction, before their fields are parsed; if parsing then
+    fails, the keys this email marked are rolled back, so a retry does not drop its jobs.
+    `current_date` is the email's received time when re-scraping old emails (see
+    get_individual_job_record).
+    """
+    job_blocks = scraping.scrap_job_blocks.extract_individual_job_blocks(soup)
+    if seen_filter is None:
+        return [scraping.scrap_job_elements.get_individual_job_record(block, current_date) for block in job_blocks]
+    checkpoint = seen_filter.checkpoint()
+    try:
+        job_blocks = seen_filter.new_blocks(job_blocks)
+        return [scraping.scrap_job_elements.get_individual_job_record(block, current_date) for block in job_blocks]
+    except Exception:
+        seen_filter.rollback(checkpoint)
+        raise
+
+
+def scrap_html_to_dataframe(html_content):
+    """
+    Parse raw email HTML and scrape its jobs into a DataFrame.
+    Takes and returns picklable values, so it can run in a process pool.
+    """
+    soup = utils.html_module.make_soup(html_content)
+    return scrap_email_content_to_dataframe(soup)
+
+
+def scrap_html_to_records(html_content, current_date=None):
+    """
+    Parse raw email HTML and scrape its jobs into a list of JobRecords.
+    Takes and returns picklable values, so it can run in a process pool.
+    """
+    soup = utils.html_module.make_soup(html_content)
+    return scrap_email_content_to_records(soup, current_date=current_date)
+
+
 
 ############################################################################################
 def scrap_all_individual_jobs(soup_list):
     """
-    Takes a list of soup objects and applies scraping.scrap_job_elements.get_data on each.
-    Returns a unified DataFrame.
+    Takes a list of soup objects and applies scraping.scrap_job_elements.get_individual_job_record on each.
+    Returns a unified DataFrame (with no rows when the list is empty).
     """
-    all_jobs = []
-    for soup in soup_list:
-        job_data = scraping.scrap_job_elements.get_individual_job(soup)
-        all_jobs.append(job_data)
+    jobs = JobAccumulator()
+    jobs.extend(scraping.scrap_job_elements.get_individual_job_record(soup) for soup in soup_list)
+    return jobs.to_dataframe()
 
-    # Concatenate all DataFrames into one
-    unified_dataframe = pd.concat(all_jobs, ignore_index=True)
-    return unified_dataframe
 
+class JobAccumulator:
+    """
+    Column-wise buffer of scraped jobs for a whole poll cycle.
+
+    Records are appended field by field into one list per JobRecord field, and a single
+    DataFrame (or Arrow table) is built at flush time, instead of one frame per job or
+    per email.
+    """
+    def __init__(self):
+        self.columns = {field: [] for field in scraping.scrap_job_elements.JobRecord._fields}
+        self.email_count = 0
+
+    def __len__(self):
+        return len(self.columns["title"])
+
+    def add_email(self, records):
+        """Append the jobs of one email; an email without jobs adds nothing."""
+        job_count = len(self)
+        self.extend(records)
+        self.email_count += 1
+        utils.metrics.count_jobs(len(self) - job_count)
+
+    def extend(self, records):
+        appenders = [column.append for column in self.columns.values()]
+        for record in records:
+            for append, value in zip(appenders, record):
+                append(value)
+
+    def clear(self):
+        for column in self.columns.values():
+            column.clear()
+        self.email_count = 0
+
+    def to_dataframe(self):
+        """Build one DataFrame, with JobRecord field order as columns, from the buffered jobs."""
+        return with_integer_days(pd.DataFrame(self.columns, columns=list(self.columns)))
+
+    def to_arrow(self, schema=None):
+        """Build one `pyarrow.Table` from the buffered jobs (requires pyarrow)."""
+        import pyarrow as pa
+        return pa.table(self.columns, schema=schema)
+
+    def flush(self, sink, seen_filter=None):
+        """
+        Write the buffered jobs to a job sink (see storage.job_store) in one call and clear the buffer.
+
+        A `seen_filter` commits the jobs checked since its last commit once they are stored,
+        or forgets them if the write fails.
+
+        The sink is flushed too: the caller finalizes the emails (marks them read) once this
+        returns, so the jobs must be on disk rather than in a sink buffer. A buffering sink
+        keeps its file count down by compacting instead (see ParquetJobSink).
+
+        Returns:
+            int: Number of jobs written.
+        """
+        job_count = len(self)
+        try:
+            if job_count:
+                with utils.metrics.stage_timer("storage"):
+                    sink.write(self.columns)
+                    sink.flush()
+                logging.info(f"Stored {job_count} job(s) from {self.email_count} email(s).")
+        except Exception:
+            if seen_filter is not None:
+                seen_filter.rollback()
+            raise
+        if seen_filter is not None:
+            seen_filter.commit()
+        self.clear()
+        return job_count
+
+
+
+def with_integer_days(frame):
+    """
+    Return `frame` with its `days` column as nullable Int64. With a missing value among
+    them, pandas would make the column float64 and the CSV would hold "3.0" instead of "3".
+    """
+    if "days" in frame.columns and frame["days"].dtype != "Int64":
+        frame = frame.assign(days=pd.to_numeric(frame["days"], errors="coerce").astype("Int64"))
+    return frame
 
 
 def results_create_or_append_to_csv(dataframe, reset_file=False):
@@ -62,6 +189,8 @@ def results_create_or_append_to_csv(dataframe, reset_file=False):
         dataframe (pd.DataFrame): The DataFrame to append to the CSV file.
         reset_file (bool): If True, resets the file and writes the DataFrame as a fresh file.
     """
+    dataframe = with_integer_days(dataframe)
+
     # Ensure the directory exists
     directory = './data/raw_processed'
     os.makedirs(directory, exist_ok=True)
@@ -75,6 +204,38 @@ def results_create_or_append_to_csv(dataframe, reset_file=False):
         dataframe.to_csv(file_path, mode='w', header=True, index=False)
         print(f"Data written to {file_path} as a fresh file.")
     else:
-        dataframe.to_csv(file_path, mode='a', header=False, index=False)
+        existing_columns = list(pd.read_csv(file_path, nrows=0).columns)
+        new_columns = [column for column in dataframe.columns if column not in existing_columns]
+        if new_columns:
+            existing_columns = add_csv_columns(file_path, new_columns)
+        dataframe.reindex(columns=existing_columns).to_csv(file_path, mode='a', header=False, index=False)
         print(f"Data appended to {file_path}.")
 
+
+def add_csv_columns(file_path, new_columns):
+    """
+    Rewrite a monthly CSV once with `new_columns` appended to its header, so a month
+    started before those columns existed (e.g. job_key) keeps them for later appends.
+    A missing job_key is computed from each existing row; other new columns stay empty.
+    The file is replaced atomically.
+
+    Returns:
+        list: The file's columns after the rewrite.
+    """
+    frame = pd.read_csv(file_path, dtype=str, keep_default_na=False)
+    for column in new_columns:
+        if column == "job_key":
+            frame[column] = [
+                scraping.job_links.job_key(link or None, title, company, location)
+                for link, title, company, location in zip(
+                    frame.get("link", [""] * len(frame)), frame.get("title", [""] * len(frame)),
+                    frame.get("company", [""] * len(frame)), frame.get("location", [""] * len(frame)))
+            ]
+        else:
+            frame[column] = ""
+    temp_path = f"{file_path}.tmp"
+    frame.to_csv(temp_path, index=False)
+    os.replace(temp_path, file_path)
+    logging.info(f"Added column(s) {new_columns} to {file_path} ({len(frame)} existing row(s)).")
+    return list(frame.columns)
+
@@ -1,14 +1,55 @@
 from bs4 import BeautifulSoup  # For parsing HTML
+from bs4.element import NavigableString
 import requests  # For fetching HTML (if needed)
 import re
 import os
 import datetime
 
+# Posting-age labels that mark a job posting (case-insensitive)
+JOB_LABEL_PATTERN = re.compile(r"days ago|day ago|just posted", re.IGNORECASE)
+
+# Tags that delimit a job posting block
+JOB_BLOCK_TAGS = ("tbody", "table")
+
 def extract_individual_job_blocks(soup):
     """
     Extract job postings by finding the nearest ancestor <tbody> or <table>
     for labels like 'days ago' or 'just posted'.
 
+    Walks the tree once, in document order, with an explicit stack that carries the
+    nearest <tbody>/<table> ancestor of each node, so a matching string resolves its
+    block without a separate `find_parent`. Output matches
+    `extract_individual_job_blocks_legacy`.
+
+    Args:
+        soup (BeautifulSoup): Parsed HTML content.
+    Returns:
+        list: List of filtered <tbody> or <table> elements containing job postings.
+    """
+    job_postings = []
+    seen_ancestors = set()
+
+    # Each entry: (iterator over a node's children, nearest block ancestor of those children)
+    stack = [(iter(soup.contents), None)]
+    while stack:
+        children, ancestor = stack[-1]
+        node = next(children, None)
+        if node is None:
+            stack.pop()
+        elif isinstance(node, NavigableString):
+            if ancestor is not None and id(ancestor) not in seen_ancestors and JOB_LABEL_PATTERN.search(node):
+                job_postings.append(ancestor)
+                seen_ancestors.add(id(ancestor))
+        else:
+            stack.append((iter(node.contents), node if node.name in JOB_BLOCK_TAGS else ancestor))
+
+    return job_postings
+
+def extract_individual_job_blocks_legacy(soup):
+    """
+    Original `find_all(string=...)` + `find_parent` implementation of
+    `extract_individual_job_blocks`, kept for comparison and benchmarking.
+
     Args:
         soup (BeautifulSoup): Parsed HTML content.
     Returns:
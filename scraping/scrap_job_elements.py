@@ -5,17 +5,126 @@ from datetime import datetime
 import os
 import logging
 import scraping.scrap_job_blocks
+import scraping.job_links
 from datetime import datetime, timedelta
 import pandas as pd
 from bs4 import BeautifulSoup
 import re
+from collections import namedtuple
 
 logging.basicConfig(level=logging.INFO)
 
+# One scraped job posting; field order is the column order of the jobs CSV.
+# `link` is the original tracking URL, `job_key` its stable key (see scraping.job_links).
+# Both are stored, so a row is larger than with the link alone.
+JobRecord = namedtuple("JobRecord", [
+    "title", "link", "company", "rating", "location", "type", "description",
+    "days_posted", "days", "posting_date", "fetched_date", "job_key",
+])
+
+
 def get_individual_job(soup):
     """
     Extract job details from the given BeautifulSoup object, handling potential HTML structure variations.
 
+    Args:
+        soup (BeautifulSoup): Parsed BeautifulSoup object of the page.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing job details.
+    """
+    return pd.DataFrame([get_individual_job_record(soup)._asdict()])
+
+
+def get_individual_job_record(soup, current_date=None):
+    """
+    Extract job details from a job block as a JobRecord, without building DataFrames.
+
+    Reads only the <tr> rows the fields come from, by position among all rows of the block:
+    1 -> title (first cell) and link (first <a href>), 3 -> company and rating (first two
+    cells), 4 -> "location • type", second-to-last -> description, last -> days posted.
+    When positions coincide in short blocks, earlier rules in that list win, as in
+    `get_individual_job_legacy`. Missing rows or cells give None. `job_key` is the
+    canonical key of the link (see scraping.job_links).
+
+    Args:
+        soup (BeautifulSoup): Parsed job block.
+        current_date (datetime): Date the email was received, which "N days ago" and
+            fetched_date are relative to; now when None (live emails).
+
+    Returns:
+        JobRecord: The job's fields.
+    """
+    rows = soup.find_all('tr')
+    row_count = len(rows)
+
+    title = link = company = rating = location = job_type = description = days_posted = None
+
+    for number in sorted({1, 3, 4, row_count - 1, row_count}):
+        if number < 1 or number > row_count:
+            continue
+        row = rows[number - 1]
+        cells = [td.text.strip() for td in row.find_all('td', limit=2)]
+        first_cell = cells[0] if cells else None
+
+        if number == 1:
+            title = first_cell
+            anchor = row.find('a', href=True)
+            link = anchor['href'] if anchor else None
+        elif number == 3:
+            company = first_cell
+            rating = cells[1] if len(cells) > 1 else None
+        elif number == 4:
+            if first_cell and '•' in first_cell:
+                location_parts = first_cell.split('•')
+                location = location_parts[0].strip()
+                job_type = location_parts[1].strip()
+            else:
+                location = first_cell
+        elif number == row_count:
+            days_posted = first_cell
+        else:
+            description = first_cell
+
+    # Add posting_date, fetched_date, and calculate days
+    current_date = current_date or datetime.now()
+    days = None
+    posting_date = None
+
+    if days_posted:
+        days_posted_lower = days_posted.lower()
+        if "day" in days_posted_lower:
+            # Extract numeric value of days
+            digits = ''.join(filter(str.isdigit, days_posted))
+            days = int(digits) if digits else 1
+            posting_date = current_date - timedelta(days=days)
+        elif "just posted" in days_posted_lower:
+            posting_date = current_date
+            days = 0
+        else:
+            posting_date = current_date
+
+    return JobRecord(
+        title=title,
+        link=link,
+        company=company,
+        rating=rating,
+        location=location,
+        type=job_type,
+        description=description,
+        days_posted=days_posted,
+        days=days,
+        posting_date=posting_date.strftime('%Y-%m-%d') if posting_date else None,
+        fetched_date=current_date.strftime('%Y-%m-%d'),
+        job_key=scraping.job_links.job_key(link, title, company, location),
+    )
+
+
+def get_individual_job_legacy(soup):
+    """
+    Original DataFrame-based implementation of `get_individual_job`, kept for comparison
+    and benchmarking.
+
     Args:
         soup (BeautifulSoup): Parsed BeautifulSoup object of the page.
 
@@ -0,0 +1,23 @@
+"""
+One-shot conversion of ./data/raw_processed/YYYY_MM.csv into the Parquet job dataset.
+
+Usage (from the repository root):
+    python -m storage.convert_monthly_csvs --csv-dir ./data/raw_processed --parquet-dir ./data/parquet/jobs
+"""
+import argparse
+import storage.job_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv-dir", default=storage.job_store.CSV_JOBS_DIR)
+    parser.add_argument("--parquet-dir", default=storage.job_store.PARQUET_JOBS_DIR)
+    args = parser.parse_args()
+
+    sink = storage.job_store.ParquetJobSink(root=args.parquet_dir)
+    converted = storage.job_store.convert_monthly_csvs(args.csv_dir, sink)
+    print(f"Converted {converted} job(s) into {args.parquet_dir}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import os
+import re
+import gzip
+import sqlite3
+import hashlib
+import logging
+import datetime
+import threading
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is used when zstandard is not installed
+    zstandard = None
+
+EMAIL_ARCHIVE_DIR = "data/archive"
+# A new segment file is started once the current one reaches this size
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+
+# Process-wide archive used by finalize_email, opened on first use
+email_archive = None
+
+CREATE_ARCHIVE_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        segment TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        codec TEXT NOT NULL,
+        size INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS emails (
+        message_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        hash TEXT NOT NULL REFERENCES blobs (hash),
+        sender TEXT,
+        subject TEXT,
+        received_at TEXT,
+        archived_at TEXT NOT NULL,
+        PRIMARY KEY (message_id, status)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_emails_sender ON emails (sender)",
+    "CREATE INDEX IF NOT EXISTS idx_emails_received_at ON emails (received_at)",
+    "CREATE INDEX IF NOT EXISTS idx_emails_hash ON emails (hash)",
+)
+
+# Legacy file names: 2024_December_16___Time_15_30_01_123___Title_....html (milliseconds optional)
+LEGACY_FILE_PATTERN = re.compile(r"^(\d{4}_[A-Za-z]+_\d{2})___Time_(\d{2}_\d{2}_\d{2})(?:_(\d{1,6}))?___")
+
+
+class EmailArchive:
+    """
+    Content-addressed archive of raw email HTML.
+
+    Each distinct HTML body is stored once, keyed by its SHA-256, compressed with zstd
+    (or gzip when zstandard is not installed) and appended to rolling segment files
+    `segments/segment-NNNNNN.pack` of about `segment_size` bytes. A SQLite index maps
+    blobs to (segment, offset, length) and emails (message id, status, sender, subject,
+    received date) to blobs.
+
+    Blobs are written before their index rows, so a crash leaves at most unreferenced
+    bytes at the end of a segment.
+
+    Args:
+        root (str): Archive directory.
+        segment_size (int): Bytes per segment before rolling to a new one.
+        codec (str): "zstd" or "gzip"; defaults to zstd when available.
+    """
+    def __init__(self, root=EMAIL_ARCHIVE_DIR, segment_size=DEFAULT_SEGMENT_SIZE, codec=None):
+        self.root = root
+        self.segment_size = segment_size
+        self.codec = codec or ("zstd" if zstandard else "gzip")
+        if self.codec == "zstd" and zstandard is None:
+            raise ValueError("The zstd codec needs the zstandard package.")
+        self.segment_dir = os.path.join(root, "segments")
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            for statement in CREATE_ARCHIVE_TABLES:
+                self.connection.execute(statement)
+        self._lock = threading.Lock()
+        self._segment = self._latest_segment()
+
+    def put(self, html_content, message_id, status="success", sender=None, subject=None, received_datetime=None):
+        """
+        Archive one email's HTML; identical bodies share one blob.
+
+        Args:
+            html_content (str): The email HTML.
+            message_id (str): Gmail message id (or another unique id).
+            status (str): "success" or "failed".
+            sender (str): Sender as in the email metadata.
+            subject (str): Email subject.
+            received_datetime (datetime.datetime): When the email was received.
+
+        Returns:
+            str: The content hash.
+        """
+        data = html_content.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        received_at = received_datetime.isoformat() if received_datetime else None
+        archived_at = datetime.datetime.now().isoformat(timespec="seconds")
+
+        with self._lock:
+            known = self.connection.execute("SELECT 1 FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+            blob_row = None if known else (content_hash, *self._append_blob(data), self.codec, len(data))
+            with self.connection:
+                if blob_row:
+                    self.connection.execute("INSERT INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blob_row)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO emails VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (message_id, status, content_hash, sender, subject, received_at, archived_at),
+                )
+        return content_hash
+
+    def get_blob(self, content_hash):
+        """Return the HTML stored under a content hash, or None."""
+        location = self.locate(content_hash)
+        return read_blob(*location) if location else None
+
+    def locate(self, content_hash):
+        """Return (segment path, offset, length, codec) of a blob, or None; see `read_blob`."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT segment, offset, length, codec FROM blobs WHERE hash = ?", (content_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        segment, offset, length, codec = row
+        return os.path.join(self.segment_dir, segment), offset, length, codec
+
+    def get_html(self, message_id, status=None):
+        """Return the archived HTML of a message (latest status if not given), or None."""
+        rows = self.find(message_id=message_id, status=status)
+        return self.get_blob(rows[-1]["hash"]) if rows else None
+
+    def find(self, message_id=None, sender=None, status=None, start=None, end=None):
+        """
+        List archived emails, oldest received first, filtered by any of: message id,
+        sender substring, status, and received date range [start, end) as datetimes or ISO strings.
+
+        Returns:
+            list: dicts with message_id, status, hash, sender, subject, received_at, archived_at.
+        """
+        clauses, params = [], []
+        for clause, value in (
+            ("message_id = ?", message_id),
+            ("sender LIKE ?", f"%{sender}%" if sender else None),
+            ("status = ?", status),
+            ("received_at >= ?", start.isoformat() if isinstance(start, datetime.datetime) else start),
+            ("received_at < ?", end.isoformat() if isinstance(end, datetime.datetime) else end),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        query = "SELECT message_id, status, hash, sender, subject, received_at, archived_at FROM emails"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY received_at, archived_at"
+        with self._lock:
+            cursor = self.connection.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def replay(self, **filters):
+        """Yield (email row, HTML) for the emails matching `find(**filters)`, for re-scraping."""
+        for row in self.find(**filters):
+            yield row, self.get_blob(row["hash"])
+
+    def stats(self):
+        """Counts and sizes of the archive."""
+        with self._lock:
+            emails = self.connection.execute("SELECT COUNT(*) FROM emails").fetchone()[0]
+            blobs, raw_bytes, stored_bytes = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM blobs"
+            ).fetchone()
+        return {"emails": emails, "blobs": blobs, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes,
+                "segments": len(os.listdir(self.segment_dir))}
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _latest_segment(self):
+        segments = sorted(name for name in os.listdir(self.segment_dir) if name.endswith(".pack"))
+        return segments[-1] if segments else "segment-000001.pack"
+
+    def _append_blob(self, data):
+        """Compress and append a blob to the current segment; returns (segment, offset, length)."""
+        blob = _compress(data, self.codec)
+        path = os.path.join(self.segment_dir, self._segment)
+        if os.path.exists(path) and os.path.getsize(path) + len(blob) > self.segment_size and os.path.getsize(path) > 0:
+            number = int(self._segment.split("-")[1].split(".")[0]) + 1
+            self._segment = f"segment-{number:06d}.pack"
+            path = os.path.join(self.segment_dir, self._segment)
+        with open(path, "ab") as file:
+            offset = file.tell()
+            file.write(blob)
+            file.flush()
+            os.fsync(file.fileno())
+        return self._segment, offset, len(blob)
+
+
+def read_blob(segment_path, offset, length, codec):
+    """
+    Read and decompress one blob straight from its segment file, without the index
+    (so worker processes can read blobs located by `EmailArchive.locate`).
+    """
+    with open(segment_path, "rb") as file:
+        file.seek(offset)
+        return _decompress(file.read(length), codec).decode("utf-8")
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _decompress(blob, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("This blob is zstd-compressed; install zstandard to read it.")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+def get_email_archive():
+    """Return the process-wide archive, opening it on first use."""
+    global email_archive
+    if email_archive is None:
+        email_archive = EmailArchive()
+    return email_archive
+
+
+def iter_legacy_html_files(data_dir="data"):
+    """
+    Enumerate the legacy per-email files written by save_email_html and save_failed_html.
+
+    Covers `data/<Name>___<email>/<year>/<Month>/<day>/*.html` (status "success") and
+    `data/failed_emails/<Name>___<email>/*.html` (status "failed"). Sender and received
+    time come from the folder and file names; the message id is "legacy:<relative path>".
+
+    Yields:
+        dict: path, message_id, status, sender, subject, received_datetime.
+    """
+    for folder in sorted(os.listdir(data_dir)):
+        if folder == "failed_emails":
+            status = "failed"
+            sender_dirs = [os.path.join(data_dir, folder, name) for name in sorted(os.listdir(os.path.join(data_dir, folder)))]
+        elif "___" in folder:
+            status = "success"
+            sender_dirs = [os.path.join(data_dir, folder)]
+        else:
+            continue
+
+        for sender_dir in sender_dirs:
+            sender_name, _, sender_email = os.path.basename(sender_dir).partition("___")
+            # save_failed_html sanitized the whole "Name <email>" string, so the name is glued to the email
+            squashed_name = sender_name.replace("_", "")
+            if status == "failed" and sender_email.startswith(squashed_name) and "@" in sender_email[len(squashed_name):]:
+                sender_email = sender_email[len(squashed_name):]
+            sender = f"{sender_name.replace('_', ' ')} <{sender_email}>"
+            for dir_path, dir_names, file_names in os.walk(sender_dir):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    if not file_name.endswith(".html"):
+                        continue
+                    file_path = os.path.join(dir_path, file_name)
+                    yield {
+                        "path": file_path,
+                        "message_id": f"legacy:{os.path.relpath(file_path, data_dir)}",
+                        "status": status,
+                        "sender": sender,
+                        "subject": file_name.split("___Title_", 1)[-1][:-len(".html")],
+                        "received_datetime": _legacy_received_datetime(file_name),
+                    }
+
+
+def migrate_html_tree(archive, data_dir="data", delete=False):
+    """
+    Import the legacy per-email files (see `iter_legacy_html_files`) into an archive.
+    Message ids are "legacy:<relative path>", so running the migration again does not
+    duplicate emails.
+
+    Args:
+        archive (EmailArchive): Target archive.
+        data_dir (str): Root of the legacy tree.
+        delete (bool): Remove each file once it is archived.
+
+    Returns:
+        int: Number of files archived.
+    """
+    migrated = 0
+    for legacy_file in iter_legacy_html_files(data_dir):
+        with open(legacy_file["path"], "r", encoding="utf-8") as file:
+            html_content = file.read()
+        archive.put(html_content, legacy_file["message_id"], status=legacy_file["status"], sender=legacy_file["sender"],
+                    subject=legacy_file["subject"], received_datetime=legacy_file["received_datetime"])
+        migrated += 1
+        if delete:
+            os.remove(legacy_file["path"])
+    logging.info(f"Migrated {migrated} email file(s) from {data_dir} into {archive.root}.")
+    return migrated
+
+
+def _legacy_received_datetime(file_name):
+    match = LEGACY_FILE_PATTERN.match(file_name)
+    if not match:
+        return None
+    date_part, time_part, fraction = match.groups()
+    try:
+        received = datetime.datetime.strptime(f"{date_part} {time_part}", "%Y_%B_%d %H_%M_%S")
+    except ValueError:
+        return None
+    if fraction:
+        received = received.replace(microsecond=int(fraction.ljust(6, "0")))
+    return received
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import logging
+import datetime
+import threading
+import scraping.job_links
+
+JOBS_DB_PATH = "./data/jobs.sqlite"
+
+# Columns stored from each job, in JobRecord field order
+JOB_COLUMNS = (
+    "title", "link", "company", "rating", "location", "type", "description",
+    "days_posted", "days", "posting_date", "fetched_date",
+)
+
+CREATE_JOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key TEXT PRIMARY KEY,
+    title TEXT,
+    link TEXT,
+    company TEXT,
+    rating TEXT,
+    location TEXT,
+    type TEXT,
+    description TEXT,
+    days_posted TEXT,
+    days INTEGER,
+    posting_date TEXT,
+    fetched_date TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    seen_count INTEGER NOT NULL DEFAULT 1
+)
+"""
+
+# Batches already applied by idempotent writes (see SqliteJobSink.write)
+CREATE_BATCHES_TABLE = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    applied_at TEXT NOT NULL,
+    job_count INTEGER NOT NULL
+)
+"""
+
+CREATE_JOBS_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_jobs_company ON jobs (company)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_location ON jobs (location)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_posting_date ON jobs (posting_date)",
+)
+
+# A job seen again keeps its first-seen fields and only moves last_seen forward
+UPSERT_JOB = f"""
+INSERT INTO jobs (job_key, {", ".join(JOB_COLUMNS)}, first_seen, last_seen)
+VALUES ({", ".join("?" * (len(JOB_COLUMNS) + 3))})
+ON CONFLICT (job_key) DO UPDATE SET
+    last_seen = excluded.last_seen,
+    seen_count = jobs.seen_count + 1
+"""
+
+
+# Kept here for callers of the job database; see scraping.job_links
+job_key = scraping.job_links.job_key
+
+
+class SqliteJobSink:
+    """
+    Job sink backed by a local SQLite database with one row per distinct job.
+
+    Rows are keyed by `job_key`; a job already in the table is upserted so only
+    `last_seen` and `seen_count` change. Each `write` (one poll cycle) is a single
+    transaction; a write with a `batch_id` also records the batch in that transaction and
+    is skipped if the batch was applied before, so a replayed batch does not bump
+    `seen_count` twice.
+
+    Repeats have to reach the sink for `seen_count` to grow, so no seen-job filter is
+    used with it (see storage.seen_jobs.get_seen_job_filter).
+
+    Args:
+        path (str): Database file.
+    """
+    counts_repeats = True
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Used from whichever thread runs the poll cycle; access is serialized by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(CREATE_JOBS_TABLE)
+            self.connection.execute(CREATE_BATCHES_TABLE)
+            for statement in CREATE_JOBS_INDEXES:
+                self.connection.execute(statement)
+        self._lock = threading.Lock()
+
+    def write(self, columns, batch_id=None):
+        """
+        Upsert jobs given as a dict of column lists (JobRecord field -> values) in one
+        transaction. A `batch_id` that was already applied is skipped.
+        """
+        seen_at = datetime.datetime.now().isoformat(timespec="seconds")
+        rows = []
+        keys = columns.get("job_key") or [
+            job_key(link, title, company, location)
+            for link, title, company, location in zip(columns["link"], columns["title"], columns["company"], columns["location"])
+        ]
+        for key, values in zip(keys, zip(*(columns[name] for name in JOB_COLUMNS))):
+            rows.append((key, *values, seen_at, seen_at))
+
+        with self._lock, self.connection:
+            if batch_id is not None:
+                applied = self.connection.execute(
+                    "INSERT OR IGNORE INTO batches VALUES (?, ?, ?)", (batch_id, seen_at, len(rows))
+                ).rowcount
+                if not applied:
+                    logging.info(f"Skipping already applied batch {batch_id}.")
+                    return
+            self.connection.executemany(UPSERT_JOB, rows)
+        logging.info(f"Upserted {len(rows)} job(s) into {self.path}.")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def count_jobs(self):
+        """Number of distinct jobs stored."""
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
@@ -0,0 +1,307 @@
+import os
+import re
+import uuid
+import logging
+import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import scraping.overall_scrap
+import scraping.job_links
+import storage.job_db
+
+# Arrow schema of a scraped job, in JobRecord field order
+JOB_SCHEMA = pa.schema([
+    ("title", pa.string()),
+    ("link", pa.string()),
+    ("company", pa.string()),
+    ("rating", pa.string()),
+    ("location", pa.string()),
+    ("type", pa.string()),
+    ("description", pa.string()),
+    ("days_posted", pa.string()),
+    ("days", pa.int64()),
+    ("posting_date", pa.string()),
+    ("fetched_date", pa.string()),
+    ("job_key", pa.string()),
+])
+
+JOB_SINKS = ("csv", "parquet", "sqlite")
+DEFAULT_JOB_SINK = "csv"
+JOB_SINK_ENV = "JOB_SINK"
+
+PARQUET_JOBS_DIR = "./data/parquet/jobs"
+CSV_JOBS_DIR = "./data/raw_processed"
+CSV_BATCH_LEDGER = "./data/raw_processed/.batches"
+
+# Rows buffered before a Parquet write, and the row-group size within each file
+DEFAULT_BUFFER_ROWS = 100_000
+DEFAULT_ROW_GROUP_SIZE = 100_000
+# Flushed files in one fetch-date partition that trigger its compaction
+DEFAULT_COMPACT_FILES = 32
+# Files written by flush (not by a batch write): part-<timestamp>-<id>-<n>.parquet
+FLUSHED_FILE_PATTERN = re.compile(r"part-\d{8}T\d{6}-[0-9a-f]{8}-\d+\.parquet")
+
+# Process-wide sink used by the poll cycles, created on first use
+job_sink = None
+
+
+class CsvJobSink:
+    """
+    The original storage: appends jobs to ./data/raw_processed/YYYY_MM.csv.
+
+    Every `write` is appended immediately, so `flush` has nothing to do. Writes with a
+    `batch_id` are recorded in a ledger file next to the CSVs and skipped if repeated; a
+    crash between the append and the ledger update can still duplicate that one batch.
+
+    Args:
+        ledger_path (str): File listing the applied batch ids.
+    """
+    def __init__(self, ledger_path=CSV_BATCH_LEDGER):
+        self.ledger_path = ledger_path
+        self._applied_batches = None
+
+    def write(self, columns, batch_id=None):
+        """
+        Append jobs given as a dict of column lists (JOB_SCHEMA field -> values).
+        A `batch_id` that was already written is skipped.
+        """
+        if batch_id is not None and batch_id in self._batches():
+            logging.info(f"Skipping already written batch {batch_id}.")
+            return
+        scraping.overall_scrap.results_create_or_append_to_csv(pd.DataFrame(columns), reset_file=False)
+        if batch_id is not None:
+            os.makedirs(os.path.dirname(self.ledger_path) or ".", exist_ok=True)
+            with open(self.ledger_path, "a", encoding="utf-8") as ledger:
+                ledger.write(f"{batch_id}\n")
+            self._applied_batches.add(batch_id)
+
+    def _batches(self):
+        if self._applied_batches is None:
+            self._applied_batches = set()
+            if os.path.exists(self.ledger_path):
+                with open(self.ledger_path, "r", encoding="utf-8") as ledger:
+                    self._applied_batches = {line.strip() for line in ledger if line.strip()}
+        return self._applied_batches
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ParquetJobSink:
+    """
+    Writes jobs as a Parquet dataset partitioned by fetch date:
+    `<root>/fetched_date=YYYY-MM-DD/part-<timestamp>-<id>-<n>.parquet`.
+
+    Writes are buffered until `buffer_rows` jobs are pending or `flush` is called, then
+    written as new files with row groups of up to `row_group_size` rows. A crash can
+    only lose the unflushed buffer.
+
+    The poll cycles flush after every write, as their emails are only finalized once the
+    jobs are on disk, so each cycle leaves a small file. Once a fetch-date partition holds
+    `compact_files` flushed files, `flush` merges them into one (see `compact`).
+
+    A write with a `batch_id` is written right away to files named after the batch
+    (`part-<batch_id>-<n>.parquet`), so writing the same batch again replaces its files
+    instead of duplicating its jobs. Compaction leaves those files alone.
+
+    Args:
+        root (str): Dataset directory.
+        buffer_rows (int): Pending rows that trigger a write.
+        row_group_size (int): Maximum rows per Parquet row group.
+        compression (str): Parquet compression codec.
+        compact_files (int): Flushed files per partition that trigger a compaction; 0 disables it.
+    """
+    def __init__(self, root=PARQUET_JOBS_DIR, buffer_rows=DEFAULT_BUFFER_ROWS,
+                 row_group_size=DEFAULT_ROW_GROUP_SIZE, compression="zstd", compact_files=DEFAULT_COMPACT_FILES):
+        self.root = root
+        self.buffer_rows = buffer_rows
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.compact_files = compact_files
+        self.pending = []
+        self.pending_rows = 0
+
+    def write(self, columns, batch_id=None):
+        """
+        Buffer jobs given as a dict of column lists (JOB_SCHEMA field -> values); with a
+        `batch_id`, write them at once as that batch's files.
+        """
+        table = pa.table(columns, schema=JOB_SCHEMA)
+        if batch_id is not None:
+            self.flush()
+            self._write_table(table, batch_id)
+            return
+        self.pending.append(table)
+        self.pending_rows += table.num_rows
+        if self.pending_rows >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered jobs, then compact the partitions written to if they hold enough files."""
+        if not self.pending_rows:
+            return
+        table = pa.concat_tables(self.pending)
+        self.pending, self.pending_rows = [], 0
+        self._write_table(table, _flushed_batch_name())
+        if self.compact_files:
+            self.compact(partitions=table.column("fetched_date").unique().to_pylist(), min_files=self.compact_files)
+
+    def compact(self, partitions=None, min_files=2):
+        """
+        Merge the flushed files of each fetch-date partition into one file.
+
+        The merged file is written under a temporary name and moved into place before the
+        originals are removed, so a crash in between can leave duplicate rows but never
+        loses any.
+
+        Args:
+            partitions (list): fetched_date values to compact; all partitions when None.
+            min_files (int): Partitions with fewer flushed files are left as they are.
+
+        Returns:
+            int: Number of files merged away.
+        """
+        if partitions is None:
+            names = os.listdir(self.root) if os.path.isdir(self.root) else []
+            partitions = [name.split("=", 1)[1] for name in names if name.startswith("fetched_date=")]
+        merged = 0
+        for fetched_date in partitions:
+            directory = os.path.join(self.root, f"fetched_date={fetched_date}")
+            if not os.path.isdir(directory):
+                continue
+            files = sorted(os.path.join(directory, name) for name in os.listdir(directory) if FLUSHED_FILE_PATTERN.fullmatch(name))
+            if len(files) < max(min_files, 2):
+                continue
+            # The partition column lives in the directory name, not in the files
+            table = pa.concat_tables([pq.read_table(path, schema=JOB_SCHEMA.remove(JOB_SCHEMA.get_field_index("fetched_date")))
+                                      for path in files])
+            target = os.path.join(directory, f"part-{_flushed_batch_name()}-0.parquet")
+            # Names starting with "." are ignored by dataset readers until the rename
+            temp_path = os.path.join(directory, f".{os.path.basename(target)}.tmp")
+            pq.write_table(table, temp_path, compression=self.compression, row_group_size=self.row_group_size)
+            os.replace(temp_path, target)
+            for path in files:
+                os.remove(path)
+            merged += len(files)
+            logging.info(f"Compacted {len(files)} file(s) ({table.num_rows} job(s)) in {directory}.")
+        return merged
+
+    def _write_table(self, table, batch_name):
+        os.makedirs(self.root, exist_ok=True)
+        pq.write_to_dataset(
+            table,
+            root_path=self.root,
+            partition_cols=["fetched_date"],
+            basename_template=f"part-{batch_name}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            compression=self.compression,
+            row_group_size=self.row_group_size,
+        )
+        logging.info(f"Wrote {table.num_rows} job(s) to Parquet dataset {self.root}.")
+
+    def close(self):
+        self.flush()
+
+
+def _flushed_batch_name():
+    return f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def create_job_sink(backend=None, **kwargs):
+    """
+    Create a job sink.
+
+    Args:
+        backend (str): One of JOB_SINKS; defaults to the JOB_SINK environment variable, then "csv".
+        **kwargs: Passed to the sink class.
+    """
+    backend = backend or os.environ.get(JOB_SINK_ENV, DEFAULT_JOB_SINK)
+    if backend == "csv":
+        return CsvJobSink(**kwargs)
+    if backend == "parquet":
+        return ParquetJobSink(**kwargs)
+    if backend == "sqlite":
+        return storage.job_db.SqliteJobSink(**kwargs)
+    raise ValueError(f"Unknown job sink '{backend}'. Choose from {JOB_SINKS}.")
+
+
+def get_job_sink():
+    """Return the process-wide job sink, creating it from JOB_SINK on first use."""
+    global job_sink
+    if job_sink is None:
+        job_sink = create_job_sink()
+    return job_sink
+
+
+def set_job_sink(backend, **kwargs):
+    """Choose the process-wide job sink at startup, closing the previous one."""
+    global job_sink
+    if job_sink is not None:
+        job_sink.close()
+    job_sink = create_job_sink(backend, **kwargs)
+    return job_sink
+
+
+def read_jobs(root=PARQUET_JOBS_DIR, columns=None, start_date=None, end_date=None):
+    """
+    Read jobs back from the Parquet dataset, touching only the requested columns and
+    the fetch-date partitions in [start_date, end_date].
+
+    Args:
+        root (str): Dataset directory.
+        columns (list): Columns to read; all when None.
+        start_date (str): First fetched_date (YYYY-MM-DD) to include.
+        end_date (str): Last fetched_date (YYYY-MM-DD) to include.
+
+    Returns:
+        pd.DataFrame: The matching jobs.
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning=ds.partitioning(
+        pa.schema([("fetched_date", pa.string())]), flavor="hive"))
+    date_filter = None
+    if start_date:
+        date_filter = ds.field("fetched_date") >= start_date
+    if end_date:
+        end_filter = ds.field("fetched_date") <= end_date
+        date_filter = end_filter if date_filter is None else date_filter & end_filter
+    return dataset.to_table(columns=columns, filter=date_filter).to_pandas()
+
+
+def convert_monthly_csvs(csv_dir=CSV_JOBS_DIR, sink=None):
+    """
+    One-shot conversion of the monthly YYYY_MM.csv files into a sink (Parquet by default).
+
+    Args:
+        csv_dir (str): Directory with the monthly CSVs.
+        sink: Target sink; a new ParquetJobSink when None.
+
+    Returns:
+        int: Number of jobs converted.
+    """
+    sink = sink or ParquetJobSink()
+    converted = 0
+    for file_name in sorted(os.listdir(csv_dir)):
+        if not file_name.endswith(".csv"):
+            continue
+        file_path = os.path.join(csv_dir, file_name)
+        frame = pd.read_csv(file_path, dtype=str).reindex(columns=JOB_SCHEMA.names)
+        columns = frame.astype(object).where(frame.notna(), None).to_dict("list")
+        # Months written while a missing days value made the column float hold "3.0"
+        days = pd.to_numeric(frame["days"], errors="coerce").astype("Int64")
+        columns["days"] = [None if pd.isna(value) else int(value) for value in days]
+        # CSVs written before job keys existed have no job_key column
+        columns["job_key"] = [
+            job_key or scraping.job_links.job_key(link, title, company, location)
+            for job_key, link, title, company, location
+            in zip(columns["job_key"], columns["link"], columns["title"], columns["company"], columns["location"])
+        ]
+        sink.write(columns)
+        converted += len(frame)
+        logging.info(f"Converted {len(frame)} job(s) from {file_path}.")
+    sink.flush()
+    return converted
@@ -0,0 +1,25 @@
+"""
+One-shot migration of the per-email HTML tree (data/<sender>/..., data/failed_emails/...)
+into the content-addressed email archive.
+
+Usage (from the repository root):
+    python -m storage.migrate_email_archive --data-dir data --archive-dir data/archive [--delete]
+"""
+import argparse
+import storage.email_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--archive-dir", default=storage.email_archive.EMAIL_ARCHIVE_DIR)
+    parser.add_argument("--delete", action="store_true", help="Remove each file once archived.")
+    args = parser.parse_args()
+
+    archive = storage.email_archive.EmailArchive(root=args.archive_dir)
+    migrated = storage.email_archive.migrate_html_tree(archive, data_dir=args.data_dir, delete=args.delete)
+    print(f"Migrated {migrated} file(s). Archive: {archive.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import os
+import json
+import atexit
+import math
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import scraping.job_links
+
+SEEN_JOBS_STATE_PATH = "data/state/seen_jobs.json"
+# Bumped when the layout of the state file changes; other versions are ignored on load
+STATE_VERSION = 1
+
+# Jobs the first Bloom filter holds at the target false-positive rate; later filters double it
+DEFAULT_CAPACITY = 100_000
+DEFAULT_ERROR_RATE = 0.001
+# Most recent job keys kept exactly
+DEFAULT_LRU_SIZE = 20_000
+# Commits between rewrites of the state file (a few hundred KB each)
+DEFAULT_SAVE_EVERY = 10
+
+# Scalable Bloom filter parameters: capacity growth and error tightening per added filter
+BLOOM_GROWTH = 2
+BLOOM_TIGHTENING = 0.5
+
+# Process-wide filter shared by the poll cycles, loaded on first use
+seen_job_filter = None
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over a bytearray, using double hashing of a 128-bit BLAKE2b digest."""
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_count = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.bit_count for i in range(self.hash_count)]
+
+    def __contains__(self, key):
+        return all(self.bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(key))
+
+    def add(self, key):
+        for index in self._indexes(key):
+            self.bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def to_state(self):
+        """JSON-serializable state, with the bit array base64-encoded."""
+        return {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "count": self.count,
+            "bits": base64.b64encode(self.bits).decode("ascii"),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a filter from `to_state()`; the sizes are derived again and must match the bits."""
+        bloom = cls(state["capacity"], state["error_rate"])
+        bits = base64.b64decode(state["bits"])
+        if len(bits) != len(bloom.bits):
+            raise ValueError(f"Bloom filter state has {len(bits)} bytes, expected {len(bloom.bits)}.")
+        bloom.bits = bytearray(bits)
+        bloom.count = state["count"]
+        return bloom
+
+
+class SeenJobFilter:
+    """
+    Remembers job keys (see `scraping.job_links.job_key`) across poll cycles and restarts.
+
+    Two layers: an exact LRU of the `lru_size` most recent keys, and a scalable Bloom
+    filter of every key ever committed. A key is "seen" if the LRU has it (exact) or the
+    Bloom filter reports it (probable; wrong with at most about `error_rate` probability).
+    The Bloom filter grows by adding filters of doubling capacity, so the false-positive
+    target holds beyond `capacity` jobs.
+
+    Keys are checked during a cycle and become seen for later checks right away, but they
+    are only committed (and persisted) by `commit()`, after the cycle's jobs are stored;
+    `rollback()` forgets them if storing fails, so retried emails are not dropped. An
+    email whose scraping fails partway rolls back to the `checkpoint()` taken before it.
+
+    The state file is JSON (bit arrays base64-encoded), replaced atomically. Rewriting it
+    on every commit would cost a few hundred KB of writes per poll, so it is saved every
+    `save_every` commits and by `close()`. A crash loses at most the commits since the
+    last save: those jobs are not filtered out once more, the same as before they were seen.
+
+    Args:
+        path (str): State file, or None to keep the filter in memory only.
+        capacity (int): Jobs the first Bloom filter is sized for.
+        error_rate (float): Target overall false-positive rate.
+        lru_size (int): Exact keys kept.
+        save_every (int): Commits between state-file writes; 1 saves on every commit.
+    """
+    def __init__(self, path=SEEN_JOBS_STATE_PATH, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE,
+                 lru_size=DEFAULT_LRU_SIZE, save_every=DEFAULT_SAVE_EVERY):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lru_size = lru_size
+        self.save_every = save_every
+        # Commits not yet in the state file
+        self.unsaved_commits = 0
+        self.filters = []
+        self.recent = OrderedDict()
+        # Insertion ordered, so a checkpoint is a position in it
+        self.pending = {}
+        self.checks = 0
+        self.exact_hits = 0
+        self.probable_hits = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=SEEN_JOBS_STATE_PATH, **kwargs):
+        """Load a persisted filter, or start an empty one if there is no (readable) state file."""
+        seen_filter = cls(path, **kwargs)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    state = json.load(file)
+                if state.get("version") != STATE_VERSION:
+                    raise ValueError(f"unsupported state version {state.get('version')!r}")
+                seen_filter.filters = [BloomFilter.from_state(bloom) for bloom in state["filters"]]
+                seen_filter.recent = OrderedDict.fromkeys(state["recent"])
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logging.warning(f"Could not load seen-job filter from {path}, starting empty: {e}")
+        return seen_filter
+
+    def save(self):
+        """Atomically persist the committed keys."""
+        self.unsaved_commits = 0
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        state = {
+            "version": STATE_VERSION,
+            "filters": [bloom.to_state() for bloom in self.filters],
+            "recent": list(self.recent),
+        }
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temp_path, self.path)
+
+    def check(self, key):
+        """
+        Return True if the job key was seen before; otherwise mark it pending and return False.
+        """
+        with self._lock:
+            self.checks += 1
+            if key in self.pending:
+                self.exact_hits += 1
+                return True
+            if key in self.recent:
+                self.recent.move_to_end(key)
+                self.exact_hits += 1
+                return True
+            if any(key in bloom for bloom in self.filters):
+                self.probable_hits += 1
+                return True
+            self.pending[key] = None
+            return False
+
+    def new_blocks(self, job_blocks):
+        """Drop job blocks whose link was seen; blocks without a link are kept."""
+        return [block for block in job_blocks if not self._seen_link(block_link(block))]
+
+    def new_records(self, records):
+        """Drop JobRecords whose link was seen; records without a link are kept."""
+        return [record for record in records if not (record.link and self.check(record.job_key))]
+
+    def _seen_link(self, link):
+        return bool(link) and self.check(scraping.job_links.job_key(link))
+
+    def commit(self):
+        """Make the pending keys permanent, persisting the filter every `save_every` commits."""
+        with self._lock:
+            if not self.pending:
+                return
+            for key in self.pending:
+                self._bloom_for_insert().add(key)
+                self.recent[key] = None
+            while len(self.recent) > self.lru_size:
+                self.recent.popitem(last=False)
+            self.pending.clear()
+            self.unsaved_commits += 1
+            if self.unsaved_commits >= self.save_every:
+                self.save()
+
+    def close(self):
+        """Persist the commits not saved yet; pending keys are left out, as on a crash."""
+        with self._lock:
+            if self.unsaved_commits:
+                self.save()
+
+    def checkpoint(self):
+        """
+        Mark the current position among the pending keys, for `rollback(checkpoint)`.
+        Meant for one thread checking one email at a time.
+        """
+        with self._lock:
+            return len(self.pending)
+
+    def rollback(self, checkpoint=0):
+        """Forget the keys checked since the last commit, or only those since `checkpoint`."""
+        with self._lock:
+            if not checkpoint:
+                self.pending.clear()
+                return
+            for key in list(self.pending)[checkpoint:]:
+                del self.pending[key]
+
+    def _bloom_for_insert(self):
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            index = len(self.filters)
+            # Error rates p0 * r^i sum to at most error_rate
+            error_rate = self.error_rate * (1 - BLOOM_TIGHTENING) * BLOOM_TIGHTENING ** index
+            self.filters.append(BloomFilter(self.capacity * BLOOM_GROWTH ** index, error_rate))
+        return self.filters[-1]
+
+    def stats(self):
+        """Hit counters, hit ratio and approximate memory use of both layers."""
+        with self._lock:
+            hits = self.exact_hits + self.probable_hits
+            bloom_bytes = sum(len(bloom.bits) for bloom in self.filters)
+            # Key strings plus roughly 100 bytes of OrderedDict entry overhead per key
+            lru_bytes = sum(len(key) + 49 + 100 for key in self.recent)
+            return {
+                "checks": self.checks,
+                "exact_hits": self.exact_hits,
+                "probable_hits": self.probable_hits,
+                "hit_ratio": hits / self.checks if self.checks else 0.0,
+                "keys": sum(bloom.count for bloom in self.filters),
+                "bloom_filters": len(self.filters),
+                "bloom_bytes": bloom_bytes,
+                "lru_keys": len(self.recent),
+                "lru_bytes": lru_bytes,
+                "memory_bytes": bloom_bytes + lru_bytes,
+            }
+
+
+def block_link(job_block):
+    """Link of a job block, read the same way as JobRecord.link: first <a href> of its first <tr>."""
+    first_row = job_block.find('tr')
+    anchor = first_row.find('a', href=True) if first_row else None
+    return anchor['href'] if anchor else None
+
+
+def get_seen_job_filter(sink=None):
+    """
+    Return the process-wide filter, loading it from SEEN_JOBS_STATE_PATH on first use.
+
+    Returns None for a `sink` that counts repeated postings itself (`counts_repeats`, e.g.
+    the SQLite sink's seen_count): the filter would drop the repeats before they reach it.
+    """
+    global seen_job_filter
+    if getattr(sink, "counts_repeats", False):
+        return None
+    if seen_job_filter is None:
+        seen_job_filter = SeenJobFilter.load()
+    return seen_job_filter
+
+
+def set_seen_job_filter(new_filter):
+    """Replace the process-wide filter, e.g. with other capacity/error settings, at startup, closing the previous one."""
+    global seen_job_filter
+    if seen_job_filter is not None:
+        seen_job_filter.close()
+    seen_job_filter = new_filter
+    return seen_job_filter
+
+
+def close_seen_job_filter():
+    """Persist the process-wide filter's unsaved commits; the listeners call it when they stop."""
+    if seen_job_filter is not None:
+        seen_job_filter.close()
+
+
+atexit.register(close_seen_job_filter)
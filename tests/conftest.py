@@ -0,0 +1,31 @@
+"""
+Shared fixtures: an offline working directory with fresh process-wide singletons.
+
+Run from the repository root: python -m pytest -q
+"""
+import os
+import pytest
+import processing.label_registry
+import storage.job_store
+import storage.seen_jobs
+import utils.fake_gmail_service
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(REPO_ROOT, utils.fake_gmail_service.FIXTURE_DIR)
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    """
+    Run in `tmp_path` (data/, logs/ and archives land there) with a fresh CSV job sink,
+    seen-job filter and label cache, and return a factory of fixture-backed FakeGmailServices.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage.job_store, "job_sink", storage.job_store.CsvJobSink())
+    monkeypatch.setattr(storage.seen_jobs, "seen_job_filter", None)
+    monkeypatch.setattr(processing.label_registry, "label_registry", processing.label_registry.LabelRegistry())
+
+    def fake_service(**kwargs):
+        return utils.fake_gmail_service.FakeGmailService.from_fixture_dir(FIXTURE_DIR, **kwargs)
+
+    return fake_service
@@ -0,0 +1,54 @@
+"""
+The asyncio listener against a FakeGmailService served over HTTP.
+
+Run from the repository root: python -m pytest -q
+"""
+import asyncio
+import base64
+import email
+import signal
+import pytest
+from googleapiclient.errors import HttpError
+import listener.async_gmail_listener
+from utils.fake_gmail_service import FakeGmailHttpServer
+from test_gmail_listener import unread_count, wait_until
+
+
+def test_auth_error_leaves_emails_unread(offline):
+    service = offline()
+    email_count = unread_count(service)
+    # Every get answers 401, the retry with a new token included
+    service.fail_next(401, count=4 * email_count, method="messages.get")
+
+    async def poll(base_url):
+        async with listener.async_gmail_listener.AsyncGmailClient(lambda: "token", base_url=base_url) as client:
+            labels = await listener.async_gmail_listener.resolve_labels_async(client)
+            await listener.async_gmail_listener.process_emails_async(client, ["alert@indeed.com"], "errors@example.com", labels)
+
+    with FakeGmailHttpServer(service) as server:
+        with pytest.raises(HttpError) as raised:
+            asyncio.run(poll(server.base_url))
+    assert raised.value.resp.status == 401
+    # Not finalized as failures: no error notification, still unread for the next poll
+    assert service.sent_messages == []
+    assert unread_count(service) == email_count
+
+
+def test_stop_sends_notification(offline, monkeypatch):
+    monkeypatch.setattr(signal, "signal", lambda signum, handler: None)
+    service = offline()
+    with FakeGmailHttpServer(service) as server:
+        listener.async_gmail_listener.start_async_email_fetch(
+            service, ["alert@indeed.com"], "errors@example.com", interval=0.1,
+            token_provider=lambda: "token", base_url=server.base_url,
+        )
+        try:
+            wait_until(lambda: unread_count(service) == 0)
+        finally:
+            listener.async_gmail_listener.stop_async_email_fetch(service, "errors@example.com")
+
+    (sent,) = service.sent_messages
+    message = email.message_from_bytes(base64.urlsafe_b64decode(sent["raw"]))
+    assert message["to"] == "errors@example.com"
+    assert message["subject"] == "Scraper Stopped"
+
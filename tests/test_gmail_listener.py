@@ -0,0 +1,34 @@
+"""
+The polling listener, driven end to end by a FakeGmailService.
+
+Run from the repository root: python -m pytest -q
+"""
+import signal
+import time
+import listener.gmail_listener
+
+
+def wait_until(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def unread_count(service):
+    with service.lock:
+        return sum("UNREAD" in message["labelIds"] for message in service.messages_store.values())
+
+
+def test_listener_polls_the_service_it_is_given(offline, monkeypatch):
+    # start_email_fetch installs signal handlers; keep pytest's
+    monkeypatch.setattr(signal, "signal", lambda signum, handler: None)
+    service = offline()
+    assert unread_count(service)
+    listener.gmail_listener.start_email_fetch(service, ["alert@indeed.com"], "errors@example.com",
+                                              interval=0.1, adaptive=False)
+    try:
+        wait_until(lambda: unread_count(service) == 0)
+    finally:
+        listener.gmail_listener.stop_email_fetch()
+    assert service.stats()["calls"]["messages.list"] >= 1
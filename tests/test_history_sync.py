@@ -0,0 +1,90 @@
+"""
+History-mode polling (listener.history_sync) against a FakeGmailService.
+
+Run from the repository root: python -m pytest -q
+"""
+import copy
+from collections import Counter
+import listener.history_sync
+import processing.latest_emails
+from test_gmail_listener import unread_count
+
+SENDERS = ["alert@indeed.com"]
+
+
+class CountingProcess:
+    """Runs the real poll cycle, counting calls; `outcomes` overrides what it returns."""
+    def __init__(self, outcomes=None):
+        self.calls = 0
+        self.outcomes = outcomes
+
+    def __call__(self, service, senders, error_recipient):
+        self.calls += 1
+        result = processing.latest_emails.process_emails_with_transaction(service, senders, error_recipient)
+        return self.outcomes if self.outcomes is not None else result
+
+
+def deliver_copy(service, message_id):
+    """Deliver an unread copy of the first fixture message under a new ID."""
+    with service.lock:
+        message = copy.deepcopy(next(iter(service.messages_store.values())))
+        message.update(id=message_id, threadId=message_id, labelIds=["INBOX", "UNREAD"])
+        service.add_message(message)
+
+
+def poll(service, process):
+    return listener.history_sync.sync_emails_incrementally(service, SENDERS, "errors@example.com", process=process)
+
+
+def test_history_replay_only_queries_when_mail_arrived(offline):
+    service = offline()
+    process = CountingProcess()
+
+    # First run: no state yet, so a full query
+    assert poll(service, process) is True
+    assert process.calls == 1 and unread_count(service) == 0
+    # Label updates of the cycle are history too, but not added mail
+    assert poll(service, process) is False
+    assert process.calls == 1
+
+    deliver_copy(service, "new-1")
+    history_id = str(service.history_id)
+    assert poll(service, process) is True
+    assert process.calls == 2 and unread_count(service) == 0
+    # The ID the history was read at; the cycle's own label updates come after it
+    assert listener.history_sync.load_history_id() == history_id
+    assert poll(service, process) is False
+    assert process.calls == 2
+
+
+def test_expired_history_falls_back_to_full_query(offline):
+    service = offline()
+    process = CountingProcess()
+    poll(service, process)
+
+    service.expire_history()
+    deliver_copy(service, "new-1")
+    # history.list answers 404 for the stored ID
+    assert poll(service, process) is True
+    assert process.calls == 2 and unread_count(service) == 0
+    assert int(listener.history_sync.load_history_id()) >= service.oldest_history_id
+    assert poll(service, process) is False
+
+
+def test_incomplete_cycle_runs_full_query_next_poll(offline):
+    service = offline()
+    process = CountingProcess()
+    poll(service, process)
+
+    deliver_copy(service, "new-1")
+    process.outcomes = Counter(processed=1, api_errors=1)
+    assert poll(service, process) is True
+    assert listener.history_sync.load_history_state()["incomplete"] is True
+
+    # No mail arrived since, but the last cycle did not complete
+    process.outcomes = None
+    assert poll(service, process) is True
+    assert process.calls == 3
+    assert listener.history_sync.load_history_state()["incomplete"] is False
+    assert poll(service, process) is False
+    assert process.calls == 3
@@ -0,0 +1,47 @@
+"""
+html.parser and lxml must scrape the same job records from every HTML fixture under
+src/, and a bad HTML_PARSER_BACKEND must be rejected when utils.html_module is imported.
+
+Run from the repository root: python -m pytest -q
+"""
+import glob
+import os
+import subprocess
+import sys
+import pytest
+import scraping.overall_scrap
+import utils.html_module
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = sorted(glob.glob(os.path.join(REPO_ROOT, "src", "**", "*.html"), recursive=True))
+
+
+def scrape_records(html_content, backend):
+    soup = utils.html_module.make_soup(html_content, backend)
+    return scraping.overall_scrap.scrap_email_content_to_records(soup)
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: os.path.relpath(path, REPO_ROOT))
+def test_lxml_matches_html_parser(path):
+    pytest.importorskip("lxml")
+    with open(path, "r", encoding="utf-8") as file:
+        html_content = file.read()
+    assert scrape_records(html_content, "lxml") == scrape_records(html_content, "html.parser")
+
+
+def test_fixtures_found():
+    assert FIXTURES, "no HTML fixtures under src/"
+
+
+@pytest.mark.parametrize("backend", ["html5lib", "no-such-parser"])
+def test_invalid_backend_rejected_at_import(backend):
+    env = dict(os.environ, **{utils.html_module.PARSER_BACKEND_ENV: backend})
+    result = subprocess.run([sys.executable, "-c", "import utils.html_module"], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "ValueError" in result.stderr
+
+
+def test_set_parser_backend_rejects_unknown():
+    with pytest.raises(ValueError):
+        utils.html_module.set_parser_backend("no-such-parser")
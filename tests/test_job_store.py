@@ -0,0 +1,68 @@
+"""
+Job storage: what the CSV and Parquet sinks put on disk.
+
+Run from the repository root: python -m pytest -q
+"""
+import csv
+import glob
+import scraping.overall_scrap
+import scraping.scrap_job_elements
+import storage.job_store
+
+
+def job_record(index, days):
+    return scraping.scrap_job_elements.JobRecord(
+        title=f"Job {index}", link=f"https://example.com/jobs/{index}", company="Acme", rating=None,
+        location="Toronto, ON", type="Full-time", description="Build things.",
+        days_posted=None if days is None else f"{days} days ago", days=days,
+        posting_date="2024-01-01", fetched_date="2024-01-04", job_key=f"k{index}",
+    )
+
+
+def accumulate(records):
+    accumulator = scraping.overall_scrap.JobAccumulator()
+    accumulator.extend(records)
+    return accumulator
+
+
+def read_csv_rows(directory):
+    (path,) = glob.glob(str(directory / "data" / "raw_processed" / "*.csv"))
+    with open(path, newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+def test_csv_sink_writes_days_as_integers_with_missing_values(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sink = storage.job_store.CsvJobSink()
+    # A fresh file, then an append, each with a job without days
+    sink.write(accumulate([job_record(0, 3), job_record(1, None)]).columns)
+    sink.write(accumulate([job_record(2, None), job_record(3, 12)]).columns)
+
+    assert [row["days"] for row in read_csv_rows(tmp_path)] == ["3", "", "", "12"]
+
+
+def test_to_dataframe_keeps_days_integer():
+    frame = accumulate([job_record(0, 3), job_record(1, None)]).to_dataframe()
+    assert str(frame["days"].dtype) == "Int64"
+    assert frame["days"].tolist()[0] == 3
+
+
+def test_csv_to_parquet_round_trip(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    records = [job_record(0, 3), job_record(1, None), job_record(2, 12)]
+    storage.job_store.CsvJobSink().write(accumulate(records).columns)
+    # A month written before the days fix, with days stored as floats
+    with open(glob.glob("data/raw_processed/*.csv")[0], "a", encoding="utf-8") as file:
+        file.write("Job 3,https://example.com/jobs/3,Acme,,\"Toronto, ON\",Full-time,Build things.,"
+                   "4 days ago,4.0,2024-01-01,2024-01-04,k3\n")
+
+    parquet_root = str(tmp_path / "parquet")
+    converted = storage.job_store.convert_monthly_csvs(
+        "data/raw_processed", sink=storage.job_store.ParquetJobSink(root=parquet_root))
+    jobs = storage.job_store.read_jobs(parquet_root).sort_values("title").reset_index(drop=True)
+
+    assert converted == 4
+    assert jobs["title"].tolist() == ["Job 0", "Job 1", "Job 2", "Job 3"]
+    assert [None if days != days else int(days) for days in jobs["days"]] == [3, None, 12, 4]
+    assert jobs["job_key"].tolist() == ["k0", "k1", "k2", "k3"]
+    assert set(jobs["fetched_date"]) == {"2024-01-04"}
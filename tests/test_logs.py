@@ -0,0 +1,59 @@
+"""
+Log files: a newest-first file left by PrependFileHandler is reordered before appending.
+
+Run from the repository root: python -m pytest -q
+"""
+import logging
+import pytest
+
+
+@pytest.fixture
+def logs(tmp_path, monkeypatch):
+    """processing.logs, imported without leaving its logging setup on the test session."""
+    # Importing it configures logging into ./logs
+    monkeypatch.chdir(tmp_path)
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    import processing.logs
+    processing.logs.stop_logging()
+    root.handlers[:], root.level = handlers, level
+    return processing.logs
+
+
+def entry(second, message):
+    return f"2024-12-16 15:30:{second:02d},000 - INFO - {message}\n"
+
+
+def write_with(handler, messages):
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for message in messages:
+        handler.emit(logging.LogRecord("test", logging.INFO, __file__, 0, message, None, None))
+    handler.close()
+
+
+def test_legacy_newest_first_log_is_reordered_once(logs, tmp_path):
+    path = tmp_path / "legacy_log.txt"
+    traceback = "Traceback (most recent call last):\n  ValueError: bad\n"
+    # Prepended: newest first, each record's own lines in order
+    path.write_text(entry(3, "third") + entry(2, "second") + traceback + entry(1, "first"), encoding="utf-8")
+
+    handler = logs.AppendFileHandler(str(path))
+    assert handler.reordered
+    write_with(handler, ["appended"])
+    expected = entry(1, "first") + entry(2, "second") + traceback + entry(3, "third") + "appended\n"
+    assert path.read_text(encoding="utf-8") == expected
+
+    # Already oldest-first: left alone
+    assert not logs.AppendFileHandler(str(path)).reordered
+    assert path.read_text(encoding="utf-8") == expected
+
+
+def test_mixed_log_only_reverses_its_newest_first_part(logs, tmp_path):
+    path = tmp_path / "mixed_log.txt"
+    # A prepended part, then records appended before files were reordered
+    path.write_text(entry(2, "second") + entry(1, "first") + entry(3, "third") + entry(4, "fourth"), encoding="utf-8")
+
+    assert logs.reorder_legacy_log(str(path))
+    assert path.read_text(encoding="utf-8") == entry(1, "first") + entry(2, "second") + entry(3, "third") + entry(4, "fourth")
+    newest = list(logs.read_log_newest_first(str(path), limit=2))
+    assert newest == [entry(4, "fourth").rstrip("\n"), entry(3, "third").rstrip("\n")]
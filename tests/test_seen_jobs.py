@@ -0,0 +1,59 @@
+"""
+The seen-job filter: what survives a failed job write, and when the state file is written.
+
+Run from the repository root: python -m pytest -q
+"""
+import pytest
+import scraping.overall_scrap
+import storage.seen_jobs
+from test_job_store import job_record
+
+
+class FailingSink:
+    def write(self, columns, batch_id=None):
+        raise OSError("disk full")
+
+    def flush(self):
+        pass
+
+
+def filter_state(seen_filter):
+    return [bloom.to_state() for bloom in seen_filter.filters], list(seen_filter.recent), dict(seen_filter.pending)
+
+
+def test_rollback_after_failed_write_leaves_filter_unchanged(tmp_path):
+    seen_filter = storage.seen_jobs.SeenJobFilter(str(tmp_path / "seen.json"), save_every=1)
+    seen_filter.new_records([job_record(0, 3)])
+    seen_filter.commit()
+    before = filter_state(seen_filter)
+    saved = (tmp_path / "seen.json").read_bytes()
+
+    job_batch = scraping.overall_scrap.JobAccumulator()
+    job_batch.add_email(seen_filter.new_records([job_record(0, 3), job_record(1, 5), job_record(2, None)]))
+    assert len(job_batch) == 2
+    with pytest.raises(OSError):
+        job_batch.flush(FailingSink(), seen_filter)
+
+    assert filter_state(seen_filter) == before
+    assert (tmp_path / "seen.json").read_bytes() == saved
+    # The retried email's jobs are new again
+    assert seen_filter.new_records([job_record(1, 5), job_record(2, None)]) == [job_record(1, 5), job_record(2, None)]
+
+
+def test_state_is_saved_every_n_commits_and_on_close(tmp_path):
+    path = tmp_path / "seen.json"
+    seen_filter = storage.seen_jobs.SeenJobFilter(str(path), save_every=3)
+    for index in range(2):
+        seen_filter.new_records([job_record(index, 1)])
+        seen_filter.commit()
+    assert not path.exists()
+
+    seen_filter.new_records([job_record(2, 1)])
+    seen_filter.commit()
+    assert len(storage.seen_jobs.SeenJobFilter.load(str(path)).recent) == 3
+
+    seen_filter.new_records([job_record(3, 1)])
+    seen_filter.commit()
+    assert len(storage.seen_jobs.SeenJobFilter.load(str(path)).recent) == 3
+    seen_filter.close()
+    assert list(storage.seen_jobs.SeenJobFilter.load(str(path)).recent) == ["k0", "k1", "k2", "k3"]
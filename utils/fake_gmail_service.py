@@ -0,0 +1,637 @@
+import os
+import re
+import glob
+import json
+import base64
+import time
+import random
+import hashlib
+import argparse
+import itertools
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+# One quota table for the fake and the client-side gateway
+from processing.gmail_quota import GMAIL_QUOTA_UNITS, GMAIL_QUOTA_PER_SECOND, DEFAULT_QUOTA_UNITS
+
+##############################################################
+# Local stand-in for the Gmail API service.
+# Testing and dev only: mirrors the `service.users().messages()/labels()`
+# call chain closely enough to run the processing code offline.
+##############################################################
+
+FIXTURE_DIR = os.path.join("src", "usecases_v1_offline")
+DEFAULT_SENDER = "Indeed <alert@indeed.com>"
+
+# Job keys and "N days ago" labels rewritten in synthetic variants of a fixture
+JOB_KEY_IN_HTML = re.compile(r"(?<=jk=)[0-9a-f]{16}")
+DAYS_AGO_IN_HTML = re.compile(r"\b\d+ days? ago\b")
+
+# `history().list(historyTypes=...)` values and the record keys they select
+HISTORY_TYPE_KEYS = {
+    "messageAdded": "messagesAdded",
+    "messageDeleted": "messagesDeleted",
+    "labelAdded": "labelsAdded",
+    "labelRemoved": "labelsRemoved",
+}
+
+
+def build_fake_message(message_id, html_content, subject, sender, received_datetime, label_ids=None):
+    """
+    Build a message resource shaped like the response of `messages().get`.
+
+    Args:
+        message_id (str): The Gmail message ID.
+        html_content (str): The HTML body of the email.
+        subject (str): The email subject.
+        sender (str): The `From` header value.
+        received_datetime (datetime.datetime): The timezone-aware received date.
+        label_ids (list): Labels on the message. Defaults to INBOX and UNREAD.
+
+    Returns:
+        dict: A Gmail message resource.
+    """
+    encoded_html = base64.urlsafe_b64encode(html_content.encode("utf-8")).decode("utf-8")
+    return {
+        "id": message_id,
+        "threadId": message_id,
+        "labelIds": list(label_ids) if label_ids is not None else ["INBOX", "UNREAD"],
+        "payload": {
+            "mimeType": "multipart/alternative",
+            "headers": [
+                {"name": "Subject", "value": subject},
+                {"name": "From", "value": sender},
+                {"name": "Date", "value": format_datetime(received_datetime)},
+            ],
+            "parts": [
+                {"mimeType": "text/plain", "body": {"data": ""}},
+                {"mimeType": "text/html", "body": {"data": encoded_html}},
+            ],
+        },
+    }
+
+
+def synthesize_variant(html_content, variant):
+    """
+    Make a distinct copy of an alert email: every job key (`jk=`) is replaced, consistently
+    within the email, by one derived from the variant number, and each "N days ago" gets
+    a new N. Variant 0 is the original HTML.
+
+    Without variants, repeated copies of a fixture hold the same jobs, which the seen-job
+    filter drops after the first copy.
+    """
+    if not variant:
+        return html_content
+    rng = random.Random(variant)
+    html_content = JOB_KEY_IN_HTML.sub(
+        lambda match: hashlib.sha1(f"{match.group(0)}:{variant}".encode("utf-8")).hexdigest()[:16], html_content)
+    return DAYS_AGO_IN_HTML.sub(lambda match: f"{rng.randint(1, 30)} days ago", html_content)
+
+
+def load_fixture_messages(fixture_dir=FIXTURE_DIR, copies=1, sender=DEFAULT_SENDER, variants=False):
+    """
+    Build message resources from the HTML files in a fixture directory (and its subdirectories).
+
+    Args:
+        fixture_dir (str): Directory holding `.html` alert emails, e.g. "src" for every fixture.
+        copies (int): How many times to repeat the fixture set.
+        sender (str): The `From` header used for every message.
+        variants (bool): Make every copy after the first a synthetic variant (see
+            `synthesize_variant`) instead of an identical copy.
+
+    Returns:
+        list: Gmail message resources, one per HTML file per copy.
+    """
+    html_files = sorted(glob.glob(os.path.join(fixture_dir, "**", "*.html"), recursive=True))
+    if not html_files:
+        raise FileNotFoundError(f"No HTML fixtures found in {fixture_dir}.")
+
+    contents = []
+    for file_path in html_files:
+        with open(file_path, "r", encoding="utf-8") as file:
+            title = os.path.splitext(os.path.basename(file_path))[0]
+            contents.append((title, file.read()))
+
+    base_datetime = datetime(2024, 12, 16, 9, 0).astimezone()
+    messages = []
+    for index, (title, html_content) in enumerate(itertools.islice(itertools.cycle(contents), len(contents) * copies)):
+        if variants:
+            html_content = synthesize_variant(html_content, index // len(contents))
+        messages.append(build_fake_message(
+            message_id=f"fake{index:08d}",
+            html_content=html_content,
+            subject=f"Indeed alert: {title}",
+            sender=sender,
+            received_datetime=base_datetime + timedelta(minutes=index),
+        ))
+    return messages
+
+
+class FakeRequest:
+    """
+    A pending API call. `execute()` applies the simulated round-trip latency.
+    """
+    def __init__(self, service, method, handler):
+        self.service = service
+        self.method = method
+        self.handler = handler
+
+    def execute(self, num_retries=0):
+        self.service.round_trip(self.method)
+        return self.run()
+
+    def run(self):
+        """Run the call without latency (used by batch requests)."""
+        with self.service.lock:
+            self.service.admit(self.method)
+            self.service.call_counts[self.method] += 1
+            return self.handler()
+
+
+class FakeBatchHttpRequest:
+    """
+    Mirrors `googleapiclient.http.BatchHttpRequest`: all added calls share one round trip.
+    """
+    def __init__(self, service, callback=None):
+        self.service = service
+        self.callback = callback
+        self.requests = OrderedDict()
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self.requests) + 1)
+        if request_id in self.requests:
+            raise KeyError(f"A request with this ID already exists: {request_id}")
+        self.requests[request_id] = (request, callback)
+
+    def execute(self, http=None):
+        self.service.round_trip("batch")
+        for request_id, (request, callback) in self.requests.items():
+            response, exception = None, None
+            try:
+                response = request.run()
+            except Exception as e:
+                exception = e
+            callback = callback or self.callback
+            if callback:
+                callback(request_id, response, exception)
+
+
+class FakeGmailService:
+    """
+    In-memory Gmail service seeded with message resources.
+
+    Besides the API calls it simulates:
+    - Latency: `latency` seconds per HTTP round trip (single call or batch), spread by
+      +/- `latency_jitter` (a fraction); `method_latency` overrides it per method
+      ("messages.get", ..., "batch").
+    - Errors: each call fails with HTTP status s with probability `error_rates[s]`
+      (e.g. {429: 0.01, 500: 0.005}); `fail_next` scripts failures. Calls inside a batch
+      fail individually, as with Gmail. 429s carry a Retry-After of 1 second.
+    - Quota: every admitted call is charged its GMAIL_QUOTA_UNITS; with `quota_per_second`
+      set, a call that would exceed it within the last second fails with 429.
+    All randomness comes from `seed`, so runs are repeatable.
+
+    Args:
+        messages (list): Message resources, e.g. from `load_fixture_messages`.
+        latency (float): Seconds slept per HTTP round trip (single call or batch).
+        email_address (str): Address returned by `getProfile`.
+        latency_jitter (float): Relative random spread of each latency.
+        method_latency (dict): Seconds per round trip by method name.
+        error_rates (dict): Failure probability per call by HTTP status.
+        quota_per_second (int): Quota units allowed per rolling second, or None for no limit.
+        seed (int): Seed of the latency and error randomness.
+    """
+    def __init__(self, messages=None, latency=0.0, email_address="me@example.com", latency_jitter=0.0,
+                 method_latency=None, error_rates=None, quota_per_second=None, seed=0):
+        self.messages_store = OrderedDict()
+        self.labels_store = OrderedDict()
+        self.sent_messages = []
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.method_latency = dict(method_latency or {})
+        self.error_rates = dict(error_rates or {})
+        self.quota_per_second = quota_per_second
+        self.email_address = email_address
+        self.call_counts = Counter()
+        self.round_trips = 0
+        self.lock = threading.RLock()
+        self._label_ids = itertools.count(1)
+        self._random = random.Random(seed)
+
+        # Injected failures, and quota charged in total, per method and over the last second
+        self.scripted_failures = deque()
+        self.error_counts = Counter()
+        self.quota_used = 0
+        self.quota_by_method = Counter()
+        self.quota_window = deque()
+
+        # Mailbox history: every change bumps `history_id`; records older than
+        # `oldest_history_id` have expired and `history().list` answers 404.
+        self.history_id = 1
+        self.oldest_history_id = 1
+        self.history_records = []
+
+        for message in messages or []:
+            self.add_message(message)
+
+    @classmethod
+    def from_fixture_dir(cls, fixture_dir=FIXTURE_DIR, copies=1, latency=0.0, sender=DEFAULT_SENDER,
+                         variants=False, **kwargs):
+        """Create a service serving the HTML files in `fixture_dir`; `kwargs` go to the constructor."""
+        messages = load_fixture_messages(fixture_dir, copies=copies, sender=sender, variants=variants)
+        return cls(messages, latency=latency, **kwargs)
+
+    def round_trip(self, method):
+        """Count one HTTP round trip and sleep its simulated latency."""
+        with self.lock:
+            self.round_trips += 1
+            latency = self.method_latency.get(method, self.latency)
+            if latency and self.latency_jitter:
+                latency *= self._random.uniform(1 - self.latency_jitter, 1 + self.latency_jitter)
+        if latency:
+            time.sleep(latency)
+
+    def fail_next(self, status, count=1, method=None):
+        """Make the next `count` calls (of `method`, or any method) fail with HTTP `status`."""
+        with self.lock:
+            self.scripted_failures.extend([(status, method)] * count)
+
+    def admit(self, method):
+        """
+        Apply error injection and quota to a call about to run, raising its HttpError if it
+        fails; otherwise charge its quota units. Called with `lock` held.
+        """
+        for index, (status, failing_method) in enumerate(self.scripted_failures):
+            if failing_method in (None, method):
+                del self.scripted_failures[index]
+                self._fail(method, status, "Injected failure")
+        for status, rate in self.error_rates.items():
+            if self._random.random() < rate:
+                self._fail(method, status, "Injected failure")
+
+        units = GMAIL_QUOTA_UNITS.get(method, DEFAULT_QUOTA_UNITS)
+        now = time.monotonic()
+        while self.quota_window and self.quota_window[0][0] <= now - 1.0:
+            self.quota_window.popleft()
+        if self.quota_per_second is not None:
+            if sum(charged for _, charged in self.quota_window) + units > self.quota_per_second:
+                self._fail(method, 429, "User-rate limit exceeded", quota=True)
+        self.quota_window.append((now, units))
+        self.quota_used += units
+        self.quota_by_method[method] += units
+
+    def _fail(self, method, status, reason, quota=False):
+        self.error_counts[f"quota_{status}" if quota else str(status)] += 1
+        raise _http_error(status, f"{reason} ({method})", retry_after=1 if status == 429 else None)
+
+    def stats(self):
+        """Calls, round trips, quota units and injected errors so far."""
+        with self.lock:
+            return {
+                "calls": dict(self.call_counts),
+                "round_trips": self.round_trips,
+                "quota_used": self.quota_used,
+                "quota_by_method": dict(self.quota_by_method),
+                "errors": dict(self.error_counts),
+            }
+
+    def add_message(self, message):
+        """Deliver a message to the mailbox, recording a `messagesAdded` history entry."""
+        self.messages_store[message["id"]] = message
+        self.record_history("messagesAdded", message)
+
+    def record_history(self, kind, message, label_ids=None):
+        """Append a history record of `kind` (messagesAdded, labelsAdded, labelsRemoved)."""
+        self.history_id += 1
+        message["historyId"] = str(self.history_id)
+        change = {"message": {"id": message["id"], "threadId": message["threadId"], "labelIds": list(message["labelIds"])}}
+        if label_ids is not None:
+            change["labelIds"] = list(label_ids)
+        self.history_records.append({"id": str(self.history_id), kind: [change]})
+
+    def expire_history(self):
+        """Drop all history so any stored start history ID is rejected with 404."""
+        self.history_records = []
+        self.oldest_history_id = self.history_id + 1
+
+    def users(self):
+        return _FakeUsers(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchHttpRequest(self, callback=callback)
+
+    def request(self, method, handler):
+        return FakeRequest(self, method, handler)
+
+
+class _FakeUsers:
+    def __init__(self, service):
+        self.service = service
+
+    def messages(self):
+        return _FakeMessages(self.service)
+
+    def labels(self):
+        return _FakeLabels(self.service)
+
+    def history(self):
+        return _FakeHistory(self.service)
+
+    def getProfile(self, userId="me"):
+        return self.service.request("users.getProfile", lambda: {
+            "emailAddress": self.service.email_address,
+            "messagesTotal": len(self.service.messages_store),
+            "historyId": str(self.service.history_id),
+        })
+
+
+class _FakeMessages:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId="me", q=None, maxResults=100, pageToken=None, labelIds=None):
+        def handler():
+            # Page tokens are cursors (the last ID returned), like Gmail's, so messages
+            # modified between pages do not shift later pages.
+            message_ids = list(self.service.messages_store)
+            start = message_ids.index(pageToken) + 1 if pageToken else 0
+            matches = [m for m in itertools.islice(self.service.messages_store.values(), start, None) if _matches_query(m, q)]
+            page = matches[:maxResults]
+            response = {"resultSizeEstimate": len(matches)}
+            if page:
+                response["messages"] = [{"id": m["id"], "threadId": m["threadId"]} for m in page]
+            if len(matches) > maxResults:
+                response["nextPageToken"] = page[-1]["id"]
+            return response
+        return self.service.request("messages.list", handler)
+
+    def get(self, userId="me", id=None, format=None):
+        def handler():
+            if id not in self.service.messages_store:
+                raise _http_error(404, f"Requested entity was not found: {id}")
+            return self.service.messages_store[id]
+        return self.service.request("messages.get", handler)
+
+    def modify(self, userId="me", id=None, body=None):
+        def handler():
+            if id not in self.service.messages_store:
+                raise _http_error(404, f"Requested entity was not found: {id}")
+            return _apply_label_changes(self.service, self.service.messages_store[id], body or {})
+        return self.service.request("messages.modify", handler)
+
+    def batchModify(self, userId="me", body=None):
+        def handler():
+            body_ids = (body or {}).get("ids", [])
+            unknown = [email_id for email_id in body_ids if email_id not in self.service.messages_store]
+            if unknown:
+                raise _http_error(400, f"Invalid id: {unknown[0]}")
+            for email_id in body_ids:
+                _apply_label_changes(self.service, self.service.messages_store[email_id], body)
+            return ""
+        return self.service.request("messages.batchModify", handler)
+
+    def send(self, userId="me", body=None):
+        def handler():
+            self.service.sent_messages.append(body)
+            return {"id": f"sent{len(self.service.sent_messages):08d}", "labelIds": ["SENT"]}
+        return self.service.request("messages.send", handler)
+
+
+class _FakeHistory:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId="me", startHistoryId=None, historyTypes=None, labelId=None, maxResults=100, pageToken=None):
+        def handler():
+            if startHistoryId is None or int(startHistoryId) < self.service.oldest_history_id:
+                raise _http_error(404, f"Requested entity was not found: startHistoryId {startHistoryId}")
+            records = [
+                record for record in self.service.history_records
+                if int(record["id"]) > int(startHistoryId)
+                and (not historyTypes or any(HISTORY_TYPE_KEYS[kind] in record for kind in historyTypes))
+                and (not labelId or any(labelId in change["message"]["labelIds"]
+                                        for kind, changes in record.items() if kind != "id" for change in changes))
+            ]
+            start = int(pageToken or 0)
+            response = {"historyId": str(self.service.history_id)}
+            if records[start:start + maxResults]:
+                response["history"] = records[start:start + maxResults]
+            if start + maxResults < len(records):
+                response["nextPageToken"] = str(start + maxResults)
+            return response
+        return self.service.request("history.list", handler)
+
+
+class _FakeLabels:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId="me"):
+        return self.service.request("labels.list", lambda: {"labels": list(self.service.labels_store.values())})
+
+    def create(self, userId="me", body=None):
+        def handler():
+            label = dict(body or {})
+            label["id"] = f"Label_{next(self.service._label_ids)}"
+            self.service.labels_store[label["id"]] = label
+            return label
+        return self.service.request("labels.create", handler)
+
+
+def _apply_label_changes(service, message, body):
+    """Apply `addLabelIds`/`removeLabelIds` to a message, validating user labels."""
+    system_labels = {"INBOX", "UNREAD", "SENT", "STARRED", "IMPORTANT", "SPAM", "TRASH"}
+    for label_id in body.get("addLabelIds", []) + body.get("removeLabelIds", []):
+        if label_id not in system_labels and label_id not in service.labels_store:
+            raise _http_error(400, f"Invalid label: {label_id}")
+    removed = [label for label in body.get("removeLabelIds", []) if label in message["labelIds"]]
+    added = [label for label in body.get("addLabelIds", []) if label not in message["labelIds"]]
+    message["labelIds"] = [label for label in message["labelIds"] if label not in removed] + added
+    if removed:
+        service.record_history("labelsRemoved", message, removed)
+    if added:
+        service.record_history("labelsAdded", message, added)
+    return {"id": message["id"], "threadId": message["threadId"], "labelIds": message["labelIds"]}
+
+
+def _matches_query(message, query):
+    """Evaluate the subset of Gmail search used by the app: `from:` terms and `is:unread`."""
+    if not query:
+        return True
+    terms = query.replace("(", " ").replace(")", " ").split()
+    senders = [term[len("from:"):].lower() for term in terms if term.startswith("from:")]
+    if "is:unread" in terms and "UNREAD" not in message["labelIds"]:
+        return False
+    if senders:
+        from_header = next((h["value"] for h in message["payload"]["headers"] if h["name"] == "From"), "")
+        return any(sender in from_header.lower() for sender in senders)
+    return True
+
+
+def _http_error(status, reason, retry_after=None):
+    """Build a `googleapiclient.errors.HttpError` like the real client raises."""
+    import httplib2
+    from googleapiclient.errors import HttpError
+    content = f'{{"error": {{"code": {status}, "message": "{reason}"}}}}'.encode("utf-8")
+    headers = {"status": status, "reason": reason}
+    if retry_after is not None:
+        headers["retry-after"] = str(retry_after)
+    return HttpError(httplib2.Response(headers), content)
+
+
+##############################################################
+# HTTP stub: serves a FakeGmailService on the Gmail REST paths
+# (`/gmail/v1/users/me/...`) for async and raw HTTP clients.
+##############################################################
+
+class FakeGmailHttpServer:
+    """
+    Threaded HTTP server exposing a FakeGmailService with keep-alive support.
+    Each request applies the service latency in its own thread, so concurrent
+    clients see overlapping round trips like against the real API.
+
+    Usage:
+        with FakeGmailHttpServer(service) as server:
+            client = AsyncGmailClient(..., base_url=server.base_url)
+    """
+    def __init__(self, service, host="127.0.0.1", port=0):
+        self.service = service
+        handler = type("BoundFakeGmailHandler", (_FakeGmailHandler,), {"service": service})
+        self.httpd = _FakeGmailHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/gmail/v1/users/me/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-gmail-http", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _FakeGmailHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections when many clients connect at once
+    request_queue_size = 128
+
+
+class _FakeGmailHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY keep-alive
+    # connections stall on delayed ACKs
+    disable_nagle_algorithm = True
+    service = None
+
+    # (HTTP method, path pattern) -> function(users, match, query, body) returning a request
+    routes = [
+        ("GET", r"messages", lambda users, m, q, body: users.messages().list(
+            q=q.get("q"), maxResults=int(q.get("maxResults", 100)), pageToken=q.get("pageToken"))),
+        ("POST", r"messages/send", lambda users, m, q, body: users.messages().send(body=body)),
+        ("POST", r"messages/batchModify", lambda users, m, q, body: users.messages().batchModify(body=body)),
+        ("GET", r"messages/([^/]+)", lambda users, m, q, body: users.messages().get(id=m.group(1))),
+        ("POST", r"messages/([^/]+)/modify", lambda users, m, q, body: users.messages().modify(id=m.group(1), body=body)),
+        ("GET", r"labels", lambda users, m, q, body: users.labels().list()),
+        ("POST", r"labels", lambda users, m, q, body: users.labels().create(body=body)),
+        ("GET", r"history", lambda users, m, q, body: users.history().list(
+            startHistoryId=q.get("startHistoryId"), historyTypes=q.get("historyTypes"), pageToken=q.get("pageToken"))),
+        ("GET", r"profile", lambda users, m, q, body: users.getProfile()),
+    ]
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        prefix = "/gmail/v1/users/me/"
+        path = url.path[len(prefix):] if url.path.startswith(prefix) else None
+        query = {key: values if key == "historyTypes" else values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        for route_method, pattern, build_request in self.routes:
+            match = re.fullmatch(pattern, path or "")
+            if route_method == method and match:
+                break
+        else:
+            return self._respond(404, {"error": {"code": 404, "message": f"Unknown endpoint {method} {url.path}"}})
+
+        try:
+            result = build_request(self.service.users(), match, query, body).execute()
+            self._respond(200, result)
+        except Exception as e:
+            resp = getattr(e, "resp", None)
+            status = getattr(resp, "status", 500)
+            content = getattr(e, "content", None)
+            payload = json.loads(content) if content else {"error": {"code": status, "message": str(e)}}
+            retry_after = resp.get("retry-after") if resp is not None else None
+            self._respond(int(status), payload, headers={"Retry-After": retry_after} if retry_after else None)
+
+    def _respond(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    """
+    Serve a fake mailbox over HTTP until interrupted, e.g. for async clients in another process.
+    Run from the repository root: python -m utils.fake_gmail_service
+    """
+    parser = argparse.ArgumentParser(description="Serve a fake Gmail API on the Gmail REST paths.")
+    parser.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--variants", action="store_true", help="Make copies synthetic variants.")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-429", type=float, default=0.0, help="Probability of a 429 per call.")
+    parser.add_argument("--error-500", type=float, default=0.0, help="Probability of a 500 per call.")
+    parser.add_argument("--quota-per-second", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    service = FakeGmailService.from_fixture_dir(
+        args.fixture_dir, copies=args.copies, latency=args.latency, variants=args.variants,
+        latency_jitter=args.latency_jitter, error_rates={429: args.error_429, 500: args.error_500},
+        quota_per_second=args.quota_per_second, seed=args.seed,
+    )
+    with FakeGmailHttpServer(service, port=args.port) as server:
+        print(f"Serving {len(service.messages_store)} message(s) at {server.base_url}")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+    print(json.dumps(service.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,69 @@ from bs4 import BeautifulSoup
 import requests
 import os
 import base64
+import logging
 import webbrowser
 from tempfile import NamedTemporaryFile
 
 import os
 from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+
+# Parser backends that give identical job records on every fixture in src/, as checked by
+# tests/test_html_parser_backends.py (lxml is in requirements.txt but still optional).
+# html5lib is left out: like a browser, it drops table fragments outside a <table>.
+PARSER_BACKENDS = ("html.parser", "lxml")
+DEFAULT_PARSER_BACKEND = "html.parser"
+
+PARSER_BACKEND_ENV = "HTML_PARSER_BACKEND"
+
+
+def available_parser_backends():
+    """Return the backends from PARSER_BACKENDS that are installed."""
+    return [backend for backend in PARSER_BACKENDS if builder_registry.lookup(backend) is not None]
+
+
+def validate_parser_backend(backend):
+    """
+    Return `backend` if it is one of PARSER_BACKENDS and installed.
+
+    Raises:
+        ValueError: If the backend is unknown or not installed.
+    """
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend '{backend}'. Choose from {PARSER_BACKENDS}.")
+    if builder_registry.lookup(backend) is None:
+        raise ValueError(f"Parser backend '{backend}' is not installed.")
+    return backend
+
+
+# Read and checked once at import, so a bad HTML_PARSER_BACKEND fails at startup rather
+# than on the first email, and process-pool workers pick up the same backend as the parent
+parser_backend = validate_parser_backend(os.environ.get(PARSER_BACKEND_ENV, DEFAULT_PARSER_BACKEND))
+
+
+def set_parser_backend(backend):
+    """
+    Choose the parser backend for all scraping, once at startup.
+
+    Also exports it through the HTML_PARSER_BACKEND environment variable, so worker
+    processes started afterwards use the same backend.
+
+    Args:
+        backend (str): One of PARSER_BACKENDS.
+    Raises:
+        ValueError: If the backend is unknown or not installed.
+    """
+    global parser_backend
+    parser_backend = validate_parser_backend(backend)
+    os.environ[PARSER_BACKEND_ENV] = backend
+    logging.info(f"HTML parser backend set to '{backend}'.")
+
+
+def make_soup(markup, backend=None):
+    """Parse HTML with the configured parser backend (or an explicit `backend`)."""
+    return BeautifulSoup(markup, backend or parser_backend)
+
 
 # Step 1: Parse local HTML file
 def parse_local_html(file_path):
@@ -18,7 +76,7 @@ def parse_local_html(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         content = file.read()
     
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content)
     print("Local HTML file parsed successfully.")
     return soup
 
@@ -66,7 +124,7 @@ def fetch_email_html_content_most_recent_only(service):
             return None
 
         # Parse the HTML content with BeautifulSoup
-        soup = BeautifulSoup(email_body, 'html.parser')
+        soup = make_soup(email_body)
 
         print("Email HTML content fetched and parsed successfully.")
         return soup
@@ -0,0 +1,116 @@
+import os
+import time
+import logging
+from contextlib import nullcontext
+
+try:
+    import prometheus_client
+except ImportError:  # optional: without prometheus_client every metric is a no-op
+    prometheus_client = None
+
+METRICS_PORT_ENV = "METRICS_PORT"
+DEFAULT_METRICS_PORT = 9464
+METRICS_NAMESPACE = "jobscraper"
+
+# Instrumented stages of a poll cycle
+STAGES = ("fetch", "scrape", "storage", "finalize", "auth_refresh")
+# Stage latencies run from sub-millisecond parses to multi-second batch fetches and refreshes
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Switched off with set_metrics_enabled(False), e.g. to measure the instrumentation overhead
+enabled = prometheus_client is not None
+
+if prometheus_client is not None:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        "stage_seconds", "Latency of each pipeline stage (per email; per batch for fetch and storage).",
+        ["stage"], namespace=METRICS_NAMESPACE, buckets=STAGE_BUCKETS)
+    EMAILS_PROCESSED = prometheus_client.Counter(
+        "emails_processed", "Emails finalized, successfully or not.", namespace=METRICS_NAMESPACE)
+    EMAILS_FAILED = prometheus_client.Counter(
+        "emails_failed", "Emails finalized as failed.", namespace=METRICS_NAMESPACE)
+    JOBS_EXTRACTED = prometheus_client.Counter(
+        "jobs_extracted", "New (not previously seen) jobs scraped from emails.", namespace=METRICS_NAMESPACE)
+    API_CALLS = prometheus_client.Counter(
+        "gmail_api_calls", "Gmail API calls by method (calls inside a batch count individually).",
+        ["method"], namespace=METRICS_NAMESPACE)
+    BACKLOG = prometheus_client.Gauge(
+        "backlog_emails", "Unread matching emails listed at the start of the cycle, minus those finalized since.",
+        namespace=METRICS_NAMESPACE)
+    # Label children are looked up once; `labels()` on every observation would cost more than the observation
+    _stage_histograms = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+    _api_counters = {}
+
+
+def stage_timer(stage):
+    """Context manager observing the duration of `stage` (one of STAGES) in the stage histogram."""
+    if not enabled:
+        return nullcontext()
+    return _stage_histograms[stage].time()
+
+
+def observe_stage(stage, seconds):
+    """Record a stage duration measured elsewhere, e.g. in a worker process."""
+    if enabled:
+        _stage_histograms[stage].observe(seconds)
+
+
+def count_email(success):
+    if enabled:
+        EMAILS_PROCESSED.inc()
+        if not success:
+            EMAILS_FAILED.inc()
+        BACKLOG.dec()
+
+
+def count_jobs(job_count):
+    if enabled and job_count:
+        JOBS_EXTRACTED.inc(job_count)
+
+
+def count_api_call(method, count=1):
+    """Count `count` Gmail API calls of `method` (e.g. "messages.get")."""
+    if not enabled:
+        return
+    counter = _api_counters.get(method)
+    if counter is None:
+        counter = _api_counters[method] = API_CALLS.labels(method)
+    counter.inc(count)
+
+
+def set_backlog(email_count):
+    if enabled:
+        BACKLOG.set(email_count)
+
+
+def set_metrics_enabled(value):
+    """Turn the instrumentation on or off (it stays off without prometheus_client)."""
+    global enabled
+    enabled = bool(value) and prometheus_client is not None
+    return enabled
+
+
+def start_metrics_server(port=None, addr="127.0.0.1"):
+    """
+    Serve the metrics at http://<addr>:<port>/metrics from a background thread.
+
+    Args:
+        port (int): Port; defaults to the METRICS_PORT environment variable, then 9464.
+        addr (str): Interface to listen on; localhost only by default.
+
+    Returns:
+        int: The port, or None when prometheus_client is not installed.
+    """
+    if prometheus_client is None:
+        logging.warning("prometheus_client is not installed; metrics endpoint not started.")
+        return None
+    port = int(port or os.environ.get(METRICS_PORT_ENV, DEFAULT_METRICS_PORT))
+    prometheus_client.start_http_server(port, addr=addr)
+    logging.info(f"Metrics served at http://{addr}:{port}/metrics")
+    return port
+
+
+def timed(function, *args, **kwargs):
+    """Call `function` and return (result, seconds); picklable, for timing work in a process pool."""
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started